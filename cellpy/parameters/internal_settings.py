@@ -19,6 +19,7 @@ headers_normal = HeaderDict()
 headers_summary = HeaderDict()
 headers_step_table = HeaderDict()
 headers_journal = HeaderDict()
+dtypes_normal = HeaderDict()
 
 # cellpy attributes that should be loaded from cellpy-files:
 
@@ -157,6 +158,15 @@ headers_normal["dv_dt_txt"] = "dv_dt"
 headers_normal["frequency_txt"] = "frequency"  # new
 headers_normal["amplitude_txt"] = "amplitude"  # new
 
+# - compact dtypes for the normal (data) -
+# (keys as in headers_normal, used when loading raw data)
+
+dtypes_normal["cycle_index_txt"] = "int32"
+dtypes_normal["step_index_txt"] = "int32"
+dtypes_normal["sub_step_index_txt"] = "int32"
+dtypes_normal["test_id_txt"] = "int32"
+dtypes_normal["is_fc_data_txt"] = "int8"
+
 # - summary -
 
 # 08.12.2016: added temperature_last, temperature_mean, aux_
@@ -275,6 +285,12 @@ def get_headers_normal():
     return headers_normal
 
 
+def get_dtypes_normal():
+    """Returns a dictionary containing the compact dtypes for the normal data
+        (the keys are the same as for the header-strings)"""
+    return dtypes_normal
+
+
 def get_headers_step_table():
     """Returns a dictionary containing the header-strings for the steps table
         (used as column headers for the steps pandas DataFrames)"""
@@ -75,6 +75,9 @@ Reader = {
     "raw_datadir": None,
     "cellpy_datadir": None,
     "auto_dirs": True,  # search in prm-file for res and hdf5 dirs in loadcell
+    "step_table_engine": "segmented",  # "segmented" or "groupby"
+    "compact_dtypes": False,  # use compact dtypes for the raw data when loading
+    "float32_columns": None,  # headers_normal keys (or columns) to use float32 for
 }
 Reader = box.Box(Reader)
 
@@ -150,15 +153,30 @@ Arbin = {
     "max_res_filesize": 150_000_000,
     "chunk_size": None,
     "max_chunks": None,
+    "max_memory": None,  # memory budget (bytes) when loading in chunks
+    "chunk_dtypes": None,  # dict of column: dtype to down-cast chunks to
+    "mdb_export_chunk_size": 200_000,
     "use_subprocess": False,
     "detect_subprocess_need": False,
     "sub_process_path": None,
     "office_version": "64bit",
 }
 
+PEC = {
+    "csv_engine": None,  # parser engine for read_csv (None: pyarrow if installed)
+}
+
+Maccor = {
+    "chunk_size": None,  # number of rows to read at a time (None: all at once)
+    "datetime_format": "%m/%d/%Y %I:%M:%S %p",  # None: let pandas infer it
+    "sep": "\t",
+}
+
 # Register pre-defined instruments:
 
 Instruments["Arbin"] = Arbin
+Instruments["PEC"] = PEC
+Instruments["Maccor"] = Maccor
 
 # --------------------------
 # Materials
@@ -207,14 +225,27 @@ _cellpyfile_raw = "/raw"
 _cellpyfile_step = "/steps"
 _cellpyfile_summary = "/summary"
 _cellpyfile_fid = "/fid"
+# first and last row (and data point) of each cycle and step in the raw table
+_cellpyfile_cycle_step_index = "/cycle_step_index"
 
 _cellpyfile_complevel = 1
 _cellpyfile_complib = None  # currently defaults to "zlib"
+# compression pr. table, e.g. {"complib": "blosc:lz4", "complevel": 5}
+# (None: use _cellpyfile_complib and _cellpyfile_complevel)
+_cellpyfile_table_compression = {"raw": None, "steps": None, "summary": None}
 _cellpyfile_raw_format = "table"
 _cellpyfile_summary_format = "table"
 _cellpyfile_stepdata_format = "table"
 _cellpyfile_infotable_format = "fixed"
 _cellpyfile_fidtable_format = "fixed"
+# raw columns (headers_normal keys) that are indexed (and can be queried)
+_cellpyfile_raw_data_columns = ["data_point_txt", "cycle_index_txt", "step_index_txt"]
+# file format used when saving ("hdf5" or "parquet" - loading detects the format)
+_cellpyfile_format = "hdf5"
+_cellpyfile_parquet_compression = "zstd"
+_cellpyfile_parquet_row_group_size = 65_536  # rows (the unit for skipping cycles)
+_cellpyfile_parquet_use_threads = True
+_cellpyfile_parquet_memory_map = True
 
 # used as global variables
 _globals_status = ""
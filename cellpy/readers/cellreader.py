@@ -24,6 +24,7 @@ import csv
 import itertools
 import time
 import copy
+from contextlib import contextmanager
 
 import numpy as np
 import pandas as pd
@@ -51,9 +52,23 @@ from cellpy.readers.core import (
     xldate_as_datetime,
     interpolate_y_on_x,
     identify_last_data_point,
+    CycleStepIndex,
+    LazyRaw,
+    iter_frame_in_chunks,
     pickle_protocol,
+    read_cycle_step_index,
+    select_raw_from_store,
     PICKLE_PROTOCOL,
 )
+from cellpy.readers.storage import (
+    CELLPY_FILE_FORMATS,
+    CellpyFileHandle,
+    cellpy_file_exists,
+    detect_cellpy_file_format,
+    open_cellpy_store,
+    remove_cellpy_file,
+    table_compression,
+)
 
 HEADERS_NORMAL = get_headers_normal()
 HEADERS_SUMMARY = get_headers_summary()
@@ -151,6 +166,7 @@ class CellpyData(object):
             self.filestatuschecker = filestatuschecker
         self.forced_errors = 0
         self.summary_exists = False
+        self._open_cellpy_file_handle = None
 
         if not filenames:
             self.file_names = []
@@ -414,6 +430,12 @@ class CellpyData(object):
             self._set_instrument(RawLoader)
             self.tester = "biologic"
 
+        elif instrument in ["maccor", "maccor_txt"]:
+            from cellpy.readers.instruments.maccor import MaccorLoader as RawLoader
+
+            self._set_instrument(RawLoader)
+            self.tester = "maccor"
+
         elif instrument == "custom":
             from cellpy.readers.instruments.custom import CustomLoader as RawLoader
 
@@ -590,24 +612,21 @@ class CellpyData(object):
         check_on = self.filestatuschecker
         self.logger.debug("checking cellpy-file")
         self.logger.debug(filename)
-        if not os.path.isfile(filename):
+        if not cellpy_file_exists(filename):
             self.logger.debug("cellpy-file does not exist")
             return None
-        try:
-            store = pd.HDFStore(filename)
-        except Exception as e:
-            self.logger.debug(f"could not open cellpy-file ({e})")
-            return None
         fidtable = None
-        try:
-            fidtable = store.select(parent_level + fid_dir)
-        except KeyError:
-            self.logger.warning("no fidtable - you should update your hdf5-file")
-        except NotImplementedError:
-            self.logger.warning("your system cannot read the fid-table (posix-windows confusion) "
-                                "hopefully this will be solved in a newer version of pytables.")
-        finally:
-            store.close()
+        with self._cellpy_file_handle(filename) as handle:
+            try:
+                fidtable = handle.select(parent_level + fid_dir)
+            except KeyError:
+                self.logger.warning("no fidtable - you should update your hdf5-file")
+            except NotImplementedError:
+                self.logger.warning("your system cannot read the fid-table (posix-windows confusion) "
+                                    "hopefully this will be solved in a newer version of pytables.")
+            except Exception as e:
+                self.logger.debug(f"could not open cellpy-file ({e})")
+                return None
         if fidtable is not None:
             raw_data_files, raw_data_files_length = self._convert2fid_list(fidtable)
             txt = "contains %i res-files" % (len(raw_data_files))
@@ -724,7 +743,11 @@ class CellpyData(object):
         elif force_raw:
             similar = False
         else:
-            similar = self.check_file_ids(raw_files, cellpy_file)
+            # the cellpy-file is only opened once for checking and loading
+            with self._cellpy_file_handle(cellpy_file):
+                similar = self.check_file_ids(raw_files, cellpy_file)
+                if similar:
+                    self.load(cellpy_file)
         self.logger.debug("checked if the files were similar")
 
         if only_summary:
@@ -758,7 +781,6 @@ class CellpyData(object):
                 self.logger.warning("Empty run!")
 
         else:
-            self.load(cellpy_file)
             if mass:
                 self.set_mass(mass)
 
@@ -903,16 +925,13 @@ class CellpyData(object):
             test.no_cycles = max(t2.raw[cycle_index_header])
             test = t2
         self.logger.debug(" -> merged with new dataset")
+        test = identify_last_data_point(test)
 
         return test
 
     def dev_update_make_steps(self, **kwargs):
-        old_steps = self.cell.steps.iloc[:-1]
-        # Note! hard-coding header name (might fail if changing default headers)
-        from_data_point = self.cell.steps.iloc[-1].point_first
-        new_steps = self.make_step_table(from_data_point=from_data_point, **kwargs)
-        merged_steps = pd.concat([old_steps, new_steps]).reset_index(drop=True)
-        self.cell.steps = merged_steps
+        # re-calculates the last (still open) step and the new steps only
+        self.make_step_table(update=True, **kwargs)
 
     def dev_update_make_summary(self, **kwargs):
         print("NOT FINISHED YET - but not critical")
@@ -948,6 +967,9 @@ class CellpyData(object):
 
         raw_file_loader = self.loader
 
+        if data_points is not None and "previous_cycle" not in kwargs:
+            kwargs["previous_cycle"] = self._previous_cycle(data_points[0])
+
         set_number = 0
         test = None
 
@@ -979,6 +1001,21 @@ class CellpyData(object):
         self._invent_a_name()
         return self
 
+    def _previous_cycle(self, first_data_point):
+        """Cycle number of the data point before first_data_point (or None)."""
+        if not self.cells or not first_data_point:
+            return None
+        raw = self.cell.raw
+        hdr = self.headers_normal
+        if raw is None or hdr.data_point_txt not in raw.columns:
+            return None
+        previous = raw.loc[
+            raw[hdr.data_point_txt] == first_data_point - 1, hdr.cycle_index_txt
+        ]
+        if previous.empty:
+            return None
+        return int(previous.iloc[-1])
+
     def from_raw(self, file_names=None, **kwargs):
         """Load a raw data-file.
 
@@ -1177,25 +1214,58 @@ class CellpyData(object):
         """
         raise NotImplementedError
 
-    def load(self, cellpy_file, parent_level=None, return_cls=True, accept_old=True):
+    def load(
+        self,
+        cellpy_file,
+        parent_level=None,
+        return_cls=True,
+        accept_old=True,
+        tables=None,
+        raw_columns=None,
+        cycles=None,
+        data_points=None,
+        lazy=False,
+    ):
         """Loads a cellpy file.
 
+        The file format (hdf5 or parquet) is detected automatically.
+
         Args:
             cellpy_file (path, str): Full path to the cellpy file.
             parent_level (str, optional): Parent level. Warning! Deprecating this soon!
             return_cls (bool): Return the class.
             accept_old (bool): Accept loading old cellpy-file versions.
                 Instead of raising WrongFileVersion it only issues a warning.
+            tables (list of str): the tables to load ("raw", "summary" and/or
+                "steps"). Defaults to all of them. Use an empty list to only
+                load the meta-data (the raw table is then never touched).
+            raw_columns (list of str): only load these columns of the raw data.
+            cycles (list of ints): only load these cycles (raw, steps and
+                summary).
+            data_points (tuple of ints): only load the raw data from
+                data_point[0] to data_point[1] (use None for infinite).
+            lazy (bool): do not read the raw data before it is used (the raw
+                data of the cell is then a LazyRaw proxy bound to the file).
 
         Returns:
             cellpy.CellPyData class if return_cls is True
         """
 
+        selection = dict(
+            tables=tables,
+            raw_columns=raw_columns,
+            cycles=cycles,
+            data_points=data_points,
+        )
         try:
             self.logger.debug("loading cellpy-file (hdf5):")
             self.logger.debug(cellpy_file)
-            with pickle_protocol(PICKLE_PROTOCOL):
-                new_datasets = self._load_hdf5(cellpy_file, parent_level, accept_old)
+            with pickle_protocol(PICKLE_PROTOCOL), self._cellpy_file_handle(
+                cellpy_file
+            ):
+                new_datasets = self._load_hdf5(
+                    cellpy_file, parent_level, accept_old, lazy=lazy, **selection
+                )
             self.logger.debug("cellpy-file loaded")
         except AttributeError:
             new_datasets = []
@@ -1261,13 +1331,35 @@ class CellpyData(object):
         if return_cls:
             return self
 
+    @contextmanager
+    def _cellpy_file_handle(self, filename):
+        """open the cellpy-file once (re-uses the handle if it is already open).
+
+        The handle caches the meta-data and fid tables. Nested calls for the
+        same file (e.g. checking the file ids and then loading the file in
+        loadcell) share the handle, and it is closed when the outermost
+        block ends.
+        """
+        handle = self._open_cellpy_file_handle
+        if handle is not None and handle.file_name == str(filename):
+            yield handle
+            return
+        handle = CellpyFileHandle(filename)
+        previous_handle = self._open_cellpy_file_handle
+        self._open_cellpy_file_handle = handle
+        try:
+            yield handle
+        finally:
+            handle.close()
+            self._open_cellpy_file_handle = previous_handle
+
     def _get_cellpy_file_version(self, filename, meta_dir="/info", parent_level=None):
         if parent_level is None:
             parent_level = prms._cellpyfile_root
 
-        with pd.HDFStore(filename) as store:
+        with self._cellpy_file_handle(filename) as handle:
             try:
-                meta_table = store.select(parent_level + meta_dir)
+                meta_table = handle.select(parent_level + meta_dir)
             except KeyError:
                 raise WrongFileVersion(
                     "This file is VERY old - cannot read file version number"
@@ -1282,7 +1374,9 @@ class CellpyData(object):
 
         return cellpy_file_version
 
-    def _load_hdf5(self, filename, parent_level=None, accept_old=False):
+    def _load_hdf5(
+        self, filename, parent_level=None, accept_old=False, lazy=False, **selection
+    ):
         """Load a cellpy-file.
 
         Args:
@@ -1290,6 +1384,10 @@ class CellpyData(object):
             parent_level (str) (optional): name of the parent level
                 (defaults to "CellpyData"). DeprecationWarning!
             accept_old (bool): accept old file versions.
+            lazy (bool): postpone reading the raw data (only for the current
+                file version).
+            **selection: tables, raw_columns, cycles and data_points to
+                load (only for the current file version).
 
         Returns:
             loaded datasets (DataSet-object)
@@ -1303,11 +1401,13 @@ class CellpyData(object):
                 f"Using non-default parent label for the " f"hdf-store: {parent_level}"
             )
 
-        if not os.path.isfile(filename):
+        if not cellpy_file_exists(filename):
             self.logger.info(f"File does not exist: {filename}")
             raise IOError(f"File does not exist: {filename}")
 
-        cellpy_file_version = self._get_cellpy_file_version(filename)
+        cellpy_file_version = self._get_cellpy_file_version(
+            filename, parent_level=parent_level
+        )
 
         if cellpy_file_version > CELLPY_FILE_VERSION:
             raise WrongFileVersion(
@@ -1329,6 +1429,8 @@ class CellpyData(object):
                     f"Loading old file-type. It is recommended that you remake the step table and the "
                     f"summary table."
                 )
+                if lazy or any(value is not None for value in selection.values()):
+                    warnings.warn("selective loading requires the current file version")
                 new_data = self._load_old_hdf5(filename, cellpy_file_version)
             else:
                 raise WrongFileVersion(
@@ -1338,7 +1440,9 @@ class CellpyData(object):
 
         else:
             self.logger.debug(f"Loading {filename} :: v{cellpy_file_version}")
-            new_data = self._load_hdf5_current_version(filename)
+            new_data = self._load_hdf5_current_version(
+                filename, parent_level=parent_level, lazy=lazy, **selection
+            )
 
         # self.__check_loaded_data(new_data)
 
@@ -1400,7 +1504,17 @@ class CellpyData(object):
 
         return new_data
 
-    def _load_hdf5_current_version(self, filename, meta_dir="/info", parent_level=None):
+    def _load_hdf5_current_version(
+        self,
+        filename,
+        meta_dir="/info",
+        parent_level=None,
+        tables=None,
+        raw_columns=None,
+        cycles=None,
+        data_points=None,
+        lazy=False,
+    ):
         if parent_level is None:
             parent_level = prms._cellpyfile_root
 
@@ -1409,22 +1523,57 @@ class CellpyData(object):
         summary_dir = prms._cellpyfile_summary
         fid_dir = prms._cellpyfile_fid
 
-        with pd.HDFStore(filename) as store:
+        if tables is None:
+            tables = ["raw", "summary", "steps"]
+        unknown_tables = set(tables) - {"raw", "summary", "steps"}
+        if unknown_tables:
+            raise ValueError(f"unknown table(s): {unknown_tables}")
+
+        with self._cellpy_file_handle(filename) as handle:
             data, meta_table = self._create_initial_data_set_from_cellpy_file(
-                meta_dir, parent_level, store
+                meta_dir, parent_level, handle
             )
             self._check_keys_in_cellpy_file(
-                meta_dir, parent_level, raw_dir, store, summary_dir
+                meta_dir,
+                parent_level,
+                raw_dir if "raw" in tables else None,
+                handle,
+                summary_dir,
             )
-            self._extract_summary_from_cellpy_file(
-                data, parent_level, store, summary_dir
-            )
-            self._extract_raw_from_cellpy_file(data, parent_level, raw_dir, store)
-            self._extract_steps_from_cellpy_file(data, parent_level, step_dir, store)
+            if "summary" in tables:
+                self._extract_summary_from_cellpy_file(
+                    data, parent_level, handle, summary_dir
+                )
+            if "raw" in tables and lazy:
+                data.raw = LazyRaw(
+                    filename,
+                    parent_level + raw_dir,
+                    columns=raw_columns,
+                    cycles=cycles,
+                    data_points=data_points,
+                    index_key=parent_level + prms._cellpyfile_cycle_step_index,
+                )
+            elif "raw" in tables:
+                self._extract_raw_from_cellpy_file(
+                    data,
+                    parent_level,
+                    raw_dir,
+                    handle.store,
+                    columns=raw_columns,
+                    cycles=cycles,
+                    data_points=data_points,
+                )
+            if "steps" in tables:
+                self._extract_steps_from_cellpy_file(
+                    data, parent_level, step_dir, handle
+                )
             fid_table, fid_table_selected = self._extract_fids_from_cellpy_file(
-                fid_dir, parent_level, store
+                fid_dir, parent_level, handle
             )
 
+        if cycles is not None:
+            self._select_cycles_in_summary_and_steps(data, cycles)
+
         self._extract_meta_from_cellpy_file(data, meta_table, filename)
 
         if fid_table_selected:
@@ -1449,7 +1598,7 @@ class CellpyData(object):
         fid_dir = "/fid"
         meta_dir = "/info"
 
-        with pd.HDFStore(filename) as store:
+        with self._cellpy_file_handle(filename) as store:
             data, meta_table = self._create_initial_data_set_from_cellpy_file(
                 meta_dir, parent_level, store
             )
@@ -1514,7 +1663,7 @@ class CellpyData(object):
         _summary_dir = "/dfsummary"
         _fid_dir = "/fidtable"
 
-        with pd.HDFStore(filename) as store:
+        with self._cellpy_file_handle(filename) as store:
             data, meta_table = self._create_initial_data_set_from_cellpy_file(
                 meta_dir, parent_level, store
             )
@@ -1575,7 +1724,9 @@ class CellpyData(object):
     def _check_keys_in_cellpy_file(
         self, meta_dir, parent_level, raw_dir, store, summary_dir
     ):
+        # raw_dir is None when the raw data is not going to be loaded
         required_keys = [raw_dir, summary_dir, meta_dir]
+        required_keys = [key for key in required_keys if key is not None]
         required_keys = ["/" + parent_level + _ for _ in required_keys]
         for key in required_keys:
             if key not in store.keys():
@@ -1589,8 +1740,38 @@ class CellpyData(object):
         self.logger.debug(f"Keys in current cellpy-file: {store.keys()}")
 
     @staticmethod
-    def _extract_raw_from_cellpy_file(data, parent_level, raw_dir, store):
-        data.raw = store.select(parent_level + raw_dir)
+    def _extract_raw_from_cellpy_file(
+        data, parent_level, raw_dir, store, columns=None, cycles=None, data_points=None
+    ):
+        index_key = parent_level + prms._cellpyfile_cycle_step_index
+        data.raw = select_raw_from_store(
+            store,
+            parent_level + raw_dir,
+            columns=columns,
+            cycles=cycles,
+            data_points=data_points,
+            index_key=index_key,
+        )
+        if columns is None and cycles is None and data_points is None:
+            # re-using the stored index instead of building it again
+            try:
+                index = read_cycle_step_index(store, index_key)
+            except (KeyError, ValueError) as e:
+                logging.debug(f"could not read the cycle-step index ({e})")
+                index = None
+            if index is not None and index.number_of_rows == len(data.raw):
+                data._cycle_step_index = index
+
+    def _select_cycles_in_summary_and_steps(self, data, cycles):
+        cycles = list(cycles)
+        if data.summary_made:
+            cycle_index_header = self.headers_summary.cycle_index
+            data.summary = data.summary.loc[
+                data.summary[cycle_index_header].isin(cycles)
+            ]
+        if data.steps_made:
+            cycle_header = self.headers_step_table.cycle
+            data.steps = data.steps.loc[data.steps[cycle_header].isin(cycles)]
 
     @staticmethod
     def _extract_summary_from_cellpy_file(data, parent_level, store, summary_dir):
@@ -1846,6 +2027,7 @@ class CellpyData(object):
             self.logger.debug("ValueError when getting last cycle index for r1")
             last_cycle = 0
         t2.raw[cycle_index_header] = t2.raw[cycle_index_header] + last_cycle
+        t2.invalidate_cycle_step_index()
         # mod test time for set 2
         test_time_header = self.headers_normal.test_time_txt
         t2.raw[test_time_header] = t2.raw[test_time_header] + diff_time
@@ -2253,16 +2435,382 @@ class CellpyData(object):
 
         self.logger.debug("_sort_data: no datapoint header to sort by")
 
-    def _ustep(self, n):
-        un = []
-        c = 0
-        n = n.diff()
-        for i in n:
-            if i != 0:
-                c += 1
-            un.append(c)
-        self.logger.debug("created u-steps")
-        return un
+    def _ustep_columns(self):
+        # the step table columns that define a u-step (see _ustep)
+        shdr = self.headers_step_table
+        return [shdr.cycle, shdr.step, shdr.sub_step]
+
+    @staticmethod
+    def _ustep(keys, previous=None):
+        """Number the steps in the order they appear in the raw data (u-steps).
+
+        A new u-step starts on every row where any of the keys (e.g. the
+        cycle, step and sub-step numbers) differs from the row before, so
+        that a step is counted again when it is repeated (e.g. in GITT or
+        pulse tests) or when a new cycle starts with the same step number.
+
+        Args:
+            keys (pandas.Series or pandas.DataFrame): the key column(s).
+            previous (sequence): the keys of the row before the first row
+                (e.g. the last row of the previous chunk). The first row is
+                then only counted as a new u-step if it differs from it.
+
+        Returns:
+            numpy.array with the u-step numbers (starting at 1, or at 0 if
+            the first row continues the previous u-step).
+        """
+        if isinstance(keys, pd.Series):
+            columns = [keys.to_numpy()]
+        else:
+            columns = [keys[col].to_numpy() for col in keys.columns]
+        number_of_rows = len(keys)
+        changed = np.zeros(number_of_rows, dtype=bool)
+        if number_of_rows == 0:
+            return changed.astype(np.int64)
+
+        changed[0] = previous is None
+        for position, values in enumerate(columns):
+            changed[1:] |= values[1:] != values[:-1]
+            if previous is not None:
+                changed[0] |= values[0] != previous[position]
+        return np.cumsum(changed)
+
+    @staticmethod
+    def _aggregate_steps_segmented(df, by):
+        """Calculate the step statistics in one segmented pass.
+
+        Replacement for df.groupby(by).agg([mean, std, min, max, first, last,
+        delta]). The raw data is sorted by data point, so the rows belonging
+        to a step are (normally) contiguous. The step boundaries are found
+        once, and all the statistics are calculated for all the columns using
+        numpy.ufunc.reduceat. If the same (cycle, step, ...) combination
+        appears in several separated blocks, the rows are first (stable) sorted
+        by the keys so that the result is identical to the groupby result.
+
+        Args:
+            df (pandas.DataFrame): the (renamed) raw data.
+            by (list): the columns that defines a step.
+
+        Returns:
+            pandas.DataFrame with multi-level columns
+                ((col, stat) and (key, "")) and one row pr. step (same layout
+                as the reset groupby-agg frame).
+        """
+
+        stats = ["avr", "std", "min", "max", "first", "last", "delta"]
+        # non-numeric columns are dropped (as the groupby-agg method does)
+        value_cols = [
+            col
+            for col in df.columns
+            if col not in by and df[col].dtype.kind in "biuf"
+        ]
+        keys = [df[col].to_numpy() for col in by]
+
+        # groupby drops rows with missing keys
+        valid = np.ones(len(df), dtype=bool)
+        for key in keys:
+            if key.dtype.kind == "f":
+                valid &= ~np.isnan(key)
+        rows = None if valid.all() else np.flatnonzero(valid)
+        if rows is not None:
+            keys = [key[rows] for key in keys]
+
+        number_of_rows = len(keys[0]) if keys else 0
+        if not number_of_rows:
+            columns = pd.MultiIndex.from_tuples(
+                [(col, "") for col in by]
+                + [(col, stat) for col in value_cols for stat in stats]
+            )
+            return pd.DataFrame(columns=columns)
+
+        def _find_starts(key_arrays):
+            changed = np.zeros(len(key_arrays[0]), dtype=bool)
+            changed[0] = True
+            for key_array in key_arrays:
+                changed[1:] |= key_array[1:] != key_array[:-1]
+            return np.flatnonzero(changed)
+
+        starts = _find_starts(keys)
+        order = np.lexsort([key[starts] for key in reversed(keys)])
+        sorted_keys = [key[starts][order] for key in keys]
+        repeated = np.ones(len(starts) - 1, dtype=bool)
+        for key in sorted_keys:
+            repeated &= key[1:] == key[:-1]
+
+        if repeated.any():
+            # at least one step is split into separate blocks
+            row_order = np.lexsort(list(reversed(keys)))
+            rows = row_order if rows is None else rows[row_order]
+            keys = [key[row_order] for key in keys]
+            starts = _find_starts(keys)
+            order = np.arange(len(starts))
+            sorted_keys = [key[starts] for key in keys]
+
+        ends = np.append(starts[1:], number_of_rows)
+        sizes = ends - starts
+
+        data = collections.OrderedDict()
+        for col, key in zip(by, sorted_keys):
+            data[(col, "")] = key
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for col in value_cols:
+                x = df[col].to_numpy()
+                if rows is not None:
+                    x = x[rows]
+
+                nans = np.isnan(x) if x.dtype.kind == "f" else None
+                if nans is not None and nans.any():
+                    counts = np.add.reduceat(~nans, starts)
+                    x_zeroed = np.where(nans, 0.0, x)
+                else:
+                    nans = None
+                    counts = sizes
+                    x_zeroed = x
+
+                avr = np.add.reduceat(x_zeroed, starts, dtype=np.float64) / counts
+                deviation = x_zeroed - np.repeat(avr, sizes)
+                if nans is not None:
+                    deviation[nans] = 0.0
+                std = np.sqrt(
+                    np.add.reduceat(deviation * deviation, starts) / (counts - 1)
+                )
+                std[counts < 2] = np.nan
+
+                first = x[starts]
+                last = x[ends - 1]
+                delta = np.where(
+                    first == 0.0,
+                    100.0 * last,
+                    (last - first) * 100 / np.abs(first),
+                )
+
+                data[(col, "avr")] = avr[order]
+                data[(col, "std")] = std[order]
+                data[(col, "min")] = np.fmin.reduceat(x, starts)[order]
+                data[(col, "max")] = np.fmax.reduceat(x, starts)[order]
+                data[(col, "first")] = first[order]
+                data[(col, "last")] = last[order]
+                data[(col, "delta")] = delta[order]
+
+        df_steps = pd.DataFrame(data)
+        df_steps.columns = pd.MultiIndex.from_tuples(data.keys())
+        return df_steps
+
+    def _prepare_raw_for_step_table(self, df, skip_steps=None):
+        # selects and renames the raw data columns used in the step table
+        nhdr = self.headers_normal
+        shdr = self.headers_step_table
+
+        # df[shdr.internal_resistance_change] = \
+        #     df[nhdr.internal_resistance_txt].pct_change()
+
+        # selecting only the most important columns from raw:
+        keep = [
+            nhdr.data_point_txt,
+            nhdr.test_time_txt,
+            nhdr.step_time_txt,
+            nhdr.step_index_txt,
+            nhdr.cycle_index_txt,
+            nhdr.current_txt,
+            nhdr.voltage_txt,
+            nhdr.ref_voltage_txt,
+            nhdr.charge_capacity_txt,
+            nhdr.discharge_capacity_txt,
+            nhdr.internal_resistance_txt,
+            # "ir_pct_change"
+        ]
+
+        # only use col-names that exist:
+        keep = [col for col in keep if col in df.columns]
+        df = df[keep]
+        # preparing for implementation of sub_steps (will come in the future):
+        df[nhdr.sub_step_index_txt] = 1
+
+        # using headers as defined in the internal_settings.py file
+        rename_dict = {
+            nhdr.cycle_index_txt: shdr.cycle,
+            nhdr.step_index_txt: shdr.step,
+            nhdr.sub_step_index_txt: shdr.sub_step,
+            nhdr.data_point_txt: shdr.point,
+            nhdr.test_time_txt: shdr.test_time,
+            nhdr.step_time_txt: shdr.step_time,
+            nhdr.current_txt: shdr.current,
+            nhdr.voltage_txt: shdr.voltage,
+            nhdr.charge_capacity_txt: shdr.charge,
+            nhdr.discharge_capacity_txt: shdr.discharge,
+            nhdr.internal_resistance_txt: shdr.internal_resistance,
+        }
+
+        df = df.rename(columns=rename_dict)
+
+        if skip_steps is not None:
+            self.logger.debug(f"omitting steps {skip_steps}")
+            df = df.loc[~df[shdr.step].isin(skip_steps)]
+        return df
+
+    def _aggregate_steps_in_chunks(self, chunks, by, skip_steps=None):
+        """Calculate the step statistics from raw data given in chunks.
+
+        Each chunk is split into blocks of contiguous rows with the same
+        (cycle, step, ...) keys, and the count, sum, sum of squared deviations,
+        min, max, first and last value of each block is calculated. The
+        blocks are then merged pr. step, so that steps crossing the chunk
+        boundaries (and steps split into separated blocks) give the same
+        result as _aggregate_steps_segmented. Only one chunk of raw data and
+        the block statistics are kept in memory.
+
+        Args:
+            chunks (iterable of pandas.DataFrame): the raw data (see iter_raw).
+            by (list): the columns that defines a step (the u-step column is
+                created if it is included).
+            skip_steps (list of integers): step numbers that should be left out.
+
+        Returns:
+            pandas.DataFrame with the same layout as _aggregate_steps_segmented.
+        """
+        ustep_txt = self.headers_step_table.ustep
+        ustep_by = self._ustep_columns()
+        blocks = []
+        ustep_offset = 0
+        last_keys = None
+        for chunk in chunks:
+            df = self._prepare_raw_for_step_table(chunk, skip_steps=skip_steps)
+            if df.empty:
+                continue
+            if ustep_txt in by:
+                # the u-step counter continues from the previous chunk
+                keys = df[ustep_by]
+                df[ustep_txt] = self._ustep(keys, previous=last_keys) + ustep_offset
+                ustep_offset = int(df[ustep_txt].iloc[-1])
+                last_keys = keys.iloc[-1].to_numpy()
+            block = self._block_statistics(df, by)
+            if block is not None:
+                blocks.append(block)
+
+        return self._merge_block_statistics(blocks, by)
+
+    @staticmethod
+    def _block_statistics(df, by):
+        # statistics for each block of contiguous rows with the same keys
+        # (returned as a dict of arrays with one element pr. block)
+        value_cols = [
+            col
+            for col in df.columns
+            if col not in by and df[col].dtype.kind in "biuf"
+        ]
+        keys = [df[col].to_numpy() for col in by]
+
+        # groupby drops rows with missing keys
+        valid = np.ones(len(df), dtype=bool)
+        for key in keys:
+            if key.dtype.kind == "f":
+                valid &= ~np.isnan(key)
+        rows = np.flatnonzero(valid)
+        if not len(rows):
+            return None
+        keys = [key[rows] for key in keys]
+
+        changed = np.zeros(len(rows), dtype=bool)
+        changed[0] = True
+        for key in keys:
+            changed[1:] |= key[1:] != key[:-1]
+        starts = np.flatnonzero(changed)
+        ends = np.append(starts[1:], len(rows))
+        sizes = ends - starts
+
+        blocks = collections.OrderedDict()
+        for col, key in zip(by, keys):
+            blocks[col] = key[starts]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for col in value_cols:
+                x = df[col].to_numpy()[rows]
+                if x.dtype.kind == "f":
+                    nans = np.isnan(x)
+                else:
+                    nans = np.zeros(len(x), dtype=bool)
+                x_zeroed = np.where(nans, 0, x)
+                counts = np.add.reduceat(~nans, starts)
+                sums = np.add.reduceat(x_zeroed, starts, dtype=np.float64)
+                deviation = x_zeroed - np.repeat(sums / counts, sizes)
+                deviation[nans] = 0.0
+                blocks[(col, "count")] = counts
+                blocks[(col, "sum")] = sums
+                blocks[(col, "m2")] = np.add.reduceat(deviation * deviation, starts)
+                blocks[(col, "min")] = np.fmin.reduceat(x, starts)
+                blocks[(col, "max")] = np.fmax.reduceat(x, starts)
+                blocks[(col, "first")] = x[starts]
+                blocks[(col, "last")] = x[ends - 1]
+        return blocks
+
+    @staticmethod
+    def _merge_block_statistics(blocks, by):
+        # merges the block statistics (in the order of the raw data) pr. step
+        if not blocks:
+            columns = pd.MultiIndex.from_tuples([(col, "") for col in by])
+            return pd.DataFrame(columns=columns)
+
+        merged = {
+            name: np.concatenate([block[name] for block in blocks])
+            for name in blocks[0]
+        }
+        keys = [merged[col] for col in by]
+        # lexsort is stable - the blocks of each step stay in order
+        order = np.lexsort(list(reversed(keys)))
+        keys = [key[order] for key in keys]
+        changed = np.zeros(len(order), dtype=bool)
+        changed[0] = True
+        for key in keys:
+            changed[1:] |= key[1:] != key[:-1]
+        starts = np.flatnonzero(changed)
+        ends = np.append(starts[1:], len(order))
+        sizes = ends - starts
+
+        data = collections.OrderedDict()
+        for col, key in zip(by, keys):
+            data[(col, "")] = key[starts]
+
+        value_cols = [name[0] for name in merged if name[-1] == "count"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for col in value_cols:
+                block_counts = merged[(col, "count")][order]
+                block_sums = merged[(col, "sum")][order]
+                counts = np.add.reduceat(block_counts, starts)
+                avr = np.add.reduceat(block_sums, starts) / counts
+
+                # combining the squared deviations from the mean of each block
+                spread = block_counts * (
+                    block_sums / block_counts - np.repeat(avr, sizes)
+                ) ** 2
+                spread[block_counts == 0] = 0.0
+                m2 = np.add.reduceat(merged[(col, "m2")][order] + spread, starts)
+                std = np.sqrt(m2 / (counts - 1))
+                std[counts < 2] = np.nan
+
+                first = merged[(col, "first")][order][starts]
+                last = merged[(col, "last")][order][ends - 1]
+                delta = np.where(
+                    first == 0.0,
+                    100.0 * last,
+                    (last - first) * 100 / np.abs(first),
+                )
+
+                data[(col, "avr")] = avr
+                data[(col, "std")] = std
+                data[(col, "min")] = np.fmin.reduceat(
+                    merged[(col, "min")][order], starts
+                )
+                data[(col, "max")] = np.fmax.reduceat(
+                    merged[(col, "max")][order], starts
+                )
+                data[(col, "first")] = first
+                data[(col, "last")] = last
+                data[(col, "delta")] = delta
+
+        df_steps = pd.DataFrame(data)
+        df_steps.columns = pd.MultiIndex.from_tuples(data.keys())
+        return df_steps
 
     def make_step_table(
         self,
@@ -2275,6 +2823,9 @@ class CellpyData(object):
         sort_rows=True,
         dataset_number=None,
         from_data_point=None,
+        engine=None,
+        update=False,
+        chunksize=None,
     ):
 
         """ Create a table (v.4) that contains summary information for each step.
@@ -2306,12 +2857,24 @@ class CellpyData(object):
             sort_rows (bool): sort the rows after processing.
             dataset_number: defaults to self.dataset_number
             from_data_point (int): first data point to use
+            engine (str): the engine used for calculating the step statistics,
+                "segmented" (one vectorized pass over the sorted raw data) or
+                "groupby" (the old pandas groupby-agg method). Defaults to
+                prms.Reader.step_table_engine.
+            update (bool): only re-calculate the steps that contains data from
+                from_data_point and onwards (including the last step of the
+                old data if from_data_point is None) and splice them into
+                the existing step table.
+            chunksize (int): process the raw data in chunks of this many rows
+                (see iter_raw) while carrying the statistics of the steps over
+                the chunk boundaries. Use this together with loading the
+                cellpy-file with lazy=True for raw data bigger than the memory.
+                Can not be combined with from_data_point or update.
 
         Returns:
             None
         """
         # TODO: @jepe - include option for omitting steps
-        # TODO: @jepe  - make it is possible to update only new data
 
         time_00 = time.time()
         dataset_number = self._validate_dataset_number(dataset_number)
@@ -2319,6 +2882,12 @@ class CellpyData(object):
             self._report_empty_dataset()
             return
 
+        if engine is None:
+            engine = prms.Reader.step_table_engine
+
+        if chunksize is not None and (update or from_data_point is not None):
+            raise ValueError("chunksize can not be combined with update")
+
         if profiling:
             print("PROFILING MAKE_STEP_TABLE".center(80, "="))
 
@@ -2337,82 +2906,74 @@ class CellpyData(object):
 
             return difference
 
-        nhdr = self.headers_normal
         shdr = self.headers_step_table
 
-        if from_data_point is not None:
-            df = self.cells[dataset_number].raw.loc[
-                self.cells[dataset_number].raw[nhdr.data_point_txt] >= from_data_point
-            ]
-        else:
-            df = self.cells[dataset_number].raw
-        # df[shdr.internal_resistance_change] = \
-        #     df[nhdr.internal_resistance_txt].pct_change()
-
-        # selecting only the most important columns from raw:
-        keep = [
-            nhdr.data_point_txt,
-            nhdr.test_time_txt,
-            nhdr.step_time_txt,
-            nhdr.step_index_txt,
-            nhdr.cycle_index_txt,
-            nhdr.current_txt,
-            nhdr.voltage_txt,
-            nhdr.ref_voltage_txt,
-            nhdr.charge_capacity_txt,
-            nhdr.discharge_capacity_txt,
-            nhdr.internal_resistance_txt,
-            # "ir_pct_change"
-        ]
+        raw = self.cells[dataset_number].raw
+        old_steps = None
+        ustep_offset = 0
+        if update:
+            if self.cells[dataset_number].steps_made:
+                old_steps = self.cells[dataset_number].steps
+                from_data_point = self._find_step_table_update_start(
+                    old_steps, raw, from_data_point
+                )
+                self.logger.debug(f"updating steps from point {from_data_point}")
+                old_steps = old_steps.loc[
+                    old_steps[shdr.point + "_last"] < from_data_point
+                ]
+                if all_steps and shdr.ustep in old_steps.columns:
+                    ustep_offset = self._find_ustep_offset(
+                        old_steps, raw, from_data_point
+                    )
+            else:
+                self.logger.debug("no step table to update - making a new one")
+                from_data_point = None
 
-        # only use col-names that exist:
-        keep = [col for col in keep if col in df.columns]
-        df = df[keep]
-        # preparing for implementation of sub_steps (will come in the future):
-        df[nhdr.sub_step_index_txt] = 1
+        by = [shdr.cycle, shdr.step, shdr.sub_step]
+        if all_steps:
+            by.append(shdr.ustep)
 
-        # using headers as defined in the internal_settings.py file
-        rename_dict = {
-            nhdr.cycle_index_txt: shdr.cycle,
-            nhdr.step_index_txt: shdr.step,
-            nhdr.sub_step_index_txt: shdr.sub_step,
-            nhdr.data_point_txt: shdr.point,
-            nhdr.test_time_txt: shdr.test_time,
-            nhdr.step_time_txt: shdr.step_time,
-            nhdr.current_txt: shdr.current,
-            nhdr.voltage_txt: shdr.voltage,
-            nhdr.charge_capacity_txt: shdr.charge,
-            nhdr.discharge_capacity_txt: shdr.discharge,
-            nhdr.internal_resistance_txt: shdr.internal_resistance,
-        }
+        if profiling:
+            time_01 = time.time()
 
-        df = df.rename(columns=rename_dict)
+        if chunksize is not None:
+            self.logger.debug(f"groupby: {by} (in chunks of {chunksize} rows)")
+            df_steps = self._aggregate_steps_in_chunks(
+                self.iter_raw(chunksize=chunksize, dataset_number=dataset_number),
+                by,
+                skip_steps=skip_steps,
+            )
 
-        by = [shdr.cycle, shdr.step, shdr.sub_step]
+        else:
+            if from_data_point is not None:
+                df = self._select_from_data_point(raw, from_data_point)
+            else:
+                df = raw
+            df = self._prepare_raw_for_step_table(df, skip_steps=skip_steps)
 
-        if skip_steps is not None:
-            self.logger.debug(f"omitting steps {skip_steps}")
-            df = df.loc[~df[shdr.step].isin(skip_steps)]
+            if all_steps:
+                ustep_by = self._ustep_columns()
+                df[shdr.ustep] = self._ustep(df[ustep_by]) + ustep_offset
 
-        if all_steps:
-            by.append(shdr.ustep)
-            df[shdr.ustep] = self._ustep(df[shdr.step])
+            self.logger.debug(f"groupby: {by} (engine: {engine})")
 
-        self.logger.debug(f"groupby: {by}")
+            if engine == "groupby":
+                gf = df.groupby(by=by)
+                df_steps = gf.agg(
+                    [np.mean, np.std, np.amin, np.amax, first, last, delta]
+                ).rename(columns={"amin": "min", "amax": "max", "mean": "avr"})
 
-        if profiling:
-            time_01 = time.time()
+                # TODO: [#index]
+                df_steps = df_steps.reset_index()
 
-        gf = df.groupby(by=by)
-        df_steps = gf.agg(
-            [np.mean, np.std, np.amin, np.amax, first, last, delta]
-        ).rename(columns={"amin": "min", "amax": "max", "mean": "avr"})
+            elif engine == "segmented":
+                df_steps = self._aggregate_steps_segmented(df, by)
 
-        # TODO: [#index]
-        df_steps = df_steps.reset_index()
+            else:
+                raise ValueError(f"option does not exist: '{engine}'")
 
         if profiling:
-            print(f"*** groupby-agg: {time.time() - time_01} s")
+            print(f"*** {engine}-agg: {time.time() - time_01} s")
             time_01 = time.time()
 
         # new cols
@@ -2616,14 +3177,83 @@ class CellpyData(object):
         if profiling:
             print(f"*** flattening: {time.time() - time_01} s")
 
+        if old_steps is not None:
+            self.logger.debug("splicing the new steps into the old step table")
+            if "index" in df_steps.columns and "index" in old_steps.columns:
+                df_steps["index"] += len(old_steps)
+            df_steps = pd.concat([old_steps, df_steps], ignore_index=True)
+
         self.logger.debug(f"(dt: {(time.time() - time_00):4.2f}s)")
 
-        if from_data_point is not None:
+        if from_data_point is not None and not update:
             return df_steps
         else:
             self.cells[dataset_number].steps = df_steps
             return self
 
+    def _select_from_data_point(self, raw, from_data_point):
+        # selects the raw data from (and including) a given data point
+        d_txt = self.headers_normal.data_point_txt
+        if prms.Reader.sorted_data:
+            start = raw[d_txt].searchsorted(from_data_point, side="left")
+            return raw.iloc[start:]
+        return raw.loc[raw[d_txt] >= from_data_point]
+
+    def _find_step_table_update_start(self, steps, raw, from_data_point=None):
+        # finds the first data point of the first step that must be
+        # re-calculated when the raw data has got new rows (the last step in
+        # the old data might still be "open")
+        point_first = self.headers_step_table.point + "_first"
+        point_last = self.headers_step_table.point + "_last"
+        d_txt = self.headers_normal.data_point_txt
+
+        if from_data_point is None:
+            start = steps[point_last].max()
+        else:
+            previous_points = self._select_to_data_point(raw, from_data_point)[d_txt]
+            if previous_points.empty:
+                start = from_data_point
+            else:
+                start = previous_points.iloc[-1]
+
+        # steps can contain separated blocks of rows (since they are grouped by
+        # cycle and step), so keep going until no kept step overlaps
+        while True:
+            affected = steps[point_last] >= start
+            if not affected.any():
+                break
+            new_start = steps.loc[affected, point_first].min()
+            if not new_start < start:
+                break
+            start = new_start
+        return start
+
+    def _select_to_data_point(self, raw, to_data_point):
+        # selects the raw data up to (but not including) a given data point
+        d_txt = self.headers_normal.data_point_txt
+        if prms.Reader.sorted_data:
+            stop = raw[d_txt].searchsorted(to_data_point, side="left")
+            return raw.iloc[:stop]
+        return raw.loc[raw[d_txt] < to_data_point]
+
+    def _find_ustep_offset(self, old_steps, raw, from_data_point):
+        # the u-step counter continues from the last kept step (the counter
+        # is only increased when the keys of _ustep_columns change)
+        if old_steps.empty:
+            return 0
+        offset = int(old_steps[self.headers_step_table.ustep].max())
+        previous_rows = self._select_to_data_point(raw, from_data_point)
+        next_rows = self._select_from_data_point(raw, from_data_point)
+        if previous_rows.empty or next_rows.empty:
+            return offset
+        keys = self._ustep_columns()
+        previous_row = self._prepare_raw_for_step_table(previous_rows.iloc[-1:])
+        next_row = self._prepare_raw_for_step_table(next_rows.iloc[:1])
+        first = self._ustep(
+            next_row[keys], previous=previous_row[keys].iloc[-1].to_numpy()
+        )
+        return offset + int(first[0]) - 1
+
     def select_steps(self, step_dict, append_df=False, dataset_number=None):
         """Select steps (not documented yet)."""
         raise DeprecatedFeature
@@ -2653,7 +3283,7 @@ class CellpyData(object):
             sys.exit(-1)
 
         # self.logger.debug(f"selecting cycle {cycle} step {step}")
-        v = test.raw[(test.raw[c_txt] == cycle) & (test.raw[s_txt] == step)]
+        v = self._select_rows(test, cycle, step)
 
         if self.is_empty(v):
             self.logger.debug("empty dataframe")
@@ -2661,6 +3291,13 @@ class CellpyData(object):
         else:
             return v
 
+    @staticmethod
+    def _select_rows(cell, cycle, step=None):
+        # look up the rows using the row-range index of the cell instead of
+        # masking the full raw frame (returns a slice of the raw frame)
+        rows = cell.cycle_step_index.rows(cycle, step)
+        return cell.raw.iloc[rows]
+
     def populate_step_dict(self, step, dataset_number=None):
         """Returns a dict with cycle numbers as keys
         and corresponding steps (list) as values."""
@@ -2971,8 +3608,10 @@ class CellpyData(object):
         dataset_number=None,
         force=False,
         overwrite=True,
-        extension="h5",
+        extension=None,
         ensure_step_table=None,
+        file_format=None,
+        append=False,
     ):
         """Save the data structure to cellpy-format.
 
@@ -2984,8 +3623,18 @@ class CellpyData(object):
                 (not recommended)
             overwrite: (bool) save the new version of the file even if old one
                 exists.
-            extension: (str) filename extension.
+            extension: (str) filename extension (defaults to "h5" for hdf5
+                and "cellpy" for parquet).
             ensure_step_table: (bool) make step-table if missing.
+            file_format: (str) "hdf5" or "parquet" (a directory with one
+                parquet file pr. table). Defaults to the format of the file
+                that is overwritten or else prms._cellpyfile_format.
+            append: (bool) only write the raw data after the last data point
+                in the existing file and replace the tail of the step table
+                and summary (starting from the first cycle with new data).
+                Falls back to saving the full file if the existing file can
+                not be appended to (only hdf5 files with raw data saved in
+                the table format).
 
         Returns: Nothing at all.
         """
@@ -3021,18 +3670,39 @@ class CellpyData(object):
             self.logger.info("If you really want to do it, use save with force=True")
             return
 
+        default_format = file_format or prms._cellpyfile_format
+        if default_format not in CELLPY_FILE_FORMATS:
+            raise ValueError(f"unknown cellpy-file format: {default_format}")
+        if extension is None:
+            extension = CELLPY_FILE_FORMATS[default_format].extension
+
         if not os.path.splitext(filename)[-1]:
             outfile_all = filename + "." + extension
         else:
             outfile_all = filename
 
-        if os.path.isfile(outfile_all):
+        if file_format is None:
+            # keep the format of the file that is overwritten
+            if cellpy_file_exists(outfile_all):
+                file_format = detect_cellpy_file_format(outfile_all)
+            else:
+                file_format = default_format
+
+        if isinstance(test.raw, LazyRaw):
+            # the raw data must be read before the file is (over)written
+            test.raw = test.raw.frame
+
+        appending = (
+            append and file_format == "hdf5" and os.path.isfile(outfile_all)
+        )
+
+        if os.path.exists(outfile_all) and not appending:
             self.logger.debug("Outfile exists")
             if overwrite:
                 self.logger.debug("overwrite = True")
                 try:
-                    os.remove(outfile_all)
-                except PermissionError as e:
+                    remove_cellpy_file(outfile_all)
+                except OSError as e:
                     self.logger.info("Could not over write old file")
                     self.logger.info(e)
                     return
@@ -3051,7 +3721,51 @@ class CellpyData(object):
         self.logger.debug("trying to make infotable")
         infotbl, fidtbl = self._create_infotable(dataset_number=dataset_number)
 
-        root = prms._cellpyfile_root
+        if appending:
+            with pickle_protocol(4):
+                appended = self._append_to_cellpy_file(
+                    outfile_all, test, infotbl, fidtbl
+                )
+            if appended:
+                return
+            self.logger.info("could not append to the cellpy-file - saving all")
+            remove_cellpy_file(outfile_all)
+
+        self.logger.debug("trying to save to hdf5")
+        txt = "\nHDF5 file: %s" % outfile_all
+        self.logger.debug(txt)
+
+        warnings.simplefilter("ignore", PerformanceWarning)
+        try:
+            with pickle_protocol(4):
+                store = open_cellpy_store(
+                    outfile_all,
+                    file_format=file_format,
+                    complib=prms._cellpyfile_complib,
+                    complevel=prms._cellpyfile_complevel,
+                )
+                self._put_cell_in_cellpy_store(store, test, infotbl, fidtbl)
+        finally:
+            store.close()
+        self.logger.debug(" all -> hdf5 OK")
+        warnings.simplefilter("default", PerformanceWarning)
+        # del store
+
+    def _put_cell_in_cellpy_store(
+        self, store, test, infotbl, fidtbl, parent_level=None, include_raw=True
+    ):
+        """write the tables of a cell to an opened store (hdf5 or parquet).
+
+        Args:
+            store: the opened store.
+            test: the cell (DataSet object).
+            infotbl: the meta-data table (from _create_infotable).
+            fidtbl: the fid table (from _create_infotable).
+            parent_level (str): the group to put the tables in (defaults to
+                prms._cellpyfile_root).
+            include_raw (bool): also write the raw data.
+        """
+        root = parent_level or prms._cellpyfile_root
 
         if CELLPY_FILE_VERSION > 4:
             raw_dir = prms._cellpyfile_raw
@@ -3067,72 +3781,223 @@ class CellpyData(object):
             meta_dir = "/info"
             fid_dir = "/fidtable"
 
-        self.logger.debug("trying to save to hdf5")
-        txt = "\nHDF5 file: %s" % outfile_all
-        self.logger.debug(txt)
+        if include_raw:
+            self.logger.debug("trying to put raw data")
 
-        warnings.simplefilter("ignore", PerformanceWarning)
-        try:
-            with pickle_protocol(4):
-                store = pd.HDFStore(
-                    outfile_all,
-                    complib=prms._cellpyfile_complib,
-                    complevel=prms._cellpyfile_complevel,
-                )
+            self.logger.debug(" - lets set Data_Point as index")
 
-                self.logger.debug("trying to put raw data")
+            hdr_data_point = self.headers_normal.data_point_txt
 
-                self.logger.debug(" - lets set Data_Point as index")
+            if test.raw.index.name != hdr_data_point:
+                test.raw = test.raw.set_index(hdr_data_point, drop=False)
 
-                hdr_data_point = self.headers_normal.data_point_txt
+            raw_kwargs = dict()
+            if prms._cellpyfile_raw_format == "table":
+                raw_kwargs["data_columns"] = [
+                    self.headers_normal[key]
+                    for key in prms._cellpyfile_raw_data_columns
+                    if self.headers_normal[key] in test.raw.columns
+                ]
+            store.put(
+                root + raw_dir,
+                test.raw,
+                format=prms._cellpyfile_raw_format,
+                **raw_kwargs,
+                **table_compression("raw"),
+            )
+            self.logger.debug(" raw -> hdf5 OK")
 
-                if test.raw.index.name != hdr_data_point:
-                    test.raw = test.raw.set_index(hdr_data_point, drop=False)
+            self.logger.debug("trying to put cycle-step index")
+            store.put(
+                root + prms._cellpyfile_cycle_step_index,
+                test.cycle_step_index.to_frame(),
+                format="table",
+            )
+            self.logger.debug(" cycle-step index -> hdf5 OK")
+
+        self.logger.debug("trying to put summary")
+        store.put(
+            root + summary_dir,
+            test.summary,
+            format=prms._cellpyfile_summary_format,
+            **table_compression("summary"),
+        )
+        self.logger.debug(" summary -> hdf5 OK")
 
-                store.put(root + raw_dir, test.raw, format=prms._cellpyfile_raw_format)
-                self.logger.debug(" raw -> hdf5 OK")
+        self.logger.debug("trying to put meta data")
+        store.put(root + meta_dir, infotbl, format=prms._cellpyfile_infotable_format)
+        self.logger.debug(" meta -> hdf5 OK")
 
-                self.logger.debug("trying to put summary")
-                store.put(
-                    root + summary_dir, test.summary, format=prms._cellpyfile_summary_format
-                )
-                self.logger.debug(" summary -> hdf5 OK")
+        self.logger.debug("trying to put fidtable")
+        store.put(root + fid_dir, fidtbl, format=prms._cellpyfile_fidtable_format)
+        self.logger.debug(" fid -> hdf5 OK")
 
-                self.logger.debug("trying to put meta data")
-                store.put(
-                    root + meta_dir, infotbl, format=prms._cellpyfile_infotable_format
+        self.logger.debug("trying to put step")
+        try:
+            store.put(
+                root + step_dir,
+                test.steps,
+                format=prms._cellpyfile_stepdata_format,
+                **table_compression("steps"),
+            )
+            self.logger.debug(" step -> hdf5 OK")
+        except TypeError:
+            test = self._fix_dtype_step_table(test)
+            store.put(
+                root + step_dir,
+                test.steps,
+                format=prms._cellpyfile_stepdata_format,
+                **table_compression("steps"),
+            )
+            self.logger.debug(" fixed step -> hdf5 OK")
+
+        # creating indexes
+        # hdr_data_point = self.headers_normal.data_point_txt
+        # hdr_cycle_steptable = self.headers_step_table.cycle
+        # hdr_cycle_normal = self.headers_normal.cycle_index_txt
+
+        # store.create_table_index(root + "/raw", columns=[hdr_data_point],
+        #                          optlevel=9, kind='full')
+
+    def _append_to_cellpy_file(self, filename, test, infotbl, fidtbl):
+        """append new raw data to a cellpy-file (returns False if not possible).
+
+        Only the raw data after the last stored data point is written. The
+        rows of the step table and summary from the first cycle containing
+        new data are replaced, and the meta and fid tables are re-written.
+
+        The number of raw rows before appending is stored as an attribute of
+        the raw table until everything is written. An interrupted append is
+        rolled back (raw rows removed) the next time the file is appended to.
+        """
+        root = prms._cellpyfile_root
+        raw_key = root + prms._cellpyfile_raw
+        hdr_data_point = self.headers_normal.data_point_txt
+        hdr_cycle = self.headers_normal.cycle_index_txt
+
+        if test.raw.index.name != hdr_data_point:
+            test.raw = test.raw.set_index(hdr_data_point, drop=False)
+
+        with pd.HDFStore(
+            filename,
+            complib=prms._cellpyfile_complib,
+            complevel=prms._cellpyfile_complevel,
+        ) as store:
+            try:
+                meta_table = store.select(root + "/info")
+            except KeyError:
+                return False
+            version = self._extract_from_dict(meta_table, "cellpy_file_version")
+            raw_storer = store.get_storer(raw_key)
+            if version != CELLPY_FILE_VERSION or raw_storer is None:
+                return False
+            if not raw_storer.is_table:
+                self.logger.debug("the raw data is not saved as a table")
+                return False
+
+            start = getattr(raw_storer.attrs, "cellpy_append_start", None)
+            if start is not None and start < raw_storer.nrows:
+                self.logger.warning(
+                    "the previous append to the cellpy-file did not finish "
+                    f"- removing raw rows after row {start}"
                 )
-                self.logger.debug(" meta -> hdf5 OK")
+                store.remove(raw_key, start=start)
+            number_of_rows = raw_storer.nrows
 
-                self.logger.debug("trying to put fidtable")
-                store.put(root + fid_dir, fidtbl, format=prms._cellpyfile_fidtable_format)
-                self.logger.debug(" fid -> hdf5 OK")
+            last_data_point = 0
+            if number_of_rows:
+                last_row = store.select(raw_key, start=number_of_rows - 1)
+                last_data_point = last_row.index[-1]
+            new_raw = test.raw.loc[test.raw.index > last_data_point]
+            self.logger.debug(
+                f"appending {len(new_raw)} rows after data point {last_data_point}"
+            )
 
-                self.logger.debug("trying to put step")
-                try:
-                    store.put(
-                        root + step_dir, test.steps, format=prms._cellpyfile_stepdata_format
+            raw_storer.attrs.cellpy_append_start = number_of_rows
+            store.flush(fsync=True)
+            try:
+                if not new_raw.empty:
+                    first_cycle = new_raw[hdr_cycle].min()
+                    store.append(raw_key, new_raw)
+                    self._append_to_cycle_step_index(
+                        store, root, new_raw, number_of_rows
                     )
-                    self.logger.debug(" step -> hdf5 OK")
-                except TypeError:
-                    test = self._fix_dtype_step_table(test)
-                    store.put(
-                        root + step_dir, test.steps, format=prms._cellpyfile_stepdata_format
+                    self._replace_tail_of_table(
+                        store,
+                        root + prms._cellpyfile_summary,
+                        test.summary,
+                        self.headers_summary.cycle_index,
+                        first_cycle,
+                        prms._cellpyfile_summary_format,
+                        "summary",
                     )
-                    self.logger.debug(" fixed step -> hdf5 OK")
-
-                # creating indexes
-                # hdr_data_point = self.headers_normal.data_point_txt
-                # hdr_cycle_steptable = self.headers_step_table.cycle
-                # hdr_cycle_normal = self.headers_normal.cycle_index_txt
+                    self._replace_tail_of_table(
+                        store,
+                        root + prms._cellpyfile_step,
+                        test.steps,
+                        self.headers_step_table.cycle,
+                        first_cycle,
+                        prms._cellpyfile_stepdata_format,
+                        "steps",
+                    )
+                store.put(
+                    root + "/info", infotbl, format=prms._cellpyfile_infotable_format
+                )
+                store.put(
+                    root + prms._cellpyfile_fid,
+                    fidtbl,
+                    format=prms._cellpyfile_fidtable_format,
+                )
+            except (ValueError, TypeError) as e:
+                self.logger.info(f"appending failed ({e})")
+                return False
+            del raw_storer.attrs.cellpy_append_start
+            store.flush(fsync=True)
+        return True
+
+    def _append_to_cycle_step_index(self, store, root, new_raw, number_of_rows):
+        """add the appended raw rows to the stored cycle-step index"""
+        index_key = root + prms._cellpyfile_cycle_step_index
+        new_index = CycleStepIndex(
+            new_raw[self.headers_normal.cycle_index_txt].values,
+            new_raw[self.headers_normal.step_index_txt].values,
+            data_points=new_raw.index.values,
+        )
+        index = read_cycle_step_index(store, index_key)
+        if index is not None and index.number_of_rows == number_of_rows:
+            new_index = index.append(new_index)
+        elif number_of_rows:
+            # missing (older file) or wrong index - make it from the stored data
+            raw = store.select(root + prms._cellpyfile_raw)
+            new_index = CycleStepIndex(
+                raw[self.headers_normal.cycle_index_txt].values,
+                raw[self.headers_normal.step_index_txt].values,
+                data_points=raw.index.values,
+            )
+        store.put(index_key, new_index.to_frame(), format="table")
 
-                # store.create_table_index(root + "/raw", columns=[hdr_data_point],
-                #                          optlevel=9, kind='full')
-        finally:
-            store.close()
-        self.logger.debug(" all -> hdf5 OK")
-        warnings.simplefilter("default", PerformanceWarning)
-        # del store
+    def _replace_tail_of_table(
+        self, store, key, frame, cycle_header, first_cycle, table_format, table
+    ):
+        """replace the rows for cycles >= first_cycle in a (small) table"""
+        compression = table_compression(table)
+        storer = store.get_storer(key)
+        if storer is None or not storer.is_table:
+            store.put(key, frame, format=table_format, **compression)
+            return
+        stored_cycles = store.select(key)[cycle_header].values
+        position = int(np.searchsorted(stored_cycles, first_cycle))
+        if position < len(stored_cycles):
+            store.remove(key, start=position)
+        tail = frame.loc[frame[cycle_header] >= first_cycle]
+        if tail.empty:
+            return
+        try:
+            store.append(key, tail)
+        except (ValueError, TypeError) as e:
+            # e.g. longer strings than the stored ones - re-write the table
+            self.logger.debug(f"could not append to {key} ({e})")
+            store.put(key, frame, format=table_format, **compression)
 
     # --------------helper-functions--------------------------------------------
     def _fix_dtype_step_table(self, dataset):
@@ -3187,13 +4052,13 @@ class CellpyData(object):
             self._report_empty_dataset()
             return
         cycle_index_header = self.headers_normal.cycle_index_txt
-        step_index_header = self.headers_normal.step_index_txt
         discharge_index_header = self.headers_normal.discharge_capacity_txt
         discharge_energy_index_header = self.headers_normal.discharge_energy_txt
         charge_index_header = self.headers_normal.charge_capacity_txt
         charge_energy_index_header = self.headers_normal.charge_energy_txt
 
-        raw = self.cells[dataset_number].raw
+        cell = self.cells[dataset_number]
+        raw = cell.raw
 
         chargecap = 0.0
         dischargecap = 0.0
@@ -3215,15 +4080,8 @@ class CellpyData(object):
                 steps = discharge_cycles[j]
                 txt = "Cycle  %i (discharge):  " % j
                 self.logger.debug(txt)
-                # TODO: @jepe - use pd.loc[row,column] e.g. pd.loc[:,"charge_cap"]
-                # for col or pd.loc[(pd.["step"]==1),"x"]
-                selection = (raw[cycle_index_header] == j) & (
-                    raw[step_index_header].isin(steps)
-                )
-                c0 = raw[selection].iloc[0][cap_header]
-                e0 = raw[selection].iloc[0][e_header]
-                raw.loc[selection, cap_header] = raw.loc[selection, cap_header] - c0
-                raw.loc[selection, e_header] = raw.loc[selection, e_header] - e0
+                selection = cell.cycle_step_index.rows(j, steps)
+                self._reset_raw_columns(raw, selection, [cap_header, e_header])
 
                 cap_type = "charge"
                 e_header = charge_energy_index_header
@@ -3238,17 +4096,19 @@ class CellpyData(object):
                 txt = "Cycle  %i (charge):  " % j
                 self.logger.debug(txt)
 
-                selection = (raw[cycle_index_header] == j) & (
-                    raw[step_index_header].isin(steps)
-                )
-
-                if any(selection):
-                    c0 = raw[selection].iloc[0][cap_header]
-                    e0 = raw[selection].iloc[0][e_header]
-                    raw.loc[selection, cap_header] = raw.loc[selection, cap_header] - c0
-                    raw.loc[selection, e_header] = raw.loc[selection, e_header] - e0
+                selection = cell.cycle_step_index.rows(j, steps)
+                self._reset_raw_columns(raw, selection, [cap_header, e_header])
         self.logger.debug(f"(dt: {(time.time() - time_00):4.2f}s)")
 
+    @staticmethod
+    def _reset_raw_columns(raw, rows, columns):
+        # subtract the first value within the selected rows (positions)
+        column_positions = [raw.columns.get_loc(col) for col in columns]
+        selected = raw.iloc[rows, column_positions]
+        if selected.empty:
+            return
+        raw.iloc[rows, column_positions] = selected - selected.iloc[0]
+
     def get_number_of_tests(self):
         return self.number_of_datasets
 
@@ -3265,6 +4125,62 @@ class CellpyData(object):
         # TODO: remove me
         return self.cells[n]
 
+    def iter_raw(
+        self, chunksize=100_000, columns=None, cycles=None, dataset_number=None
+    ):
+        """Iterate over the raw data in chunks.
+
+        If the cell was loaded with lazy=True (and the raw data has not been
+        used yet), the chunks are read from the cellpy-file one at a time
+        (using chunked selects), so that raw data bigger than the memory can
+        be processed. Else the raw data in memory is split in chunks.
+
+        Args:
+            chunksize (int): number of rows in each chunk.
+            columns (list of str): only include these columns.
+            cycles (list of ints): only include these cycles.
+            dataset_number (int): the dataset number (automatic selection if
+                None).
+
+        Yields:
+            pandas.DataFrame
+
+        Example:
+            >>> c = cellreader.CellpyData().load("huge.h5", lazy=True)
+            >>> for chunk in c.iter_raw(chunksize=500_000, cycles=[1, 2]):
+            ...     print(chunk["voltage"].max())
+        """
+        dataset_number = self._validate_dataset_number(dataset_number)
+        if dataset_number is None:
+            self._report_empty_dataset()
+            return
+        raw = self.cells[dataset_number].raw
+        if isinstance(raw, LazyRaw):
+            yield from raw.iter_chunks(chunksize, columns=columns, cycles=cycles)
+        else:
+            yield from iter_frame_in_chunks(
+                raw, chunksize, columns=columns, cycles=cycles
+            )
+
+    @contextmanager
+    def _selected_raw(self, dataset_number, cycles):
+        """temporarily replace a (not loaded) lazy raw frame by the selected cycles.
+
+        Only the rows of the cycles are read from the cellpy file (using the
+        stored cycle-step index when possible). The proxy is put back when
+        leaving the context, so that the selection is not kept in memory.
+        """
+        cell = self.cells[dataset_number]
+        raw = cell._raw
+        if not isinstance(raw, LazyRaw) or raw.loaded:
+            yield cell.raw
+            return
+        cell.raw = raw.load(cycles=list(cycles))
+        try:
+            yield cell.raw
+        finally:
+            cell.raw = raw
+
     def sget_voltage(self, cycle, step, set_number=None):
         """Returns voltage for cycle, step.
 
@@ -3286,10 +4202,8 @@ class CellpyData(object):
         if set_number is None:
             self._report_empty_dataset()
             return
-        cycle_index_header = self.headers_normal.cycle_index_txt
         voltage_header = self.headers_normal.voltage_txt
-        step_index_header = self.headers_normal.step_index_txt
-        test = self.cells[set_number].raw
+        cell = self.cells[set_number]
 
         if isinstance(step, (list, tuple)):
             warnings.warn(
@@ -3297,9 +4211,7 @@ class CellpyData(object):
             )
             step = step[0]
 
-        c = test[
-            (test[cycle_index_header] == cycle) & (test[step_index_header] == step)
-        ]
+        c = self._select_rows(cell, cycle, step)
 
         self.logger.debug(f"(dt: {(time.time() - time_00):4.2f}s)")
         if not self.is_empty(c):
@@ -3316,10 +4228,8 @@ class CellpyData(object):
         if set_number is None:
             self._report_empty_dataset()
             return
-        cycle_index_header = self.headers_normal.cycle_index_txt
         current_header = self.headers_normal.current_txt
-        step_index_header = self.headers_normal.step_index_txt
-        test = self.cells[set_number].raw
+        cell = self.cells[set_number]
 
         if isinstance(step, (list, tuple)):
             warnings.warn(
@@ -3327,9 +4237,7 @@ class CellpyData(object):
             )
             step = step[0]
 
-        c = test[
-            (test[cycle_index_header] == cycle) & (test[step_index_header] == step)
-        ]
+        c = self._select_rows(cell, cycle, step)
 
         self.logger.debug(f"(dt: {(time.time() - time_00):4.2f}s)")
         if not self.is_empty(c):
@@ -3364,7 +4272,7 @@ class CellpyData(object):
         test = self.cells[dataset_number].raw
         if cycle:
             self.logger.debug("getting voltage curve for cycle")
-            c = test[(test[cycle_index_header] == cycle)]
+            c = self._select_rows(self.cells[dataset_number], cycle)
             if not self.is_empty(c):
                 v = c[voltage_header]
                 return v
@@ -3376,7 +4284,7 @@ class CellpyData(object):
                 for j in range(1, no_cycles + 1):
                     txt = "Cycle  %i:  " % j
                     self.logger.debug(txt)
-                    c = test[(test[cycle_index_header] == j)]
+                    c = self._select_rows(self.cells[dataset_number], j)
                     v.append(c[voltage_header])
             else:
                 self.logger.debug("getting frame of all voltage-curves")
@@ -3407,7 +4315,7 @@ class CellpyData(object):
         test = self.cells[dataset_number].raw
         if cycle:
             self.logger.debug(f"getting current for cycle {cycle}")
-            c = test[(test[cycle_index_header] == cycle)]
+            c = self._select_rows(self.cells[dataset_number], cycle)
             if not self.is_empty(c):
                 v = c[current_header]
                 return v
@@ -3419,7 +4327,7 @@ class CellpyData(object):
                 for j in range(1, no_cycles + 1):
                     txt = "Cycle  %i:  " % j
                     self.logger.debug(txt)
-                    c = test[(test[cycle_index_header] == j)]
+                    c = self._select_rows(self.cells[dataset_number], j)
                     v.append(c[current_header])
             else:
                 self.logger.debug("getting all current-curves ")
@@ -3446,18 +4354,14 @@ class CellpyData(object):
         if dataset_number is None:
             self._report_empty_dataset()
             return
-        cycle_index_header = self.headers_normal.cycle_index_txt
         step_time_header = self.headers_normal.step_time_txt
-        step_index_header = self.headers_normal.step_index_txt
-        test = self.cells[dataset_number].raw
+        cell = self.cells[dataset_number]
 
         if isinstance(step, (list, tuple)):
             warnings.warn(f"The variable step is a list. Should be an integer. {step}")
             step = step[0]
 
-        c = test.loc[
-            (test[cycle_index_header] == cycle) & (test[step_index_header] == step), :
-        ]
+        c = self._select_rows(cell, cycle, step)
 
         if not self.is_empty(c):
             t = c[step_time_header]
@@ -3485,10 +4389,8 @@ class CellpyData(object):
         if dataset_number is None:
             self._report_empty_dataset()
             return
-        cycle_index_header = self.headers_normal.cycle_index_txt
         timestamp_header = self.headers_normal.test_time_txt
-        step_index_header = self.headers_normal.step_index_txt
-        test = self.cells[dataset_number].raw
+        cell = self.cells[dataset_number]
 
         if isinstance(step, (list, tuple)):
             warnings.warn(
@@ -3496,9 +4398,7 @@ class CellpyData(object):
             )
             step = step[0]
 
-        c = test[
-            (test[cycle_index_header] == cycle) & (test[step_index_header] == step)
-        ]
+        c = self._select_rows(cell, cycle, step)
         if not self.is_empty(c):
             t = c[timestamp_header]
             return t
@@ -3511,13 +4411,12 @@ class CellpyData(object):
         if dataset_number is None:
             self._report_empty_dataset()
             return
-        cycle_index_header = self.headers_normal.cycle_index_txt
         datetime_header = self.headers_normal.datetime_txt
 
         v = pd.Series()
         test = self.cells[dataset_number].raw
         if cycle:
-            c = test[(test[cycle_index_header] == cycle)]
+            c = self._select_rows(self.cells[dataset_number], cycle)
             if not self.is_empty(c):
                 v = c[datetime_header]
 
@@ -3529,7 +4428,7 @@ class CellpyData(object):
                 for j in cycles:
                     txt = "Cycle  %i:  " % j
                     self.logger.debug(txt)
-                    c = test[(test[cycle_index_header] == j)]
+                    c = self._select_rows(self.cells[dataset_number], j)
                     v.append(c[datetime_header])
             else:
                 self.logger.debug("returning full datetime col")
@@ -3556,15 +4455,14 @@ class CellpyData(object):
         if dataset_number is None:
             self._report_empty_dataset()
             return
-        cycle_index_header = self.headers_normal.cycle_index_txt
         timestamp_header = self.headers_normal.test_time_txt
 
         v = pd.Series()
         test = self.cells[dataset_number].raw
         if cycle:
-            c = test[(test[cycle_index_header] == cycle)]
+            c = self._select_rows(self.cells[dataset_number], cycle)
             if not self.is_empty(c):
-                v = c[timestamp_header]
+                v = c[timestamp_header].copy()
 
         else:
             if not full:
@@ -3574,7 +4472,7 @@ class CellpyData(object):
                 for j in cycles:
                     txt = "Cycle  %i:  " % j
                     self.logger.debug(txt)
-                    c = test[(test[cycle_index_header] == j)]
+                    c = self._select_rows(self.cells[dataset_number], j)
                     v.append(c[timestamp_header])
             else:
                 self.logger.debug("returning full timestamp col")
@@ -3632,6 +4530,7 @@ class CellpyData(object):
         ignore_errors=True,
         dynamic=False,
         inter_cycle_shift=True,
+        batched=True,
         **kwargs,
     ):
         """Gets the capacity for the run.
@@ -3668,6 +4567,9 @@ class CellpyData(object):
                 [NOT IMPLEMENTED YET]
             inter_cycle_shift (bool): cumulative shifts between consecutive
                 cycles. Defaults to True.
+            batched (bool): extract all the cycles in one go (look up the
+                steps for all cycles at once and select all the rows in one
+                selection) instead of cycle by cycle. Defaults to True.
 
         Returns:
             pandas.DataFrame ((cycle) voltage, capacity, (direction (-1, 1)))
@@ -3689,6 +4591,27 @@ class CellpyData(object):
         if not isinstance(cycle, collections.abc.Iterable):
             cycle = [cycle]
 
+        raw = self.cells[dataset_number]._raw
+        if isinstance(raw, LazyRaw) and not raw.loaded:
+            with self._selected_raw(dataset_number, cycle):
+                return self.get_cap(
+                    cycle,
+                    dataset_number,
+                    method=method,
+                    shift=shift,
+                    categorical_column=categorical_column,
+                    label_cycle_number=label_cycle_number,
+                    split=split,
+                    interpolated=interpolated,
+                    dx=dx,
+                    number_of_points=number_of_points,
+                    ignore_errors=ignore_errors,
+                    dynamic=dynamic,
+                    inter_cycle_shift=inter_cycle_shift,
+                    batched=batched,
+                    **kwargs,
+                )
+
         if split and not (categorical_column or label_cycle_number):
             return_dataframe = False
         else:
@@ -3702,6 +4625,26 @@ class CellpyData(object):
             )
             method = "back-and-forth"
 
+        if batched and (
+            kwargs.get("steptable") is not None
+            or self.cells[dataset_number].steps_made
+        ):
+            return self._get_cap_batched(
+                cycle,
+                dataset_number,
+                method=method,
+                shift=shift,
+                categorical_column=categorical_column,
+                label_cycle_number=label_cycle_number,
+                interpolated=interpolated,
+                dx=dx,
+                number_of_points=number_of_points,
+                ignore_errors=ignore_errors,
+                inter_cycle_shift=inter_cycle_shift,
+                return_dataframe=return_dataframe,
+                **kwargs,
+            )
+
         capacity = None
         voltage = None
         cycle_df = pd.DataFrame()
@@ -3855,6 +4798,205 @@ class CellpyData(object):
         else:
             return capacity, voltage
 
+    def _get_cap_batched(
+        self,
+        cycles,
+        dataset_number,
+        method="back-and-forth",
+        shift=0.0,
+        categorical_column=False,
+        label_cycle_number=False,
+        interpolated=False,
+        dx=0.1,
+        number_of_points=None,
+        ignore_errors=True,
+        inter_cycle_shift=True,
+        return_dataframe=True,
+        trim_taper_steps=None,
+        steps_to_skip=None,
+        steptable=None,
+    ):
+        # batched version of the cycle-loop in get_cap (gives the same output)
+        cell = self.cells[dataset_number]
+        raw = cell.raw
+        mass = self.get_mass(dataset_number)
+        voltage_txt = self.headers_normal.voltage_txt
+        cap_txt = {
+            "charge": self.headers_normal.charge_capacity_txt,
+            "discharge": self.headers_normal.discharge_capacity_txt,
+        }
+
+        if self._cycle_mode == "anode":
+            first_type, last_type = "discharge", "charge"
+        else:
+            first_type, last_type = "charge", "discharge"
+
+        steps = {
+            cap_type: self._get_first_step_numbers(
+                cycles,
+                cap_type,
+                dataset_number,
+                trim_taper_steps=trim_taper_steps,
+                steps_to_skip=steps_to_skip,
+                steptable=steptable,
+            )
+            for cap_type in (first_type, last_type)
+        }
+
+        # resolving the row positions for all the cycles (using the index)
+        index = cell.cycle_step_index
+        selected_cycles = []
+        segments = []
+        for cycle in cycles:
+            rows = {}
+            for cap_type in ("charge", "discharge"):
+                step = steps[cap_type].get(cycle, 0)
+                rows[cap_type] = index.rows(cycle, step)
+                if isinstance(rows[cap_type], slice):
+                    rows[cap_type] = np.arange(
+                        rows[cap_type].start, rows[cap_type].stop
+                    )
+                if not len(rows[cap_type]):
+                    self.logger.debug(
+                        f"no steps found (c:{cycle} s:{step} type:{cap_type})"
+                    )
+                    break
+            else:
+                selected_cycles.append(cycle)
+                segments.append(rows[first_type])
+                segments.append(rows[last_type])
+                continue
+            if not ignore_errors:
+                self.logger.debug("breaking out of loop")
+                break
+
+        if not selected_cycles:
+            if return_dataframe:
+                return pd.DataFrame()
+            return None, None
+
+        # selecting all the rows in one go
+        lengths = np.array([len(segment) for segment in segments])
+        positions = np.concatenate(segments)
+        segment_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        is_last = np.repeat(np.tile([False, True], len(selected_cycles)), lengths)
+
+        voltage = raw[voltage_txt].values[positions]
+        capacity = (
+            np.where(
+                is_last,
+                raw[cap_txt[last_type]].values[positions],
+                raw[cap_txt[first_type]].values[positions],
+            )
+            * 1000000
+            / mass
+        )
+
+        # shifting the capacities (cumulative offsets)
+        first_lengths = lengths[0::2]
+        last_lengths = lengths[1::2]
+        is_first = ~is_last
+        segment_max = np.fmax.reduceat(capacity, segment_starts)
+        max_first = segment_max[0::2]
+        max_last = segment_max[1::2]
+        if method == "back-and-forth":
+            if inter_cycle_shift:
+                prev_end = np.cumsum(
+                    np.concatenate(([shift], (max_first - max_last)[:-1]))
+                )
+            else:
+                prev_end = np.zeros(len(selected_cycles))
+            capacity[is_first] += np.repeat(prev_end, first_lengths)
+            capacity[is_last] = np.repeat(max_first, last_lengths) - capacity[
+                is_last
+            ] + np.repeat(prev_end, last_lengths)
+        elif method == "forth":
+            prev_end = np.cumsum(
+                np.concatenate(([shift], (max_first + max_last)[:-1]))
+            )
+            capacity[is_first] += np.repeat(prev_end, first_lengths)
+            capacity[is_last] += np.repeat(max_first + prev_end, last_lengths)
+        else:
+            capacity += shift
+
+        if not return_dataframe:
+            logging.warning("returning non-dataframe")
+            labels = raw.index[positions]
+            return (
+                pd.Series(capacity, index=labels),
+                pd.Series(voltage, index=labels, name=voltage_txt),
+            )
+
+        segment_cycles = np.repeat(np.asarray(selected_cycles), 2)
+        directions = np.tile([-1, 1], len(selected_cycles))
+        if interpolated:
+            frames = []
+            for start, length, direction, cycle in zip(
+                segment_starts, lengths, directions, segment_cycles
+            ):
+                c = interpolate_y_on_x(
+                    pd.DataFrame(
+                        {
+                            "voltage": voltage[start : start + length],
+                            "capacity": capacity[start : start + length],
+                        }
+                    ),
+                    y="capacity",
+                    x="voltage",
+                    dx=dx,
+                    number_of_points=number_of_points,
+                    direction=direction,
+                )
+                if categorical_column:
+                    c["direction"] = direction
+                if label_cycle_number:
+                    c.insert(0, "cycle", cycle)
+                frames.append(c)
+            return pd.concat(frames, axis=0)
+
+        cycle_df = pd.DataFrame(
+            {"voltage": voltage, "capacity": capacity},
+            index=np.arange(len(positions)) - np.repeat(segment_starts, lengths),
+        )
+        if categorical_column:
+            cycle_df["direction"] = np.repeat(directions, lengths)
+        if label_cycle_number:
+            cycle_df.insert(0, "cycle", np.repeat(segment_cycles, lengths))
+        return cycle_df
+
+    def _get_first_step_numbers(
+        self,
+        cycles,
+        cap_type,
+        dataset_number,
+        trim_taper_steps=None,
+        steps_to_skip=None,
+        steptable=None,
+    ):
+        # the first step of the given type for each of the cycles (the same
+        # selection as get_step_numbers(allctypes=False), but for all cycles
+        # at once); cycles without any steps of the given type are left out
+        if cap_type == "charge_capacity":
+            cap_type = "charge"
+        elif cap_type == "discharge_capacity":
+            cap_type = "discharge"
+        if steptable is None:
+            steptable = self.cells[dataset_number].steps
+        shdr = self.headers_step_table
+        st = steptable.loc[
+            (steptable[shdr.type] == cap_type)
+            & steptable[shdr.cycle].isin(list(cycles)),
+            [shdr.cycle, shdr.step],
+        ]
+        if trim_taper_steps is not None:
+            # same as step_list[:-trim_taper_steps] for each cycle
+            from_end = st.groupby(shdr.cycle).cumcount(ascending=False)
+            st = st.loc[(from_end >= trim_taper_steps) & (trim_taper_steps > 0)]
+        if steps_to_skip:
+            st = st.loc[~st[shdr.step].isin(steps_to_skip)]
+        first_steps = st.groupby(shdr.cycle, sort=False)[shdr.step].first()
+        return {cycle: int(step) for cycle, step in first_steps.items()}
+
     def _get_cap(
         self,
         cycle=None,
@@ -3977,14 +5119,16 @@ class CellpyData(object):
         cycle_label = self.headers_normal.cycle_index_txt
         step_label = self.headers_normal.step_index_txt
 
-        selected_df = raw.where(
-            raw[cycle_label].isin(ocv_steps.cycle)
-            & raw[step_label].isin(ocv_steps.step)
-        ).dropna()
-
-        selected_df = selected_df.loc[
-            :, [cycle_label, step_label, step_time_label, voltage_label]
-        ]
+        rows = self.cell.cycle_step_index.pair_rows(
+            zip(ocv_steps.cycle, ocv_steps.step)
+        )
+        selected_df = raw.iloc[
+            rows,
+            [
+                raw.columns.get_loc(label)
+                for label in [cycle_label, step_label, step_time_label, voltage_label]
+            ],
+        ].dropna()
 
         if interpolated:
             if dx is None and number_of_points is None:
@@ -4337,25 +5481,81 @@ class CellpyData(object):
         y_new = f(points)
         return y_new
 
+    def _select_summary_rows_in_chunks(self, chunks, data_points=None):
+        # the last row of each cycle (or the rows with the given data points),
+        # keeping only the candidates and one chunk in memory
+        d_txt = self.headers_normal.data_point_txt
+        selected = []
+        for chunk in chunks:
+            if data_points is not None:
+                selected.append(chunk.loc[chunk[d_txt].isin(data_points)])
+                continue
+            selected.append(chunk.loc[self._select_last(chunk)])
+            if len(selected) > 1:
+                # the last cycle of the previous chunk can continue
+                rows = pd.concat(selected)
+                selected = [rows.loc[self._select_last(rows)]]
+        if not selected:
+            return pd.DataFrame()
+        return pd.concat(selected)
+
     def _select_last(self, raw):
         # this function gives a set of indexes pointing to the last
         # datapoints for each cycle in the dataset
 
         c_txt = self.headers_normal.cycle_index_txt
         d_txt = self.headers_normal.data_point_txt
-        steps = []
-        unique_steps = raw[c_txt].unique()
-        max_step = max(raw[c_txt])
-        for j in range(int(max_step)):
-            if j + 1 not in unique_steps:
-                self.logger.debug(f"Warning: Cycle {j + 1} is missing!")
-            else:
-                last_item = max(raw.loc[raw[c_txt] == j + 1, d_txt])
-                steps.append(last_item)
-
-        last_items = raw[d_txt].isin(steps)
+        last_data_points = raw.groupby(c_txt)[d_txt].max()
+        last_data_points = last_data_points.loc[last_data_points.index >= 1]
+        if not last_data_points.empty:
+            missing = int(last_data_points.index.max()) - len(last_data_points)
+            if missing > 0:
+                self.logger.debug(f"Warning: {missing} cycle(s) are missing!")
+
+        last_items = raw[d_txt].isin(last_data_points.values)
         return last_items
 
+    def _select_step_values_from_steps(
+        self, steps, step_type, column, select_last=True, step_dict=None
+    ):
+        # this function gives the value of a step table column (e.g.
+        # voltage_last) for the first or last step of a given type in each
+        # cycle (same steps as picked by get_step_numbers)
+
+        shdr = self.headers_step_table
+        if select_last:
+            point_txt = shdr.point + "_last"
+            keep = "last"
+        else:
+            point_txt = shdr.point + "_first"
+            keep = "first"
+
+        if step_dict is None:
+            selected = steps.loc[
+                steps[shdr.type] == step_type, [shdr.cycle, shdr.step]
+            ].drop_duplicates(subset=[shdr.cycle], keep=keep)
+        else:
+            selected = pd.DataFrame(
+                [
+                    (cycle, step_list[-1] if select_last else step_list[0])
+                    for cycle, step_list in step_dict.items()
+                ],
+                columns=[shdr.cycle, shdr.step],
+            )
+
+        # the same (cycle, step) can appear in several rows (all_steps=True)
+        candidates = steps[[shdr.cycle, shdr.step, point_txt, column]].merge(
+            selected, on=[shdr.cycle, shdr.step]
+        )
+        candidates = candidates.sort_values(point_txt, kind="mergesort")
+        candidates = candidates.drop_duplicates(subset=[shdr.cycle], keep=keep)
+        return candidates.set_index(shdr.cycle)[column]
+
+    @staticmethod
+    def _map_on_cycles(cycles, values, default_value=0):
+        # cycles without any step of the requested type gets the default value
+        return cycles.map(values).where(cycles.isin(values.index), default_value)
+
     # TODO: find out what this is for and probably delete it
     def _modify_cycle_number_using_cycle_step(
         self, from_tuple=None, to_cycle=44, dataset_number=None
@@ -4390,9 +5590,18 @@ class CellpyData(object):
             (nt[cycle_index_header] == from_tuple[0])
             & (nt[step_index_header] == from_tuple[1])
         ] = to_cycle
+        self.cells[dataset_number].invalidate_cycle_step_index()
         # modifying summary_table
         # not implemented yet
 
+    def _ensure_steps_for_summary(self, dataset_number):
+        # the summary uses the step table for finding end voltages and ir
+        dataset = self.cells[dataset_number]
+        if not dataset.steps_made:
+            self.logger.info("step table missing - running make_step_table")
+            self.make_step_table(dataset_number=dataset_number)
+        return dataset.steps
+
     # ----------making-summary------------------------------------------------------
     def make_summary(
         self,
@@ -4408,8 +5617,19 @@ class CellpyData(object):
         normalization_cycles=None,
         nom_cap=None,
         from_cycle=None,
+        chunksize=None,
     ):
-        """Convenience function that makes a summary of the cycling data."""
+        """Convenience function that makes a summary of the cycling data.
+
+        The end voltages and the internal resistances (find_end_voltage and
+        find_ir) are taken from the step table. If the step table is missing,
+        it is made (make_step_table) even if ensure_step_table is False.
+
+        Use chunksize (number of rows) to process the raw data in chunks
+        (see iter_raw), e.g. for cells loaded with lazy=True that have raw
+        data bigger than the memory. The step table is then also made in
+        chunks if it is missing.
+        """
 
         # TODO: @jepe - include option for omitting steps
         # TODO: @jepe  - make it is possible to update only new data by implementing
@@ -4462,6 +5682,7 @@ class CellpyData(object):
                     add_c_rate=add_c_rate,
                     normalization_cycles=normalization_cycles,
                     nom_cap=nom_cap,
+                    chunksize=chunksize,
                 )
         else:
             self.logger.debug("creating summary for only one test")
@@ -4480,6 +5701,7 @@ class CellpyData(object):
                 add_c_rate=add_c_rate,
                 normalization_cycles=normalization_cycles,
                 nom_cap=nom_cap,
+                chunksize=chunksize,
             )
         return self
 
@@ -4500,6 +5722,7 @@ class CellpyData(object):
         add_c_rate=False,
         normalization_cycles=None,
         nom_cap=None,
+        chunksize=None,
         # capacity_modifier = None,
         # test=None
     ):
@@ -4528,7 +5751,9 @@ class CellpyData(object):
                 self.logger.info("running make_step_table")
                 if nom_cap is not None:
                     dataset.nom_cap = nom_cap
-                self.make_step_table(dataset_number=dataset_number)
+                self.make_step_table(
+                    dataset_number=dataset_number, chunksize=chunksize
+                )
 
         # Retrieve the converters etc.
         specific_converter = self.get_converter_to_specific(dataset=dataset, mass=mass)
@@ -4539,11 +5764,8 @@ class CellpyData(object):
         st_txt = hdr_normal.step_time_txt
         c_txt = hdr_normal.cycle_index_txt
         d_txt = hdr_normal.data_point_txt
-        s_txt = hdr_normal.step_index_txt
-        voltage_header = hdr_normal.voltage_txt
         charge_txt = hdr_normal.charge_capacity_txt
         discharge_txt = hdr_normal.discharge_capacity_txt
-        ir_txt = hdr_normal.internal_resistance_txt
         test_id_txt = hdr_normal.test_id_txt
         i_txt = hdr_normal.current_txt
 
@@ -4584,7 +5806,15 @@ class CellpyData(object):
         # Here are the two main DataFrames for the test
         # (raw-data and summary-data)
         summary_df = dataset.summary
-        if not self.load_only_summary:
+        if not self.load_only_summary and chunksize is not None:
+            data_points = None
+            if use_cellpy_stat_file and d_txt in summary_df.columns:
+                data_points = summary_df[d_txt]
+            summary = self._select_summary_rows_in_chunks(
+                self.iter_raw(chunksize=chunksize, dataset_number=dataset_number),
+                data_points=data_points,
+            )
+        elif not self.load_only_summary:
             # Can't find summary from raw data if raw data is not loaded.
             raw = dataset.raw
             if use_cellpy_stat_file:
@@ -4848,76 +6078,25 @@ class CellpyData(object):
             ev_t0 = time.time()
             self.logger.debug("finding end-voltage")
             self.logger.debug(f"dt: {time.time() - ev_t0}")
-            only_zeros_discharge = summary[discharge_txt] * 0.0
-            only_zeros_charge = summary[charge_txt] * 0.0
-            if not dataset.discharge_steps:
-                self.logger.debug("need to collect discharge steps")
-                discharge_steps = self.get_step_numbers(
-                    steptype="discharge", allctypes=False, dataset_number=dataset_number
-                )
-                self.logger.debug(f"dt: {time.time() - ev_t0}")
-            else:
-                discharge_steps = dataset.discharge_steps
-                self.logger.debug("  already have discharge_steps")
-            if not dataset.charge_steps:
-                self.logger.debug("need to collect charge steps")
-                charge_steps = self.get_step_numbers(
-                    steptype="charge", allctypes=False, dataset_number=dataset_number
-                )
-                self.logger.debug(f"dt: {time.time() - ev_t0}")
-            else:
-                charge_steps = dataset.charge_steps
-                self.logger.debug("  already have charge_steps")
-
-            endv_indexes = []
-            endv_values_dc = []
-            endv_values_c = []
-            # self.logger.debug("trying to find end voltage for")
-            # self.logger.debug(dataset.loaded_from)
-            # self.logger.debug("Using the following chargesteps")
-            # self.logger.debug(charge_steps)
-            # self.logger.debug("Using the following dischargesteps")
-            # self.logger.debug(discharge_steps)
-            self.logger.debug("starting iterating through the index")
-            for i in summary.index:
-                # txt = "index in summary.index: %i" % i
-                # self.logger.debug(txt)
-                # selecting the appropriate cycle
-                cycle = summary.iloc[i][c_txt]
-                # txt = "cycle: %i" % cycle
-                # self.logger.debug(txt)
-                step = discharge_steps[cycle]
-
-                # finding end voltage for discharge
-                if step[-1]:  # selecting last
-                    # TODO: @jepe - use pd.loc[row,column]
-                    # for col or pd.loc[(pd.["step"]==1),"x"]
-                    end_voltage_dc = raw[
-                        (raw[c_txt] == cycle) & (dataset.raw[s_txt] == step[-1])
-                    ][voltage_header]
-                    # This will not work if there are more than one item in step
-                    end_voltage_dc = end_voltage_dc.values[-1]  # selecting
-                    # last (could also select amax)
-                else:
-                    end_voltage_dc = 0  # could also use numpy.nan
-
-                # finding end voltage for charge
-                step2 = charge_steps[cycle]
-                if step2[-1]:
-                    end_voltage_c = raw[
-                        (raw[c_txt] == cycle) & (dataset.raw[s_txt] == step2[-1])
-                    ][voltage_header]
-                    end_voltage_c = end_voltage_c.values[-1]
-                    # end_voltage_c = np.amax(end_voltage_c)
-                else:
-                    end_voltage_c = 0
-                endv_indexes.append(i)
-                endv_values_dc.append(end_voltage_dc)
-                endv_values_c.append(end_voltage_c)
-            self.logger.debug("finished iterating")
+            steps = self._ensure_steps_for_summary(dataset_number)
+            voltage_last_txt = hdr_steps.voltage + "_last"
+            end_voltage_dc = self._select_step_values_from_steps(
+                steps,
+                "discharge",
+                voltage_last_txt,
+                select_last=True,
+                step_dict=dataset.discharge_steps or None,
+            )
+            end_voltage_c = self._select_step_values_from_steps(
+                steps,
+                "charge",
+                voltage_last_txt,
+                select_last=True,
+                step_dict=dataset.charge_steps or None,
+            )
+            ir_frame_dc = self._map_on_cycles(summary[c_txt], end_voltage_dc)
+            ir_frame_c = self._map_on_cycles(summary[c_txt], end_voltage_c)
             self.logger.debug(f"find end V took: {time.time() - ev_t0} s")
-            ir_frame_dc = only_zeros_discharge + endv_values_dc
-            ir_frame_c = only_zeros_charge + endv_values_c
             summary.insert(0, column=endv_discharge_title, value=ir_frame_dc)
             summary.insert(0, column=endv_charge_title, value=ir_frame_c)
 
@@ -4928,62 +6107,24 @@ class CellpyData(object):
             # Found a file where it writes IR for cycle n on cycle n+1
             # This only picks out the data on the last IR step before
             self.logger.debug("finding ir")
-            only_zeros = summary[discharge_txt] * 0.0
-            if not dataset.discharge_steps:
-                discharge_steps = self.get_step_numbers(
-                    steptype="discharge", allctypes=False, dataset_number=dataset_number
-                )
-            else:
-                discharge_steps = dataset.discharge_steps
-                self.logger.debug("  already have discharge_steps")
-            if not dataset.charge_steps:
-                charge_steps = self.get_step_numbers(
-                    steptype="charge", allctypes=False, dataset_number=dataset_number
-                )
-            else:
-                charge_steps = dataset.charge_steps
-                self.logger.debug("  already have charge_steps")
-
-            ir_indexes = []
-            ir_values = []
-            ir_values2 = []
-            # self.logger.debug("trying to find ir for")
-            # self.logger.debug(dataset.loaded_from)
-            # self.logger.debug("Using the following charge_steps")
-            # self.logger.debug(charge_steps)
-            # self.logger.debug("Using the following discharge_steps")
-            # self.logger.debug(discharge_steps)
-
-            for i in summary.index:
-                # txt = "index in summary.index: %i" % i
-                # self.logger.debug(txt)
-                # selecting the appropriate cycle
-                cycle = summary.iloc[i][c_txt]  # "Cycle_Index" = i + 1
-                # txt = "cycle: %i" % cycle
-                # self.logger.debug(txt)
-                step = discharge_steps[cycle]
-                if step[0]:
-                    ir = raw.loc[
-                        (raw[c_txt] == cycle) & (dataset.raw[s_txt] == step[0]), ir_txt
-                    ]
-                    # This will not work if there are more than one item in step
-                    ir = ir.values[0]
-                else:
-                    ir = 0
-                step2 = charge_steps[cycle]
-                if step2[0]:
-
-                    ir2 = raw[(raw[c_txt] == cycle) & (dataset.raw[s_txt] == step2[0])][
-                        ir_txt
-                    ].values[0]
-                else:
-                    ir2 = 0
-                ir_indexes.append(i)
-                ir_values.append(ir)
-                ir_values2.append(ir2)
-
-            ir_frame = only_zeros + ir_values
-            ir_frame2 = only_zeros + ir_values2
+            steps = self._ensure_steps_for_summary(dataset_number)
+            ir_first_txt = hdr_steps.internal_resistance + "_first"
+            ir_dc = self._select_step_values_from_steps(
+                steps,
+                "discharge",
+                ir_first_txt,
+                select_last=False,
+                step_dict=dataset.discharge_steps or None,
+            )
+            ir_c = self._select_step_values_from_steps(
+                steps,
+                "charge",
+                ir_first_txt,
+                select_last=False,
+                step_dict=dataset.charge_steps or None,
+            )
+            ir_frame = self._map_on_cycles(summary[c_txt], ir_dc)
+            ir_frame2 = self._map_on_cycles(summary[c_txt], ir_c)
             summary.insert(0, column=ir_discharge_title, value=ir_frame)
             summary.insert(0, column=ir_charge_title, value=ir_frame2)
 
@@ -5112,12 +6253,14 @@ def get(
         if not isinstance(filename, (list, tuple)):
             filename = Path(filename)
 
-            if not filename.is_file():
+            if not cellpy_file_exists(filename) and not filename.is_file():
                 print(f"Could not find {filename}")
                 print("Returning None")
                 return
 
-            if filename.suffix in [".h5", ".hdf5", ".cellpy", ".cpy"]:
+            if filename.suffix in [".h5", ".hdf5", ".cellpy", ".cpy"] or (
+                filename.is_dir()
+            ):
                 logging.info(f"Loading cellpy-file: {filename}")
                 cellpy_instance.load(filename)
                 if mass is not None:
@@ -5152,6 +6295,35 @@ def get(
         return cellpy_instance
 
 
+def convert_cellpy_file(filename, new_filename=None, file_format="parquet"):
+    """Convert a cellpy-file to another file format (e.g. hdf5 to parquet).
+
+    Old cellpy-file versions are upgraded to the current version.
+
+    Args:
+        filename (str, os.PathLike): the cellpy-file to convert.
+        new_filename (str, os.PathLike): the new cellpy-file (defaults to
+            filename with the extension of the new format).
+        file_format (str): "parquet" or "hdf5".
+
+    Returns:
+        the name of the new cellpy-file.
+    """
+    if file_format not in CELLPY_FILE_FORMATS:
+        raise ValueError(f"unknown cellpy-file format: {file_format}")
+    if new_filename is None:
+        extension = CELLPY_FILE_FORMATS[file_format].extension
+        new_filename = Path(filename).with_suffix("." + extension)
+    new_filename = str(new_filename)
+    logging.info(f"converting {filename} -> {new_filename} ({file_format})")
+    cellpy_instance = CellpyData()
+    cellpy_instance.load(filename, accept_old=True)
+    cellpy_instance.save(
+        new_filename, force=True, ensure_step_table=False, file_format=file_format
+    )
+    return new_filename
+
+
 if __name__ == "__main__":
     print("running", end=" ")
     print(sys.argv[0])
@@ -25,10 +25,12 @@ from cellpy.parameters.internal_settings import (
     ATTRS_CELLPYFILE,
     cellpy_limits,
     cellpy_units,
+    get_dtypes_normal,
     get_headers_summary,
     get_headers_normal,
     get_headers_step_table,
 )
+from cellpy.readers.storage import ParquetStore, open_cellpy_store
 
 CELLPY_FILE_VERSION = 6
 MINIMUM_CELLPY_FILE_VERSION = 4
@@ -40,6 +42,10 @@ PICKLE_PROTOCOL = 4
 HEADERS_NORMAL = get_headers_normal()
 HEADERS_SUMMARY = get_headers_summary()
 HEADERS_STEP_TABLE = get_headers_step_table()
+DTYPES_NORMAL = get_dtypes_normal()
+
+# text columns with a lower fraction of unique values are made categorical
+MAX_CATEGORICAL_FRACTION = 0.5
 
 
 # https://stackoverflow.com/questions/60067953/
@@ -172,6 +178,251 @@ class FileID(object):
         return self.last_modified
 
 
+class CycleStepIndex(object):
+    """Row-range index for the cycles and (cycle, step) pairs of the raw data.
+
+    Consecutive rows with the same cycle and step number form a block. The
+    blocks are stored as offset arrays (``starts`` and ``stops``) so that the
+    rows belonging to a cycle or a (cycle, step) pair can be looked up without
+    scanning the full frame. All positions are positional (use them with
+    ``iloc``).
+
+    The index is saved in the cellpy-file (see ``to_frame`` and
+    ``from_frame``), so that the rows of selected cycles can be read from the
+    file using start/stop reads.
+
+    Args:
+        cycles (array-like): the cycle number for each row.
+        steps (array-like): the step number for each row.
+        data_points (array-like): the data point for each row (optional).
+    """
+
+    def __init__(self, cycles, steps, data_points=None):
+        cycles = np.asarray(cycles)
+        steps = np.asarray(steps)
+        number_of_rows = len(cycles)
+
+        if number_of_rows:
+            changes = np.flatnonzero(
+                (cycles[1:] != cycles[:-1]) | (steps[1:] != steps[:-1])
+            )
+            starts = np.concatenate(([0], changes + 1))
+        else:
+            starts = np.empty(0, dtype=np.int64)
+        stops = np.append(starts[1:], number_of_rows)
+
+        first_points = last_points = None
+        if data_points is not None:
+            data_points = np.asarray(data_points)
+            first_points = data_points[starts]
+            last_points = data_points[stops - 1]
+
+        self._set_blocks(
+            number_of_rows,
+            starts,
+            stops,
+            cycles[starts],
+            steps[starts],
+            first_points,
+            last_points,
+        )
+
+    def _set_blocks(
+        self,
+        number_of_rows,
+        starts,
+        stops,
+        block_cycles,
+        block_steps,
+        first_points=None,
+        last_points=None,
+    ):
+        self.number_of_rows = number_of_rows
+        self.starts = np.asarray(starts).astype(np.int64)
+        self.stops = np.asarray(stops).astype(np.int64)
+        self.block_cycles = np.asarray(block_cycles)
+        self.block_steps = np.asarray(block_steps)
+        self.block_first_data_points = first_points
+        self.block_last_data_points = last_points
+
+        self._cycle_blocks = dict()
+        self._cycle_step_blocks = dict()
+        for block, (cycle, step) in enumerate(
+            zip(self.block_cycles.tolist(), self.block_steps.tolist())
+        ):
+            self._cycle_blocks.setdefault(cycle, []).append(block)
+            self._cycle_step_blocks.setdefault((cycle, step), []).append(block)
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Create the index from a frame made by ``to_frame``."""
+        index = cls.__new__(cls)
+        first_points = last_points = None
+        if "first_data_point" in frame.columns:
+            first_points = frame["first_data_point"].to_numpy()
+            last_points = frame["last_data_point"].to_numpy()
+        stops = frame["last_row"].to_numpy() + 1
+        index._set_blocks(
+            int(stops[-1]) if len(stops) else 0,
+            frame["first_row"].to_numpy(),
+            stops,
+            frame["cycle_index"].to_numpy(),
+            frame["step_index"].to_numpy(),
+            first_points,
+            last_points,
+        )
+        return index
+
+    def to_frame(self):
+        """The blocks as a frame (one row pr. block).
+
+        Columns: cycle_index, step_index, first_row and last_row (positions
+        of the first and last row of the block), and first_data_point and
+        last_data_point (if the data points were given).
+        """
+        frame = pd.DataFrame(
+            {
+                "cycle_index": self.block_cycles,
+                "step_index": self.block_steps,
+                "first_row": self.starts,
+                "last_row": self.stops - 1,
+            }
+        )
+        if self.block_first_data_points is not None:
+            frame["first_data_point"] = self.block_first_data_points
+            frame["last_data_point"] = self.block_last_data_points
+        return frame
+
+    def append(self, other):
+        """Returns a new index with the rows of other after its own rows.
+
+        The last block of this index and the first block of other are joined
+        if they have the same cycle and step.
+        """
+        frame = self.to_frame()
+        other_frame = other.to_frame()
+        other_frame["first_row"] += self.number_of_rows
+        other_frame["last_row"] += self.number_of_rows
+        if len(frame) and len(other_frame):
+            last = frame.iloc[-1]
+            first = other_frame.iloc[0]
+            if (last["cycle_index"], last["step_index"]) == (
+                first["cycle_index"],
+                first["step_index"],
+            ):
+                frame.loc[frame.index[-1], "last_row"] = first["last_row"]
+                if "last_data_point" in frame.columns:
+                    frame.loc[frame.index[-1], "last_data_point"] = first[
+                        "last_data_point"
+                    ]
+                other_frame = other_frame.iloc[1:]
+        return self.from_frame(pd.concat([frame, other_frame], ignore_index=True))
+
+    def row_ranges(self, cycles=None, data_points=None):
+        """Returns the (start, stop) row ranges covering a selection.
+
+        Adjacent blocks are merged into one range. Blocks only partly inside
+        the data point range are included (the rows must be filtered after
+        reading).
+
+        Args:
+            cycles (list of ints): select these cycles (all if None).
+            data_points (tuple of ints): select the blocks overlapping
+                data_point[0] to data_point[1] (use None for infinite).
+                Requires that the index has the data points.
+
+        Returns:
+            list of (start, stop) tuples.
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if cycles is not None:
+            selected &= np.isin(self.block_cycles, list(cycles))
+        if data_points is not None:
+            if self.block_first_data_points is None:
+                raise ValueError("the index does not contain the data points")
+            first, last = data_points
+            if first is not None:
+                selected &= self.block_last_data_points >= first
+            if last is not None:
+                selected &= self.block_first_data_points <= last
+        blocks = np.flatnonzero(selected)
+        ranges = []
+        for block in blocks:
+            start, stop = int(self.starts[block]), int(self.stops[block])
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        return ranges
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return (
+            f"<CycleStepIndex: {self.number_of_rows} rows, "
+            f"{len(self._cycle_blocks)} cycles, {len(self)} blocks>"
+        )
+
+    @property
+    def cycles(self):
+        """list of the cycle numbers in the index (in order of appearance)"""
+        return list(self._cycle_blocks.keys())
+
+    def blocks(self, cycle, step=None):
+        """Returns the (sorted) block numbers for a cycle or (cycle, step).
+
+        Args:
+            cycle (int): cycle number.
+            step (int or list of ints): step number(s) (all steps if None).
+
+        Returns:
+            list of block numbers.
+        """
+        if step is None:
+            return list(self._cycle_blocks.get(cycle, []))
+        if not isinstance(step, (list, tuple, set, np.ndarray, pd.Series)):
+            return list(self._cycle_step_blocks.get((cycle, step), []))
+        selected = []
+        for s in set(step):
+            selected.extend(self._cycle_step_blocks.get((cycle, s), []))
+        return sorted(selected)
+
+    def block_positions(self, blocks):
+        """Returns the row positions for the given block numbers.
+
+        Returns a slice if the blocks are adjacent, else an array of row
+        positions (in the order of the raw data).
+        """
+        if not len(blocks):
+            return slice(0, 0)
+        blocks = np.sort(np.asarray(blocks, dtype=np.int64))
+        if blocks[-1] - blocks[0] == len(blocks) - 1:
+            return slice(int(self.starts[blocks[0]]), int(self.stops[blocks[-1]]))
+        return np.concatenate(
+            [np.arange(self.starts[b], self.stops[b]) for b in blocks]
+        )
+
+    def rows(self, cycle, step=None):
+        """Returns the row positions for a cycle or (cycle, step).
+
+        Args:
+            cycle (int): cycle number.
+            step (int or list of ints): step number(s) (all steps if None).
+
+        Returns:
+            slice (or numpy.array of positions if the rows are not contiguous).
+        """
+        return self.block_positions(self.blocks(cycle, step))
+
+    def pair_rows(self, pairs):
+        """Returns the row positions for a collection of (cycle, step) pairs."""
+        selected = []
+        for cycle, step in set(pairs):
+            selected.extend(self._cycle_step_blocks.get((cycle, step), []))
+        return self.block_positions(selected)
+
+
 class Cell(object):
     """Object to store data for a test.
 
@@ -305,6 +556,45 @@ class Cell(object):
         txt += "     Currently defined in the CellpyData-object"
         return txt
 
+    @property
+    def raw(self):
+        raw = self._raw
+        if isinstance(raw, LazyRaw) and raw.loaded:
+            # the proxy has done its job - hand out the real frame from now on
+            raw = self._raw = raw.frame
+        return raw
+
+    @raw.setter
+    def raw(self, value):
+        self._raw = value
+        self._cycle_step_index = None
+
+    @property
+    def cycle_step_index(self):
+        """row-range index for cycles and (cycle, step) pairs of the raw data.
+
+        The index is built the first time it is needed and dropped when a new
+        raw frame is assigned. Call ``invalidate_cycle_step_index`` if the
+        cycle or step columns are modified in-place.
+        """
+        index = getattr(self, "_cycle_step_index", None)
+        if index is None or index.number_of_rows != len(self.raw):
+            self.logger.debug("building cycle-step index")
+            data_points = None
+            if HEADERS_NORMAL.data_point_txt in self.raw.columns:
+                data_points = self.raw[HEADERS_NORMAL.data_point_txt].values
+            index = CycleStepIndex(
+                self.raw[HEADERS_NORMAL.cycle_index_txt].values,
+                self.raw[HEADERS_NORMAL.step_index_txt].values,
+                data_points=data_points,
+            )
+            self._cycle_step_index = index
+        return index
+
+    def invalidate_cycle_step_index(self):
+        """drop the row-range index (rebuilt on next use)"""
+        self._cycle_step_index = None
+
     @property
     def summary_made(self):
         """check if the summary table exists"""
@@ -332,6 +622,348 @@ class Cell(object):
         return empty
 
 
+class LazyRaw(object):
+    """Proxy for the raw data of a cell stored in a cellpy file.
+
+    The summary, steps and meta-data are loaded as usual, while the raw data
+    is read from the file the first time it is really used (for example when
+    a column or an attribute of the frame is accessed). The number of rows
+    (and ``empty``) is looked up in the file without reading the data.
+
+    Use ``load`` to read only a selection (e.g. some of the cycles) without
+    loading the full frame.
+
+    Args:
+        file_name (str): the cellpy file.
+        key (str): the key of the raw table in the file.
+        columns (list of str): only load these columns.
+        cycles (list of ints): only load these cycles.
+        data_points (tuple of ints): only load from data_point[0] to
+            data_point[1] (use None for infinite).
+        index_key (str): the key of the cycle-step index table in the file
+            (used for reading only the rows of the selected cycles).
+    """
+
+    def __init__(
+        self,
+        file_name,
+        key,
+        columns=None,
+        cycles=None,
+        data_points=None,
+        index_key=None,
+    ):
+        self.file_name = file_name
+        self.key = key
+        self.index_key = index_key
+        self.selection = dict(columns=columns, cycles=cycles, data_points=data_points)
+        self._frame = None
+        self._number_of_rows = None
+
+    def __repr__(self):
+        status = "loaded" if self.loaded else "not loaded"
+        return f"<LazyRaw {self.file_name}:{self.key} ({status})>"
+
+    @property
+    def loaded(self):
+        """True if the raw data has been read from the file"""
+        return self._frame is not None
+
+    @property
+    def frame(self):
+        """the raw data (read from the file on first access)"""
+        if self._frame is None:
+            logging.debug(f"loading raw data from {self.file_name}")
+            self._frame = self.load(**self.selection)
+        return self._frame
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def load(self, columns=None, cycles=None, data_points=None):
+        """read (a selection of) the raw data from the file.
+
+        The result is not kept by the proxy.
+
+        Args:
+            columns (list of str): only load these columns.
+            cycles (list of ints): only load these cycles.
+            data_points (tuple of ints): only load from data_point[0] to
+                data_point[1] (use None for infinite).
+
+        Returns:
+            pandas.DataFrame
+        """
+        with open_cellpy_store(self.file_name, mode="r") as store:
+            return select_raw_from_store(
+                store,
+                self.key,
+                columns=columns,
+                cycles=cycles,
+                data_points=data_points,
+                index_key=self.index_key,
+            )
+
+    def iter_chunks(self, chunksize, columns=None, cycles=None, data_points=None):
+        """iterate over (a selection of) the raw data in chunks.
+
+        The selection given when creating the proxy is used for the arguments
+        that are not given. Only one chunk is kept in memory at a time.
+
+        Args:
+            chunksize (int): number of rows to read at a time.
+            columns (list of str): only load these columns.
+            cycles (list of ints): only load these cycles.
+            data_points (tuple of ints): only load from data_point[0] to
+                data_point[1] (use None for infinite).
+
+        Yields:
+            pandas.DataFrame
+        """
+        if columns is None:
+            columns = self.selection["columns"]
+        if cycles is None:
+            cycles = self.selection["cycles"]
+        if data_points is None:
+            data_points = self.selection["data_points"]
+        with open_cellpy_store(self.file_name, mode="r") as store:
+            yield from iter_raw_from_store(
+                store,
+                self.key,
+                chunksize,
+                columns=columns,
+                cycles=cycles,
+                data_points=data_points,
+            )
+
+    def __len__(self):
+        if self._frame is not None:
+            return len(self._frame)
+        if self._number_of_rows is None:
+            if any(value is not None for value in self.selection.values()):
+                return len(self.frame)
+            with open_cellpy_store(self.file_name, mode="r") as store:
+                storer = store.get_storer(self.key)
+                self._number_of_rows = getattr(storer, "nrows", None)
+            if self._number_of_rows is None:
+                return len(self.frame)
+        return self._number_of_rows
+
+    def __getattr__(self, name):
+        # private names are looked up by copy, pickle etc. - do not load for those
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.frame, name)
+
+    def __getitem__(self, item):
+        return self.frame[item]
+
+    def __setitem__(self, key, value):
+        self.frame[key] = value
+
+    def __contains__(self, item):
+        return item in self.frame
+
+    def __iter__(self):
+        return iter(self.frame)
+
+
+def select_raw_from_store(
+    store, key, columns=None, cycles=None, data_points=None, index_key=None
+):
+    """select (parts of) the raw data from a cellpy-file store.
+
+    If the file contains the cycle-step index (index_key), only the row
+    ranges of the selection are read (using start/stop reads). Else the
+    selection is done by querying the store if the file was saved with
+    data columns (or by filtering the row-groups for parquet stores), or the
+    full table is read and filtered in memory.
+
+    Args:
+        store (pandas.HDFStore or ParquetStore): the opened cellpy file.
+        key (str): the key of the raw table.
+        columns (list of str): only load these columns.
+        cycles (list of ints): only load these cycles.
+        data_points (tuple of ints): only load from data_point[0] to
+            data_point[1] (use None for infinite).
+        index_key (str): the key of the cycle-step index table.
+
+    Returns:
+        pandas.DataFrame
+    """
+    if columns is None and cycles is None and data_points is None:
+        return store.select(key)
+
+    if index_key is not None and (cycles is not None or data_points is not None):
+        raw = _select_raw_using_index(
+            store, key, index_key, columns, cycles, data_points
+        )
+        if raw is not None:
+            return raw
+
+    cycle_index_header = HEADERS_NORMAL.cycle_index_txt
+    if isinstance(store, ParquetStore):
+        filters = []
+        if cycles is not None:
+            filters.append((cycle_index_header, "in", [int(c) for c in cycles]))
+        if data_points is not None:
+            first, last = data_points
+            if first is not None:
+                filters.append((HEADERS_NORMAL.data_point_txt, ">=", int(first)))
+            if last is not None:
+                filters.append((HEADERS_NORMAL.data_point_txt, "<=", int(last)))
+        return store.select(key, columns=columns, filters=filters)
+
+    where = _raw_where(cycles, data_points)
+    try:
+        return store.select(key, where=where or None, columns=columns)
+    except ValueError as e:
+        # files saved without data columns can only be filtered in memory
+        logging.debug(f"could not query the raw data ({e})")
+    return _filter_raw(store.select(key), columns, cycles, data_points)
+
+
+def read_cycle_step_index(store, index_key):
+    """read the cycle-step index from a cellpy-file store (None if missing)"""
+    if index_key not in store:
+        return None
+    return CycleStepIndex.from_frame(store.select(index_key))
+
+
+def _select_raw_using_index(store, key, index_key, columns, cycles, data_points):
+    # reads the row ranges of the selection (None if it is not possible)
+    if isinstance(store, ParquetStore):
+        return None
+    storer = store.get_storer(key)
+    if storer is None or not storer.is_table:
+        return None
+    index = read_cycle_step_index(store, index_key)
+    if index is None or index.number_of_rows != storer.nrows:
+        return None
+    if data_points is not None and index.block_first_data_points is None:
+        return None
+
+    read_columns = columns
+    cycle_index_header = HEADERS_NORMAL.cycle_index_txt
+    if columns is not None and cycles is not None:
+        if cycle_index_header not in columns:
+            read_columns = list(columns) + [cycle_index_header]
+
+    ranges = index.row_ranges(cycles=cycles, data_points=data_points) or [(0, 0)]
+    logging.debug(f"reading {len(ranges)} row range(s) from {key}")
+    raw = pd.concat(
+        [
+            store.select(key, start=start, stop=stop, columns=read_columns)
+            for start, stop in ranges
+        ]
+    )
+    return _filter_raw(raw, columns, cycles, data_points)
+
+
+def iter_raw_from_store(
+    store, key, chunksize, columns=None, cycles=None, data_points=None
+):
+    """iterate over (parts of) the raw data in a cellpy-file store in chunks.
+
+    Raw data saved in the table format (the default) is read using chunked
+    selects (queried if the file was saved with data columns, else filtered
+    in memory chunk by chunk). Raw data saved in the fixed format must be
+    read at once before it is split in chunks.
+
+    Args:
+        store (pandas.HDFStore or ParquetStore): the opened cellpy file.
+        key (str): the key of the raw table.
+        chunksize (int): number of rows to read at a time.
+        columns (list of str): only load these columns.
+        cycles (list of ints): only load these cycles.
+        data_points (tuple of ints): only load from data_point[0] to
+            data_point[1] (use None for infinite).
+
+    Yields:
+        pandas.DataFrame
+    """
+    read_columns = columns
+    cycle_index_header = HEADERS_NORMAL.cycle_index_txt
+    if columns is not None and cycles is not None:
+        if cycle_index_header not in columns:
+            read_columns = list(columns) + [cycle_index_header]
+
+    if isinstance(store, ParquetStore):
+        chunks = store.iter_select(key, chunksize, columns=read_columns)
+    else:
+        where = _raw_where(cycles, data_points)
+        try:
+            chunks = store.select(
+                key, where=where or None, columns=read_columns, chunksize=chunksize
+            )
+        except ValueError as e:
+            # files saved without data columns can only be filtered in memory
+            logging.debug(f"could not query the raw data ({e})")
+            chunks = store.select(key, columns=read_columns, chunksize=chunksize)
+        except TypeError:
+            logging.debug("the raw data is not saved as a table - reading all")
+            chunks = iter_frame_in_chunks(store.select(key), chunksize)
+
+    for chunk in chunks:
+        chunk = _filter_raw(chunk, columns, cycles, data_points)
+        if not chunk.empty:
+            yield chunk
+
+
+def iter_frame_in_chunks(raw, chunksize, columns=None, cycles=None, data_points=None):
+    """iterate over (parts of) raw data already in memory in chunks"""
+    for start in range(0, len(raw), chunksize):
+        chunk = _filter_raw(
+            raw.iloc[start : start + chunksize], columns, cycles, data_points
+        )
+        if not chunk.empty:
+            yield chunk
+
+
+def _raw_where(cycles=None, data_points=None):
+    # where-query for selecting cycles and data points from the raw table
+    cycle_index_header = HEADERS_NORMAL.cycle_index_txt
+    where = []
+    if cycles is not None:
+        cycles = sorted(set(int(cycle) for cycle in cycles))
+        if cycles and cycles[-1] - cycles[0] == len(cycles) - 1:
+            where.append(f"{cycle_index_header} >= {cycles[0]}")
+            where.append(f"{cycle_index_header} <= {cycles[-1]}")
+        else:
+            where.append(f"{cycle_index_header} in {cycles}")
+    if data_points is not None:
+        first, last = data_points
+        if first is not None:
+            where.append(f"index >= {int(first)}")
+        if last is not None:
+            where.append(f"index <= {int(last)}")
+    return where
+
+
+def _filter_raw(raw, columns=None, cycles=None, data_points=None):
+    # selecting cycles, data points and columns from raw data in memory
+    if cycles is not None:
+        cycles = [int(cycle) for cycle in cycles]
+        raw = raw.loc[raw[HEADERS_NORMAL.cycle_index_txt].isin(cycles)]
+    if data_points is not None:
+        first, last = data_points
+        data_point_header = HEADERS_NORMAL.data_point_txt
+        if data_point_header in raw.columns:
+            points = raw[data_point_header].to_numpy()
+        else:
+            points = raw.index.to_numpy()
+        keep = np.ones(len(raw), dtype=bool)
+        if first is not None:
+            keep &= points >= first
+        if last is not None:
+            keep &= points <= last
+        raw = raw.loc[keep]
+    if columns is not None:
+        raw = raw[columns]
+    return raw
+
+
 def identify_last_data_point(data):
     """Find the last data point and store it in the fid instance"""
 
@@ -353,6 +985,79 @@ def identify_last_data_point(data):
     return data
 
 
+def compact_dtypes(data):
+    """Convert the raw data to compact dtypes (if prms.Reader.compact_dtypes).
+
+    This is opt-in (prms.Reader.compact_dtypes is False by default). The
+    index-like columns get the (integer) dtypes given by
+    get_dtypes_normal(), the columns in prms.Reader.float32_columns are
+    converted to float32 and text columns are made categorical. Columns that
+    can not be converted without loss are left as they are.
+    """
+
+    if not prms.Reader.compact_dtypes:
+        return data
+    try:
+        raw = data.raw
+        raw.columns
+    except AttributeError:
+        return data
+
+    dtypes = {
+        HEADERS_NORMAL[key]: dtype
+        for key, dtype in DTYPES_NORMAL.items()
+        if key in HEADERS_NORMAL
+    }
+    for col in prms.Reader.float32_columns or []:
+        dtypes[HEADERS_NORMAL.get(col, col)] = "float32"
+
+    converted = dict()
+    for col in raw.columns:
+        values = raw[col]
+        if col in dtypes:
+            new_values = _convert_to_compact_dtype(values, dtypes[col])
+        elif values.dtype == object and col != HEADERS_NORMAL.datetime_txt:
+            new_values = _convert_to_categorical(values)
+        else:
+            new_values = None
+        if new_values is not None:
+            converted[col] = new_values
+
+    if converted:
+        logging.debug(f"compact dtypes for: {list(converted.keys())}")
+        data.raw = raw.assign(**converted)
+    return data
+
+
+def _convert_to_compact_dtype(values, dtype):
+    dtype = np.dtype(dtype)
+    if values.dtype == dtype:
+        return None
+    if dtype.kind == "f":
+        if values.dtype.kind not in "iuf":
+            return None
+        return values.astype(dtype)
+    if values.dtype.kind not in "iuf" or values.isna().any():
+        return None
+    if len(values):
+        limits = np.iinfo(dtype)
+        v_min, v_max = values.min(), values.max()
+        if v_min < limits.min or v_max > limits.max:
+            return None
+    new_values = values.astype(dtype)
+    if values.dtype.kind == "f" and not (new_values == values).all():
+        return None
+    return new_values
+
+
+def _convert_to_categorical(values):
+    if not len(values):
+        return None
+    if values.nunique() > MAX_CATEGORICAL_FRACTION * len(values):
+        return None
+    return values.astype("category")
+
+
 def check64bit(current_system="python"):
     """checks if you are on a 64 bit platform"""
     if current_system == "python":
@@ -7,6 +7,8 @@ import logging
 import platform
 import warnings
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import numpy as np
 
 import pandas as pd
@@ -356,6 +358,43 @@ class ArbinLoader(Loader):
 
         return constr
 
+    @contextmanager
+    def _scratch_copy(self, file_name, copy=True):
+        """Context manager giving the file to read from during loading.
+
+        Each load gets its own private scratch directory (removed when
+        leaving the context). The raw file is copied into it if copy is True
+        or if the source can not be opened read-only, otherwise the source
+        file itself is used.
+
+        Args:
+            file_name (str): path to the .res file.
+            copy (bool): always copy the file to the scratch directory.
+
+        Yields:
+            path to the file to read from.
+        """
+        temp_dir = tempfile.mkdtemp(prefix="cellpy_arbin_")
+        try:
+            if copy or not self._is_readable(file_name):
+                temp_filename = os.path.join(temp_dir, os.path.basename(file_name))
+                shutil.copy2(file_name, temp_filename)
+                self.logger.debug("tmp file: %s" % temp_filename)
+            else:
+                temp_filename = file_name
+                self.logger.debug("reading directly from: %s" % temp_filename)
+            yield temp_filename
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _is_readable(file_name):
+        try:
+            with open(file_name, "rb"):
+                return True
+        except OSError:
+            return False
+
     def _clean_up_loadres(self, cur, conn, filename):
         if cur is not None:
             cur.close()  # adodbapi
@@ -474,84 +513,84 @@ class ArbinLoader(Loader):
 
         # creating temporary file and connection
 
-        temp_dir = tempfile.gettempdir()
-        temp_filename = os.path.join(temp_dir, os.path.basename(file_name))
-        shutil.copy2(file_name, temp_dir)
-        constr = self._get_res_connector(temp_filename)
+        with self._scratch_copy(file_name) as temp_filename:
+            constr = self._get_res_connector(temp_filename)
 
-        if use_ado:
-            conn = dbloader.connect(constr)
-        else:
-            conn = dbloader.connect(constr, autocommit=True)
+            if use_ado:
+                conn = dbloader.connect(constr)
+            else:
+                conn = dbloader.connect(constr, autocommit=True)
 
-        self.logger.debug("tmp file: %s" % temp_filename)
-        self.logger.debug("constr str: %s" % constr)
+            self.logger.debug("tmp file: %s" % temp_filename)
+            self.logger.debug("constr str: %s" % constr)
 
-        # --------- read global-data ------------------------------------
-        self.logger.debug("reading global data table")
-        sql = "select * from %s" % table_name_global
-        global_data_df = pd.read_sql_query(sql, conn)
-        # col_names = list(global_data_df.columns.values)
-        self.logger.debug("sql statement: %s" % sql)
+            # --------- read global-data ------------------------------------
+            self.logger.debug("reading global data table")
+            sql = "select * from %s" % table_name_global
+            global_data_df = pd.read_sql_query(sql, conn)
+            # col_names = list(global_data_df.columns.values)
+            self.logger.debug("sql statement: %s" % sql)
 
-        tests = global_data_df[self.arbin_headers_normal.test_id_txt]
-        number_of_sets = len(tests)
-        self.logger.debug("number of datasets: %i" % number_of_sets)
-        self.logger.debug("only selecting first test")
-        test_no = 0
-        self.logger.debug("setting data for test number %i" % test_no)
-        loaded_from = file_name
-        # fid = FileID(file_name)
-        start_datetime = global_data_df[
-            self.arbin_headers_global["start_datetime_txt"]
-        ][test_no]
-        test_ID = int(
-            global_data_df[self.arbin_headers_normal.test_id_txt][test_no]
-        )  # OBS
-        test_name = global_data_df[self.arbin_headers_global["test_name_txt"]][test_no]
+            tests = global_data_df[self.arbin_headers_normal.test_id_txt]
+            number_of_sets = len(tests)
+            self.logger.debug("number of datasets: %i" % number_of_sets)
+            self.logger.debug("only selecting first test")
+            test_no = 0
+            self.logger.debug("setting data for test number %i" % test_no)
+            loaded_from = file_name
+            # fid = FileID(file_name)
+            start_datetime = global_data_df[
+                self.arbin_headers_global["start_datetime_txt"]
+            ][test_no]
+            test_ID = int(
+                global_data_df[self.arbin_headers_normal.test_id_txt][test_no]
+            )  # OBS
+            test_name = global_data_df[self.arbin_headers_global["test_name_txt"]][
+                test_no
+            ]
+
+            # --------- read raw-data (normal-data) -------------------------
+            self.logger.debug("reading raw-data")
 
-        # --------- read raw-data (normal-data) -------------------------
-        self.logger.debug("reading raw-data")
+            columns = ["Data_Point", "Step_Index", "Cycle_Index"]
+            columns.extend(headers)
+            columns_txt = ", ".join(["%s"] * len(columns)) % tuple(columns)
 
-        columns = ["Data_Point", "Step_Index", "Cycle_Index"]
-        columns.extend(headers)
-        columns_txt = ", ".join(["%s"] * len(columns)) % tuple(columns)
+            sql_1 = "select %s " % columns_txt
+            sql_2 = "from %s " % table_name_normal
+            sql_3 = "where %s=%s " % (self.arbin_headers_normal.test_id_txt, test_ID)
+            sql_5 = "order by %s" % self.arbin_headers_normal.data_point_txt
+            import time
+
+            info_list = []
+            info_header = ["cycle", "row_count", "start_point", "end_point"]
+            info_header.extend(headers)
+            self.logger.info(" ".join(info_header))
+            self.logger.info("-------------------------------------------------")
+
+            for cycle_number in range(1, 2000):
+                t1 = time.time()
+                self.logger.debug("picking cycle %i" % cycle_number)
+                sql_4 = "AND %s=%i " % (cycle_txt, cycle_number)
+                sql = sql_1 + sql_2 + sql_3 + sql_4 + sql_5
+                self.logger.debug("sql statement: %s" % sql)
+                normal_df = pd.read_sql_query(sql, conn)
+                t2 = time.time()
+                dt = t2 - t1
+                self.logger.debug("time: %f" % dt)
+                if normal_df.empty:
+                    self.logger.debug("reached the end")
+                    break
+                row_count, _ = normal_df.shape
+                start_point = normal_df[point_txt].min()
+                end_point = normal_df[point_txt].max()
+                last = normal_df.iloc[-1, :]
 
-        sql_1 = "select %s " % columns_txt
-        sql_2 = "from %s " % table_name_normal
-        sql_3 = "where %s=%s " % (self.arbin_headers_normal.test_id_txt, test_ID)
-        sql_5 = "order by %s" % self.arbin_headers_normal.data_point_txt
-        import time
-
-        info_list = []
-        info_header = ["cycle", "row_count", "start_point", "end_point"]
-        info_header.extend(headers)
-        self.logger.info(" ".join(info_header))
-        self.logger.info("-------------------------------------------------")
-
-        for cycle_number in range(1, 2000):
-            t1 = time.time()
-            self.logger.debug("picking cycle %i" % cycle_number)
-            sql_4 = "AND %s=%i " % (cycle_txt, cycle_number)
-            sql = sql_1 + sql_2 + sql_3 + sql_4 + sql_5
-            self.logger.debug("sql statement: %s" % sql)
-            normal_df = pd.read_sql_query(sql, conn)
-            t2 = time.time()
-            dt = t2 - t1
-            self.logger.debug("time: %f" % dt)
-            if normal_df.empty:
-                self.logger.debug("reached the end")
-                break
-            row_count, _ = normal_df.shape
-            start_point = normal_df[point_txt].min()
-            end_point = normal_df[point_txt].max()
-            last = normal_df.iloc[-1, :]
-
-            step_list = [cycle_number, row_count, start_point, end_point]
-            step_list.extend([last[x] for x in headers])
-            info_list.append(step_list)
+                step_list = [cycle_number, row_count, start_point, end_point]
+                step_list.extend([last[x] for x in headers])
+                info_list.append(step_list)
 
-        self._clean_up_loadres(None, conn, temp_filename)
+            self._clean_up_loadres(None, conn, temp_filename)
         info_dict = pd.DataFrame(info_list, columns=info_header)
         return info_dict
 
@@ -583,88 +622,94 @@ class ArbinLoader(Loader):
 
         # creating temporary file and connection
 
-        temp_dir = tempfile.gettempdir()
-        temp_filename = os.path.join(temp_dir, os.path.basename(file_name))
-        shutil.copy2(file_name, temp_dir)
-        constr = self._get_res_connector(temp_filename)
-
-        if use_ado:
-            conn = dbloader.connect(constr)
-        else:
-            conn = dbloader.connect(constr, autocommit=True)
+        with self._scratch_copy(file_name) as temp_filename:
+            constr = self._get_res_connector(temp_filename)
 
-        self.logger.debug("tmp file: %s" % temp_filename)
-        self.logger.debug("constr str: %s" % constr)
-
-        # --------- read global-data ------------------------------------
-        self.logger.debug("reading global data table")
-        sql = "select * from %s" % table_name_global
-        global_data_df = pd.read_sql_query(sql, conn)
-        # col_names = list(global_data_df.columns.values)
-        self.logger.debug("sql statement: %s" % sql)
-
-        tests = global_data_df[self.arbin_headers_normal.test_id_txt]
-        number_of_sets = len(tests)
-        self.logger.debug("number of datasets: %i" % number_of_sets)
-        self.logger.debug("only selecting first test")
-        test_no = 0
-        self.logger.debug("setting data for test number %i" % test_no)
-        loaded_from = file_name
-        # fid = FileID(file_name)
-        start_datetime = global_data_df[
-            self.arbin_headers_global["start_datetime_txt"]
-        ][test_no]
-        test_ID = int(
-            global_data_df[self.arbin_headers_normal.test_id_txt][test_no]
-        )  # OBS
-        test_name = global_data_df[self.arbin_headers_global["test_name_txt"]][test_no]
-
-        # --------- read raw-data (normal-data) -------------------------
-        self.logger.debug("reading raw-data")
+            if use_ado:
+                conn = dbloader.connect(constr)
+            else:
+                conn = dbloader.connect(constr, autocommit=True)
 
-        columns = ["Data_Point", "Step_Index", "Cycle_Index"]
-        columns_txt = ", ".join(["%s"] * len(columns)) % tuple(columns)
+            self.logger.debug("tmp file: %s" % temp_filename)
+            self.logger.debug("constr str: %s" % constr)
 
-        sql_1 = "select %s " % columns_txt
-        sql_2 = "from %s " % table_name_normal
-        sql_3 = "where %s=%s " % (self.arbin_headers_normal.test_id_txt, test_ID)
-        sql_5 = "order by %s" % self.arbin_headers_normal.data_point_txt
-        import time
-
-        info_list = []
-        info_header = ["cycle", "step", "row_count", "start_point", "end_point"]
-        self.logger.info(" ".join(info_header))
-        self.logger.info("-------------------------------------------------")
-        for cycle_number in range(1, 2000):
-            t1 = time.time()
-            self.logger.debug("picking cycle %i" % cycle_number)
-            sql_4 = "AND %s=%i " % (cycle_txt, cycle_number)
-            sql = sql_1 + sql_2 + sql_3 + sql_4 + sql_5
+            # --------- read global-data ------------------------------------
+            self.logger.debug("reading global data table")
+            sql = "select * from %s" % table_name_global
+            global_data_df = pd.read_sql_query(sql, conn)
+            # col_names = list(global_data_df.columns.values)
             self.logger.debug("sql statement: %s" % sql)
-            normal_df = pd.read_sql_query(sql, conn)
-            t2 = time.time()
-            dt = t2 - t1
-            self.logger.debug("time: %f" % dt)
-            if normal_df.empty:
-                self.logger.debug("reached the end")
-                break
-            row_count, _ = normal_df.shape
-            steps = normal_df[self.arbin_headers_normal.step_index_txt].unique()
-            txt = "cycle %i: %i [" % (cycle_number, row_count)
-            for step in steps:
-                self.logger.debug(" step: %i" % step)
-                step_df = normal_df.loc[normal_df[step_txt] == step]
-                step_row_count, _ = step_df.shape
-                start_point = step_df[point_txt].min()
-                end_point = step_df[point_txt].max()
-                txt += " %i-(%i)" % (step, step_row_count)
-                step_list = [cycle_number, step, step_row_count, start_point, end_point]
-                info_list.append(step_list)
 
-            txt += "]"
-            self.logger.info(txt)
+            tests = global_data_df[self.arbin_headers_normal.test_id_txt]
+            number_of_sets = len(tests)
+            self.logger.debug("number of datasets: %i" % number_of_sets)
+            self.logger.debug("only selecting first test")
+            test_no = 0
+            self.logger.debug("setting data for test number %i" % test_no)
+            loaded_from = file_name
+            # fid = FileID(file_name)
+            start_datetime = global_data_df[
+                self.arbin_headers_global["start_datetime_txt"]
+            ][test_no]
+            test_ID = int(
+                global_data_df[self.arbin_headers_normal.test_id_txt][test_no]
+            )  # OBS
+            test_name = global_data_df[self.arbin_headers_global["test_name_txt"]][
+                test_no
+            ]
+
+            # --------- read raw-data (normal-data) -------------------------
+            self.logger.debug("reading raw-data")
 
-        self._clean_up_loadres(None, conn, temp_filename)
+            columns = ["Data_Point", "Step_Index", "Cycle_Index"]
+            columns_txt = ", ".join(["%s"] * len(columns)) % tuple(columns)
+
+            sql_1 = "select %s " % columns_txt
+            sql_2 = "from %s " % table_name_normal
+            sql_3 = "where %s=%s " % (self.arbin_headers_normal.test_id_txt, test_ID)
+            sql_5 = "order by %s" % self.arbin_headers_normal.data_point_txt
+            import time
+
+            info_list = []
+            info_header = ["cycle", "step", "row_count", "start_point", "end_point"]
+            self.logger.info(" ".join(info_header))
+            self.logger.info("-------------------------------------------------")
+            for cycle_number in range(1, 2000):
+                t1 = time.time()
+                self.logger.debug("picking cycle %i" % cycle_number)
+                sql_4 = "AND %s=%i " % (cycle_txt, cycle_number)
+                sql = sql_1 + sql_2 + sql_3 + sql_4 + sql_5
+                self.logger.debug("sql statement: %s" % sql)
+                normal_df = pd.read_sql_query(sql, conn)
+                t2 = time.time()
+                dt = t2 - t1
+                self.logger.debug("time: %f" % dt)
+                if normal_df.empty:
+                    self.logger.debug("reached the end")
+                    break
+                row_count, _ = normal_df.shape
+                steps = normal_df[self.arbin_headers_normal.step_index_txt].unique()
+                txt = "cycle %i: %i [" % (cycle_number, row_count)
+                for step in steps:
+                    self.logger.debug(" step: %i" % step)
+                    step_df = normal_df.loc[normal_df[step_txt] == step]
+                    step_row_count, _ = step_df.shape
+                    start_point = step_df[point_txt].min()
+                    end_point = step_df[point_txt].max()
+                    txt += " %i-(%i)" % (step, step_row_count)
+                    step_list = [
+                        cycle_number,
+                        step,
+                        step_row_count,
+                        start_point,
+                        end_point,
+                    ]
+                    info_list.append(step_list)
+
+                txt += "]"
+                self.logger.info(txt)
+
+            self._clean_up_loadres(None, conn, temp_filename)
         info_dict = pd.DataFrame(info_list, columns=info_header)
         return info_dict
 
@@ -785,14 +830,16 @@ class ArbinLoader(Loader):
             data.raw_data_files_length.append(length_of_test)
             data = self._post_process(data)
             data = self.identify_last_data_point(data)
+            data = self.compact_dtypes(data)
             new_tests.append(data)
+
+        self._clean_up_loadres(None, conn, temp_filename)
         return new_tests
 
     def _loader_posix(
         self,
         file_name,
         temp_filename,
-        temp_dir,
         *args,
         bad_steps=None,
         dataset_number=None,
@@ -817,69 +864,83 @@ class ArbinLoader(Loader):
         if DEBUG_MODE:
             time_0 = time.time()
 
-        tmp_name_global, tmp_name_raw, tmp_name_stats = self._create_tmp_files(
-            table_name_global,
-            table_name_normal,
-            table_name_stats,
-            temp_dir,
-            temp_filename,
-        )
-
-        # use pandas to load in the data
-        global_data_df = pd.read_csv(tmp_name_global)
-        tests = global_data_df[self.arbin_headers_normal.test_id_txt]
-
-        number_of_sets = len(tests)
-        self.logger.debug("number of datasets: %i" % number_of_sets)
-        self.logger.debug(f"datasets: {tests}")
+        # the tables are streamed directly from mdb-export (no tmp csv files).
+        # The three exports run concurrently: the global and stats tables are
+        # read by worker threads while the normal table is being exported.
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            global_job = pool.submit(
+                self._read_mdb_table, temp_filename, table_name_global
+            )
+            stats_job = pool.submit(
+                self._read_mdb_table, temp_filename, table_name_stats
+            )
+            normal_proc = self._mdb_export(temp_filename, table_name_normal)
+            try:
+                global_data_df = global_job.result()
+                tests = global_data_df[self.arbin_headers_normal.test_id_txt]
 
-        if dataset_number is not None:
-            self.logger.info(f"Dataset number given: {dataset_number}")
-            self.logger.info(f"Available dataset numbers: {tests}")
-            test_nos = [dataset_number]
-        else:
-            test_nos = range(number_of_sets)
+                number_of_sets = len(tests)
+                self.logger.debug("number of datasets: %i" % number_of_sets)
+                self.logger.debug(f"datasets: {tests}")
 
-        for counter, test_no in enumerate(test_nos):
-            if counter > 0:
-                self.logger.warning("** WARNING ** MULTI-TEST-FILE (not recommended)")
-                if not ALLOW_MULTI_TEST_FILE:
-                    break
-            data = self._init_data(file_name, global_data_df, test_no)
+                if dataset_number is not None:
+                    self.logger.info(f"Dataset number given: {dataset_number}")
+                    self.logger.info(f"Available dataset numbers: {tests}")
+                    test_nos = [dataset_number]
+                else:
+                    test_nos = range(number_of_sets)
 
-            self.logger.debug("reading raw-data")
+                for counter, test_no in enumerate(test_nos):
+                    if counter > 0:
+                        self.logger.warning(
+                            "** WARNING ** MULTI-TEST-FILE (not recommended)"
+                        )
+                        if not ALLOW_MULTI_TEST_FILE:
+                            break
+                    data = self._init_data(file_name, global_data_df, test_no)
 
-            length_of_test, normal_df, summary_df = self._load_from_tmp_files(
-                data,
-                tmp_name_global,
-                tmp_name_raw,
-                tmp_name_stats,
-                temp_filename,
-                bad_steps,
-                data_points,
-            )
+                    self.logger.debug("reading raw-data")
 
-            if summary_df.empty and prms.Reader.use_cellpy_stat_file:
-                txt = "\nCould not find any summary (stats-file)!"
-                txt += "\n -> issue make_summary(use_cellpy_stat_file=False)"
-                logging.debug(txt)
-            # normal_df = normal_df.set_index("Data_Point")
+                    if normal_proc is None:
+                        normal_proc = self._mdb_export(
+                            temp_filename, table_name_normal
+                        )
+                    # the stream is closed by _stream_normal_table
+                    proc, normal_proc = normal_proc, None
+                    length_of_test, normal_df = self._stream_normal_table(
+                        proc, data.test_ID, bad_steps, data_points
+                    )
+                    summary_df = stats_job.result()
 
-            data.summary = summary_df
-            if DEBUG_MODE:
-                mem_usage = normal_df.memory_usage()
-                logging.debug(
-                    f"memory usage for "
-                    f"loaded data: \n{mem_usage}"
-                    f"\ntotal: {humanize_bytes(mem_usage.sum())}"
-                )
-                logging.debug(f"time used: {(time.time() - time_0):2.4f} s")
+                    if summary_df.empty and prms.Reader.use_cellpy_stat_file:
+                        txt = "\nCould not find any summary (stats-file)!"
+                        txt += (
+                            "\n -> issue make_summary(use_cellpy_stat_file=False)"
+                        )
+                        logging.debug(txt)
+                    # normal_df = normal_df.set_index("Data_Point")
+
+                    data.summary = summary_df
+                    if DEBUG_MODE:
+                        mem_usage = normal_df.memory_usage()
+                        logging.debug(
+                            f"memory usage for "
+                            f"loaded data: \n{mem_usage}"
+                            f"\ntotal: {humanize_bytes(mem_usage.sum())}"
+                        )
+                        logging.debug(
+                            f"time used: {(time.time() - time_0):2.4f} s"
+                        )
 
-            data.raw = normal_df
-            data.raw_data_files_length.append(length_of_test)
-            data = self._post_process(data)
-            data = self.identify_last_data_point(data)
-            new_tests.append(data)
+                    data.raw = normal_df
+                    data.raw_data_files_length.append(length_of_test)
+                    data = self._post_process(data)
+                    data = self.identify_last_data_point(data)
+                    data = self.compact_dtypes(data)
+                    new_tests.append(data)
+            finally:
+                if normal_proc is not None:
+                    self._close_mdb_export(normal_proc, check=False)
         return new_tests
 
     def loader(
@@ -931,168 +992,192 @@ class ArbinLoader(Loader):
             print(error_message)
             return None
 
-        temp_dir = tempfile.gettempdir()
-        temp_filename = os.path.join(temp_dir, os.path.basename(file_name))
-        shutil.copy2(file_name, temp_dir)
-        self.logger.debug("tmp file: %s" % temp_filename)
-
         use_mdbtools = False
         if use_subprocess:
             use_mdbtools = True
         if is_posix:
             use_mdbtools = True
 
-        if use_mdbtools:
-            new_tests = self._loader_posix(
-                file_name,
-                temp_filename,
-                temp_dir,
-                *args,
-                bad_steps=bad_steps,
-                dataset_number=dataset_number,
-                data_points=data_points,
-                **kwargs,
-            )
-        else:
-            new_tests = self._loader_win(
-                file_name,
-                temp_filename,
-                *args,
-                bad_steps=bad_steps,
-                dataset_number=dataset_number,
-                data_points=data_points,
-                **kwargs,
-            )
+        # mdb-export only reads the file, so it is not necessary to copy it
+        with self._scratch_copy(file_name, copy=not use_mdbtools) as temp_filename:
+            if use_mdbtools:
+                new_tests = self._loader_posix(
+                    file_name,
+                    temp_filename,
+                    *args,
+                    bad_steps=bad_steps,
+                    dataset_number=dataset_number,
+                    data_points=data_points,
+                    **kwargs,
+                )
+            else:
+                new_tests = self._loader_win(
+                    file_name,
+                    temp_filename,
+                    *args,
+                    bad_steps=bad_steps,
+                    dataset_number=dataset_number,
+                    data_points=data_points,
+                    **kwargs,
+                )
 
         new_tests = self._inspect(new_tests)
 
         return new_tests
 
-    def _create_tmp_files(
-        self,
-        table_name_global,
-        table_name_normal,
-        table_name_stats,
-        temp_dir,
-        temp_filename,
-    ):
+    def _mdb_export(self, temp_filename, table_name):
         import subprocess
 
-        # creating tmp-filenames
-        temp_csv_filename_global = os.path.join(temp_dir, "global_tmp.csv")
-        temp_csv_filename_normal = os.path.join(temp_dir, "normal_tmp.csv")
-        temp_csv_filename_stats = os.path.join(temp_dir, "stats_tmp.csv")
-        # making the cmds
-        mdb_prms = [
-            (table_name_global, temp_csv_filename_global),
-            (table_name_normal, temp_csv_filename_normal),
-            (table_name_stats, temp_csv_filename_stats),
-        ]
-        # executing cmds
-        for table_name, tmp_file in mdb_prms:
-            with open(tmp_file, "w") as f:
-                subprocess.call([sub_process_path, temp_filename, table_name], stdout=f)
-                self.logger.debug(f"ran mdb-export {str(f)} {table_name}")
-        return (
-            temp_csv_filename_global,
-            temp_csv_filename_normal,
-            temp_csv_filename_stats,
+        self.logger.debug(f"running mdb-export {table_name}")
+        # stderr goes to a temporary file (a pipe that is not read while
+        # reading stdout would block mdb-export when it writes many warnings)
+        stderr_file = tempfile.TemporaryFile()
+        proc = subprocess.Popen(
+            [sub_process_path, temp_filename, table_name],
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
         )
+        proc.stderr_file = stderr_file
+        return proc
 
-    def _load_from_tmp_files(
-        self,
-        data,
-        temp_csv_filename_global,
-        temp_csv_filename_normal,
-        temp_csv_filename_stats,
-        temp_filename,
-        bad_steps,
-        data_points,
-    ):
+    def _close_mdb_export(self, proc, check=True):
+        """Close the stdout pipe of an mdb-export process and wait for it.
 
+        Use check=False when stopping before the end of the export (the
+        process is then killed). Otherwise, IOError is raised if the export
+        failed (non-zero return code). Messages on stderr are logged as
+        warnings.
         """
-        if bad_steps is not None:
-            if not isinstance(bad_steps, (list, tuple)):
-                bad_steps = [bad_steps]
-            for bad_cycle, bad_step in bad_steps:
-                self.logger.debug(f"bad_step def: [c={bad_cycle}, s={bad_step}]")
-                sql_4 += "AND NOT (%s=%i " % (
-                    self.headers_normal.cycle_index_txt,
-                    bad_cycle,
-                )
-                sql_4 += "AND %s=%i) " % (self.headers_normal.step_index_txt, bad_step)
+        if not check and proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        return_code = proc.wait()
+        proc.stderr_file.seek(0)
+        error_message = proc.stderr_file.read().decode(errors="replace").strip()
+        proc.stderr_file.close()
+        self.logger.debug(f"mdb-export finished (return code: {return_code})")
+        if check and return_code:
+            raise IOError(
+                f"mdb-export failed (return code: {return_code}): {error_message}"
+            )
+        if check and error_message:
+            self.logger.warning(f"mdb-export: {error_message}")
 
+    def _read_mdb_table(self, temp_filename, table_name):
+        proc = self._mdb_export(temp_filename, table_name)
+        try:
+            df = pd.read_csv(proc.stdout)
+        except pd.errors.EmptyDataError:
+            self.logger.debug(f"no data exported from {table_name}")
+            df = pd.DataFrame()
+        except Exception:
+            self._close_mdb_export(proc, check=False)
+            raise
+        self._close_mdb_export(proc)
+        return df
+
+    def _stream_normal_table(self, proc, test_ID, bad_steps, data_points):
+        try:
+            normal_df = self._read_normal_chunks(
+                proc.stdout, test_ID, bad_steps, data_points
+            )
+        except Exception:
+            self._close_mdb_export(proc, check=False)
+            raise
+        self._close_mdb_export(proc)
+        length_of_test = normal_df.shape[0]
+        return length_of_test, normal_df
+
+    def _read_normal_chunks(
+        self, stream, test_ID, bad_steps=None, data_points=None, chunk_size=None
+    ):
+        """Read the (csv-formatted) normal table chunk-wise.
 
+        Only the rows passing the filters (test-ID, bad steps, limit loaded
+        cycles and data points) are kept from each chunk, so that the full
+        table is never in memory at once.
 
+        Args:
+            stream: file-like object (or path) with the exported normal table.
+            test_ID (int): the test-ID to select.
+            bad_steps (list of tuples): (c, s) tuples of steps s (in cycle c)
+                to skip loading.
+            data_points (tuple of ints): load only data from data_point[0] to
+                data_point[1] (use None for infinite).
+            chunk_size (int): number of rows per chunk (defaults to
+                prms.Instruments.Arbin.mdb_export_chunk_size).
+
+        Returns:
+            pandas.DataFrame
         """
-        # should include a more efficient to load the csv (maybe a loop where
-        #   we load only chuncks and only keep the parts that fullfill the
-        #   filters (e.g. bad_steps, data_points,...)
-        normal_df = pd.read_csv(temp_csv_filename_normal)
-        # filter on test ID
-        normal_df = normal_df[
-            normal_df[self.arbin_headers_normal.test_id_txt] == data.test_ID
-        ]
+        if chunk_size is None:
+            chunk_size = prms.Instruments.Arbin.mdb_export_chunk_size
+
+        test_id_txt = self.arbin_headers_normal.test_id_txt
+        usecols = None
+        if prms.Reader["select_minimal"]:  # SETTING
+            usecols = MINIMUM_SELECTION + [test_id_txt]
+
+        try:
+            reader = pd.read_csv(stream, chunksize=chunk_size, usecols=usecols)
+        except pd.errors.EmptyDataError:
+            self.logger.debug("no data exported from the normal table")
+            if usecols is not None:
+                return pd.DataFrame(columns=MINIMUM_SELECTION)
+            return pd.DataFrame(columns=list(self.arbin_headers_normal.values()))
+
+        chunks = []
+        for chunk in reader:
+            chunk = self._filter_normal_chunk(chunk, test_ID, bad_steps, data_points)
+            if prms.Instruments.Arbin.chunk_dtypes:
+                chunk = self._downcast_chunk(
+                    chunk, prms.Instruments.Arbin.chunk_dtypes
+                )
+            chunks.append(chunk)
+        normal_df = pd.concat(chunks, ignore_index=True)
+
+        if usecols is not None:
+            normal_df = normal_df.drop(columns=test_id_txt)
+
         # sort on data point
         if prms._sort_if_subprocess:
             normal_df = normal_df.sort_values(self.arbin_headers_normal.data_point_txt)
+        return normal_df
+
+    def _filter_normal_chunk(self, chunk, test_ID, bad_steps=None, data_points=None):
+        cycle_txt = self.arbin_headers_normal.cycle_index_txt
+        step_txt = self.arbin_headers_normal.step_index_txt
+        point_txt = self.arbin_headers_normal.data_point_txt
+
+        selector = chunk[self.arbin_headers_normal.test_id_txt] == test_ID
 
         if bad_steps is not None:
-            logging.debug("removing bad steps")
             if not isinstance(bad_steps, (list, tuple)):
                 bad_steps = [bad_steps]
             if not isinstance(bad_steps[0], (list, tuple)):
                 bad_steps = [bad_steps]
             for bad_cycle, bad_step in bad_steps:
                 self.logger.debug(f"bad_step def: [c={bad_cycle}, s={bad_step}]")
-
-                selector = (
-                    normal_df[self.arbin_headers_normal.cycle_index_txt] == bad_cycle
-                ) & (normal_df[self.arbin_headers_normal.step_index_txt] == bad_step)
-
-                normal_df = normal_df.loc[~selector, :]
+                selector &= ~(
+                    (chunk[cycle_txt] == bad_cycle) & (chunk[step_txt] == bad_step)
+                )
 
         if prms.Reader["limit_loaded_cycles"]:
             if len(prms.Reader["limit_loaded_cycles"]) > 1:
                 c1, c2 = prms.Reader["limit_loaded_cycles"]
-                selector = (
-                    normal_df[self.arbin_headers_normal.cycle_index_txt] > c1
-                ) & (normal_df[self.arbin_headers_normal.cycle_index_txt] < c2)
-
+                selector &= (chunk[cycle_txt] > c1) & (chunk[cycle_txt] < c2)
             else:
                 c1 = prms.Reader["limit_loaded_cycles"][0]
-                selector = normal_df[self.arbin_headers_normal.cycle_index_txt] == c1
-
-            normal_df = normal_df.loc[selector, :]
+                selector &= chunk[cycle_txt] == c1
 
         if data_points is not None:
-            logging.debug("selecting data-point range")
             d1, d2 = data_points
-
             if d1 is not None:
-                selector = normal_df[self.arbin_headers_normal.data_point_txt] >= d1
-                normal_df = normal_df.loc[selector, :]
-
+                selector &= chunk[point_txt] >= d1
             if d2 is not None:
-                selector = normal_df[self.arbin_headers_normal.data_point_txt] <= d2
-                normal_df = normal_df.loc[selector, :]
+                selector &= chunk[point_txt] <= d2
 
-        length_of_test = normal_df.shape[0]
-        summary_df = pd.read_csv(temp_csv_filename_stats)
-
-        # clean up
-        for f in [
-            temp_filename,
-            temp_csv_filename_stats,
-            temp_csv_filename_normal,
-            temp_csv_filename_global,
-        ]:
-            if os.path.isfile(f):
-                try:
-                    os.remove(f)
-                except WindowsError as e:
-                    self.logger.warning(f"could not remove tmp-file\n{f} {e}")
-        return length_of_test, normal_df, summary_df
+        return chunk.loc[selector, :]
 
     def _init_data(self, file_name, global_data_df, test_no):
         data = Cell()
@@ -1127,6 +1212,83 @@ class ArbinLoader(Loader):
     def _normal_table_generator(self, **kwargs):
         pass
 
+    def _load_res_normal_table_chunked(self, sql, conn):
+        """Load the normal table chunk-wise.
+
+        The chunks are collected in a list and concatenated once at the end.
+        Each chunk is down-casted (prms.Instruments.Arbin.chunk_dtypes) before
+        it is stored. If the memory used by the stored chunks would exceed
+        prms.Instruments.Arbin.max_memory (bytes), or a MemoryError occurs,
+        loading stops after the last complete chunk.
+
+        Returns:
+            length_of_test, normal_df
+        """
+        chunk_size = prms.Instruments.Arbin.chunk_size
+        max_chunks = prms.Instruments.Arbin.max_chunks
+        max_memory = prms.Instruments.Arbin.max_memory
+        dtypes = prms.Instruments.Arbin.chunk_dtypes
+
+        self.logger.debug(f"chunk-size: {chunk_size}")
+        self.logger.debug("creating a pd.read_sql_query generator")
+        normal_df_reader = pd.read_sql_query(sql, conn, chunksize=chunk_size)
+
+        chunks = []
+        memory_used = 0
+        self.logger.debug("iterating chunk-wise")
+        try:
+            for chunk_number, chunk in enumerate(normal_df_reader):
+                if max_chunks and chunk_number >= max_chunks:
+                    self.logger.debug(f"max number of chunks reached ({max_chunks})")
+                    break
+                if dtypes:
+                    chunk = self._downcast_chunk(chunk, dtypes)
+                chunk_memory = chunk.memory_usage(index=False).sum()
+                if max_memory and memory_used + chunk_memory > max_memory:
+                    self.logger.warning(
+                        f"Could not read complete file (max_memory: "
+                        f"{humanize_bytes(max_memory)} reached)."
+                    )
+                    self._report_last_complete_chunk(chunks)
+                    break
+                chunks.append(chunk)
+                memory_used += chunk_memory
+        except MemoryError:
+            self.logger.error(" - Could not read complete file (MemoryError).")
+            self._report_last_complete_chunk(chunks)
+
+        if chunks:
+            normal_df = pd.concat(chunks, ignore_index=True)
+        else:
+            normal_df = pd.DataFrame()
+        length_of_test = normal_df.shape[0]
+        self.logger.debug(
+            f"finished iterating (#chunks: {len(chunks)}, #rows: {length_of_test}, "
+            f"memory: {humanize_bytes(memory_used)})"
+        )
+        return length_of_test, normal_df
+
+    def _report_last_complete_chunk(self, chunks):
+        self.logger.warning(f"Last successfully loaded chunk number: {len(chunks)}")
+        if chunks:
+            data_point_txt = self.arbin_headers_normal.data_point_txt
+            last_data_point = chunks[-1][data_point_txt].iloc[-1]
+            self.logger.warning(
+                f"Last complete data point: {last_data_point} (use "
+                f"data_points=({last_data_point + 1}, None) to load the rest)"
+            )
+
+    def _downcast_chunk(self, chunk, dtypes):
+        converted = dict()
+        for col, dtype in dtypes.items():
+            if col not in chunk.columns:
+                continue
+            try:
+                converted[col] = chunk[col].astype(dtype)
+            except (ValueError, TypeError) as e:
+                self.logger.debug(f"could not convert {col} to {dtype} ({e})")
+        return chunk.assign(**converted)
+
     def _load_res_normal_table(self, conn, test_ID, bad_steps, data_points):
         self.logger.debug("starting loading raw-data")
         self.logger.debug(f"connection: {conn} test-ID: {test_ID}")
@@ -1204,47 +1366,7 @@ class ArbinLoader(Loader):
             length_of_test = normal_df.shape[0]
             self.logger.debug(f"loaded to normal_df (length =  {length_of_test})")
         else:
-            self.logger.debug(f"chunk-size: {prms.Instruments.Arbin.chunk_size}")
-            self.logger.debug("creating a pd.read_sql_query generator")
-            normal_df_reader = pd.read_sql_query(
-                sql, conn, chunksize=prms.Instruments.Arbin.chunk_size
-            )
-            normal_df = None
-            chunk_number = 0
-            self.logger.debug("created pandas sql reader")
-            self.logger.debug("iterating chunk-wise")
-            for i, chunk in enumerate(normal_df_reader):
-                self.logger.debug(f"iteration number {i}")
-                if prms.Instruments.Arbin.max_chunks:
-                    self.logger.debug(
-                        f"max number of chunks mode "
-                        f"({prms.Instruments.Arbin.max_chunks})"
-                    )
-                    if chunk_number < prms.Instruments.Arbin.max_chunks:
-                        normal_df = pd.concat([normal_df, chunk], ignore_index=True)
-                        self.logger.debug(
-                            f"chunk {i} of {prms.Instruments.Arbin.max_chunks}"
-                        )
-                    else:
-                        break
-                else:
-                    try:
-                        normal_df = pd.concat([normal_df, chunk], ignore_index=True)
-                        self.logger.debug("concatenated new chunk")
-                    except MemoryError:
-                        self.logger.error(
-                            " - Could not read complete file (MemoryError)."
-                        )
-                        self.logger.error(
-                            f"Last successfully loaded chunk " f"number: {chunk_number}"
-                        )
-                        self.logger.error(
-                            f"Chunk size: {prms.Instruments.Arbin.chunk_size}"
-                        )
-                        break
-                chunk_number += 1
-            length_of_test = normal_df.shape[0]
-            self.logger.debug(f"finished iterating (#rows: {length_of_test})")
+            length_of_test, normal_df = self._load_res_normal_table_chunked(sql, conn)
         return length_of_test, normal_df
 
 
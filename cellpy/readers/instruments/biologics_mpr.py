@@ -57,21 +57,47 @@ MINIMUM_SELECTION = [
     "Internal_Resistance",
 ]
 
+# The mpr fields used for creating the cellpy columns (the only fields that
+# are copied from the file if minimum selection is selected)
+MINIMUM_MPR_FIELDS = [
+    "flags",
+    "flags2",
+    "time",
+    "Ewe",
+    "I",
+    "QChargeDischarge",
+    "freq",
+    "phaseZ",
+    "absZ",
+    "Ece",
+    "phaseZce",
+]
+
 
-def _read_modules(fileobj):
+def _read_module_header(fileobj):
+    """Read the header of the next module and skip past its data.
+
+    Only the header is read; the position (offset) and length of the data
+    is stored so that it can be read (or memory-mapped) later.
+    """
     module_magic = fileobj.read(len(b"MODULE"))
     hdr_bytes = fileobj.read(hdr_dtype.itemsize)
-    hdr = np.fromstring(
-        hdr_bytes, dtype=hdr_dtype, count=1
-    )  # TODO: change to frombuffer
+    hdr = np.frombuffer(hdr_bytes, dtype=hdr_dtype, count=1)
     hdr_dict = dict(((n, hdr[n][0]) for n in hdr_dtype.names))
     hdr_dict["offset"] = fileobj.tell()
-    hdr_dict["data"] = fileobj.read(hdr_dict["length"])
     fileobj.seek(hdr_dict["offset"] + hdr_dict["length"], SEEK_SET)
     hdr_dict["end"] = fileobj.tell()
     return hdr_dict
 
 
+def _read_module_data(fileobj, module, length=None):
+    """Read (the first length bytes of) the data of a module."""
+    if length is None:
+        length = module["length"]
+    fileobj.seek(module["offset"], SEEK_SET)
+    return fileobj.read(min(length, module["length"]))
+
+
 class MprLoader(Loader):
     """ Class for loading biologics-data from mpr-files."""
 
@@ -85,6 +111,9 @@ class MprLoader(Loader):
         self.mpr_data = None
         self.mpr_log = None
         self.mpr_settings = None
+        self.number_of_records = 0  # records in the data module of the last file
+        self.record_offset = 0  # index of the first loaded record
+        self.cycle_offset = 0  # cycle changes before the first loaded record
         self.cellpy_headers = get_headers_normal()
 
     @staticmethod
@@ -177,13 +206,29 @@ class MprLoader(Loader):
         """
         raise NotImplementedError
 
-    def loader(self, file_name, bad_steps=None, **kwargs):
+    def loader(
+        self,
+        file_name,
+        bad_steps=None,
+        data_points=None,
+        previous_cycle=None,
+        **kwargs,
+    ):
         """Loads data from biologics .mpr files.
 
         Args:
             file_name (str): path to .res file.
             bad_steps (list of tuples): (c, s) tuples of steps s
              (in cycle c) to skip loading.
+            data_points (tuple of ints): load only data from data_point[0] to
+                data_point[1] (use None for infinite). Since the data points
+                are the record numbers, this can be used for reading only the
+                records appended to a file after it was last loaded
+                (e.g. data_points=(last_data_point, None)).
+            previous_cycle (int): cycle number of the data point just before
+                data_points[0] (known from the already loaded cell). Used for
+                continuing the cycle numbers without scanning the skipped
+                records.
 
         Returns:
             new_tests (list of data objects)
@@ -198,12 +243,7 @@ class MprLoader(Loader):
         txt = "Filesize: %i (%s)" % (filesize, hfilesize)
         self.logger.debug(txt)
 
-        # creating temporary file and connection
-        temp_dir = tempfile.gettempdir()
-        temp_filename = os.path.join(temp_dir, os.path.basename(file_name))
-        shutil.copy2(file_name, temp_dir)
-
-        self.logger.debug("tmp file: %s" % temp_filename)
+        # the file is only read (memory-mapped), so no temporary copy is needed
         self.logger.debug("HERE WE LOAD THE DATA")
 
         data = Cell()
@@ -231,7 +271,7 @@ class MprLoader(Loader):
         self.mpr_log = None
         self.mpr_settings = None
 
-        self._load_mpr_data(temp_filename, bad_steps)
+        self._load_mpr_data(file_name, bad_steps, data_points, previous_cycle)
         length_of_test = self.mpr_data.shape[0]
         self.logger.debug(f"length of test: {length_of_test}")
 
@@ -250,9 +290,9 @@ class MprLoader(Loader):
         data.raw = self.mpr_data
 
         data.raw_data_files_length.append(length_of_test)
+        data = self.identify_last_data_point(data)
+        data = self.compact_dtypes(data)
         new_tests.append(data)
-
-        self._clean_up(temp_filename)
         return new_tests
 
     def _parse_mpr_log_data(self):
@@ -294,75 +334,69 @@ class MprLoader(Loader):
         else:
             raise AttributeError("Flag '%s' not present" % flag_name)
 
-    def _load_mpr_data(self, filename, bad_steps):
+    def _load_mpr_data(
+        self, filename, bad_steps, data_points=None, previous_cycle=None
+    ):
         if bad_steps is not None:
             warnings.warn("Exluding bad steps is not implemented")
 
         stats_info = os.stat(filename)
         mpr_modules = []
 
-        mpr_log = None
-        mpr_data = None
-        mpr_settings = None
-
-        file_obj = open(filename, mode="rb")
-        label = file_obj.read(len(mpr_label))
-        self.logger.debug(f"label: {label}")
-        counter = 0
-        while True:
-            counter += 1
-            new_module = _read_modules(file_obj)
-            position = int(new_module["end"])
-            mpr_modules.append(new_module)
-            if position >= stats_info.st_size:
-                txt = "-reached end of file"
-                if position == stats_info.st_size:
-                    txt += " --exactly at end of file"
-                self.logger.info(txt)
-                break
-
-        file_obj.close()
-
-        # ------------- set -----------------------------------
-        settings_mod = None
-        for m in mpr_modules:
-            if m["shortname"].strip().decode() == "VMP Set":
-                settings_mod = m
-                break
-        if settings_mod is None:
-            raise IOError("No settings-module found!")
-
-        self._parse_mpr_settings_data(settings_mod)
-
-        # ------------- data -----------------------------------
-        data_module = None
-        for m in mpr_modules:
-            if m["shortname"].strip().decode() == "VMP data":
-                data_module = m
-        if data_module is None:
-            raise IOError("No data module!")
+        with open(filename, mode="rb") as file_obj:
+            label = file_obj.read(len(mpr_label))
+            self.logger.debug(f"label: {label}")
+            while True:
+                new_module = _read_module_header(file_obj)
+                position = int(new_module["end"])
+                mpr_modules.append(new_module)
+                if position >= stats_info.st_size:
+                    txt = "-reached end of file"
+                    if position == stats_info.st_size:
+                        txt += " --exactly at end of file"
+                    self.logger.info(txt)
+                    break
+
+            # ------------- set -----------------------------------
+            settings_mod = self._find_module(mpr_modules, "VMP Set")
+            if settings_mod is None:
+                raise IOError("No settings-module found!")
+            settings_mod["data"] = _read_module_data(file_obj, settings_mod)
+            self._parse_mpr_settings_data(settings_mod)
+
+            # ------------- data -----------------------------------
+            data_module = self._find_module(mpr_modules, "VMP data", last=True)
+            if data_module is None:
+                raise IOError("No data module!")
+            data_header = _read_module_data(file_obj, data_module, length=405)
+
+            # ------------- log  -----------------------------------
+            log_module = self._find_module(mpr_modules, "VMP LOG", last=True)
+            if log_module is None:
+                txt = "error - no log module"
+                raise IOError(txt)
+            log_module["data"] = _read_module_data(file_obj, log_module)
 
         data_version = data_module["version"]
-        n_data_points = np.fromstring(data_module["data"][:4], dtype="<u4")[0]
-        n_columns = np.fromstring(data_module["data"][4:5], dtype="u1")[0]
+        n_data_points = np.frombuffer(data_header[:4], dtype="<u4")[0]
+        n_columns = np.frombuffer(data_header[4:5], dtype="u1")[0]
         logging.debug(f"data (points, cols): {n_data_points}, {n_columns}")
 
         if data_version == 0:
             logging.debug("data version 0")
-            column_types = np.fromstring(
-                data_module["data"][5:], dtype="u1", count=n_columns
+            column_types = np.frombuffer(
+                data_header[5:], dtype="u1", count=n_columns
             )
-
-            remaining_headers = data_module["data"][5 + n_columns : 100]
-            main_data = data_module["data"][100:]
+            remaining_headers = data_header[5 + n_columns : 100]
+            main_data_offset = 100
 
         elif data_version == 2:
             logging.debug("data version 2")
-            column_types = np.fromstring(
-                data_module["data"][5:], dtype="<u2", count=n_columns
+            column_types = np.frombuffer(
+                data_header[5:], dtype="<u2", count=n_columns
             )
-            main_data = data_module["data"][405:]
-            remaining_headers = data_module["data"][5 + 2 * n_columns : 405]
+            remaining_headers = data_header[5 + 2 * n_columns : 405]
+            main_data_offset = 405
 
         else:
             raise IOError("Unrecognised version for data module: %d" % data_version)
@@ -387,27 +421,51 @@ class MprLoader(Loader):
         dtype = np.dtype(list(dtype_dict.items()))
 
         p = dtype.itemsize
-        if not p == (len(main_data) / n_data_points):
+        main_data_length = data_module["length"] - main_data_offset
+        if n_data_points and not p == (main_data_length / n_data_points):
             self.logger.info(
                 "WARNING! You have defined %i bytes, "
-                "but it seems it should be %i" % (p, len(main_data) / n_data_points)
+                "but it seems it should be %i" % (p, main_data_length / n_data_points)
+            )
+        # files that are still being written can be shorter than announced
+        main_data_start = int(data_module["offset"]) + main_data_offset
+        available_length = min(main_data_length, stats_info.st_size - main_data_start)
+        n_records = max(min(int(n_data_points), available_length // p), 0)
+        self.number_of_records = n_records
+
+        first, last = self._record_range(data_points, n_records)
+        self.logger.debug(f"reading records {first} to {last} (of {n_records})")
+        if n_records:
+            bulk_data = np.memmap(
+                filename,
+                dtype=dtype,
+                mode="r",
+                offset=main_data_start,
+                shape=(n_records,),
             )
-        bulk = main_data
-        bulk_data = np.fromstring(bulk, dtype=dtype)
-        mpr_data = pd.DataFrame(bulk_data)
+        else:
+            bulk_data = np.empty(0, dtype=dtype)
+
+        self.record_offset = first
+        self.cycle_offset = 0
+        if first and "Ns changes" in flags_dict:
+            if previous_cycle is not None:
+                self.cycle_offset = int(previous_cycle) - 1
+            else:
+                # no previous state - count the cycle changes in the skipped records
+                mask, _ = flags_dict["Ns changes"]
+                skipped_flags = bulk_data["flags"][:first]
+                self.cycle_offset = np.count_nonzero(skipped_flags & mask)
+
+        columns = None
+        if prms.Reader["select_minimal"]:  # SETTING
+            columns = [col for col in MINIMUM_MPR_FIELDS if col in dtype.names]
+        mpr_data = self._materialize_columns(bulk_data[first:last], columns)
+        del bulk_data
 
         self.logger.debug(mpr_data.columns)
         self.logger.debug(mpr_data.head())
 
-        # ------------- log  -----------------------------------
-        log_module = None
-        for m in mpr_modules:
-            if m["shortname"].strip().decode() == "VMP LOG":
-                log_module = m
-        if log_module is None:
-            txt = "error - no log module"
-            raise IOError(txt)
-
         tm = time.strptime(log_module["date"].decode(), "%m.%d.%y")
         enddate = datetime.date(tm.tm_year, tm.tm_mon, tm.tm_mday)
 
@@ -424,6 +482,43 @@ class MprLoader(Loader):
         self._parse_mpr_log_data()
         self.mpr_data = mpr_data
 
+    @staticmethod
+    def _record_range(data_points, n_records):
+        """Convert (1-based, inclusive) data points to a record slice."""
+        first, last = 0, n_records
+        if data_points is not None:
+            first_point, last_point = data_points
+            if first_point is not None:
+                first = min(max(int(first_point) - 1, 0), n_records)
+            if last_point is not None:
+                last = min(max(int(last_point), first), n_records)
+        return first, last
+
+    @staticmethod
+    def _find_module(mpr_modules, name, last=False):
+        found = None
+        for m in mpr_modules:
+            if m["shortname"].strip().decode() == name:
+                found = m
+                if not last:
+                    break
+        return found
+
+    @staticmethod
+    def _materialize_columns(bulk_data, columns=None):
+        """Copy fields of the (memory-mapped) records into a frame.
+
+        Only the given fields (all if None) are read from the file. Each
+        column is copied directly from the records, so the full data block
+        is never held in memory twice.
+        """
+        if columns is None:
+            columns = bulk_data.dtype.names
+        return pd.DataFrame(
+            {col: np.array(bulk_data[col]) for col in columns},
+            index=pd.RangeIndex(len(bulk_data)),
+        )
+
     def _rename_header(self, h_old, h_new):
         try:
             self.mpr_data.rename(
@@ -436,10 +531,9 @@ class MprLoader(Loader):
     def _generate_cycle_index(self):
         flag = "Ns changes"
         n = self._get_flag(flag)
-        self.mpr_data[self.cellpy_headers["cycle_index_txt"]] = 1
-        ns_changes = self.mpr_data[n].index.values
-        for i in ns_changes:
-            self.mpr_data.loc[i:, self.cellpy_headers["cycle_index_txt"]] += 1
+        self.mpr_data[self.cellpy_headers["cycle_index_txt"]] = (
+            1 + self.cycle_offset + np.cumsum(n, dtype=np.int64)
+        )
 
     def _generate_datetime(self):
         start_date = self.mpr_settings["start_date"]
@@ -483,8 +577,9 @@ class MprLoader(Loader):
         # should ideally use the info from bl_dtypes, will do that later
 
         self.mpr_data[self.cellpy_headers["internal_resistance_txt"]] = np.nan
+        first_data_point = self.record_offset + 1
         self.mpr_data[self.cellpy_headers["data_point_txt"]] = np.arange(
-            1, self.mpr_data.shape[0] + 1, 1
+            first_data_point, first_data_point + self.mpr_data.shape[0], 1
         )
         self._generate_datetime()
         self._generate_cycle_index()
@@ -535,16 +630,6 @@ class MprLoader(Loader):
         df.to_csv(filename_out, sep=";")
         print("------OK--------------------------------------")
 
-    def _clean_up(self, tmp_filename):
-        if os.path.isfile(tmp_filename):
-            try:
-                os.remove(tmp_filename)
-            except WindowsError as e:
-                self.logger.warning(
-                    "could not remove tmp-file\n%s %s" % (tmp_filename, e)
-                )
-        pass
-
 
 if __name__ == "__main__":
     import logging
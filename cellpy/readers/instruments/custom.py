@@ -1,7 +1,9 @@
+import copy
 import logging
 import os
 
 import pandas as pd
+from ruamel.yaml import YAML
 
 from cellpy.parameters.internal_settings import get_headers_normal, ATTRS_CELLPYFILE
 
@@ -26,6 +28,7 @@ DEFAULT_CONFIG = {
         "header_info_splitter": ";",
         "file_type_id_line": 0,
         "file_type_id_match": None,
+        "chunk_size": 100_000,
     },
     "variables": {
         "mass": "mass",
@@ -59,6 +62,9 @@ DEFAULT_CONFIG = {
         "test_time_txt": "test_time",
         "voltage_txt": "voltage",
     },
+    "columns": None,
+    "dtypes": {},
+    "unit_factors": {},
     "units": {"current": 0.001, "charge": 0.001, "mass": 0.001, "specific": 1.0},
     "limits": {
         "current_hard": 0.0000000000001,
@@ -97,13 +103,26 @@ class CustomLoader(Loader):
     where sep is either defined in the description file or the
     config file.
 
-    The definition file should use the YAML format and it
-    must contain
-
-    xxx
-    xxx
-
-
+    The definition file should use the YAML format. It can contain the same
+    sections as DEFAULT_CONFIG (the given sections update the defaults).
+    The columns to read, their dtypes and the factors to multiply them with
+    (to get to the units given in the units section) are declared using the
+    keys in the headers section, e.g.
+
+        headers:
+            voltage_txt: Voltage(mV)
+            current_txt: Current(mA)
+        columns: [voltage_txt, current_txt]
+        dtypes:
+            voltage_txt: float32
+        unit_factors:
+            voltage_txt: 0.001
+        structure:
+            chunk_size: 100000
+
+    The file is read in chunks of chunk_size rows (all at once if it is
+    None), and only the declared columns are read (all columns if
+    columns is None).
     """
 
     def __init__(self):
@@ -117,27 +136,38 @@ class CustomLoader(Loader):
         self.headers = None
         self.variables = None
         self.structure = None
+        self.columns = None
+        self.dtypes = None
+        self.unit_factors = None
         self.parse_definition_file()
 
     @staticmethod
     def pick_definition_file():
         return prms.Instruments.custom_instrument_definitions_file
 
-    # TODO: @jepe - create yaml file example (from DEFAULT_CONFIG)
-    # TODO: @jepe - create yaml file parser
     def parse_definition_file(self):
+        settings = copy.deepcopy(DEFAULT_CONFIG)
         if self.definition_file is None:
             logging.info("no definition file for custom format")
             logging.info("using default settings")
-            settings = DEFAULT_CONFIG
         else:
-            raise NotImplementedError
+            logging.debug(f"reading definition file {self.definition_file}")
+            with open(self.definition_file, "r") as ofile:
+                definitions = YAML(typ="safe").load(ofile) or dict()
+            for section, value in definitions.items():
+                if isinstance(value, dict) and isinstance(settings.get(section), dict):
+                    settings[section].update(value)
+                else:
+                    settings[section] = value
 
         self.units = settings["units"]
         self.limits = settings["limits"]
         self.headers = settings["headers"]
         self.variables = settings["variables"]
         self.structure = settings["structure"]
+        self.columns = settings["columns"]
+        self.dtypes = settings["dtypes"] or dict()
+        self.unit_factors = settings["unit_factors"] or dict()
 
     def get_raw_units(self):
         return self.units
@@ -251,15 +281,47 @@ class CustomLoader(Loader):
 
         raw = self._parse_csv_data(file_name, sep, header_row)
         raw = self._rename_cols(raw)
+        raw = self._check_dtypes(raw)
         raw = self._check_cycleno_stepno(raw)
         data.raw_data_files_length.append(raw.shape[0])
         data.summary = None
         data.raw = raw
+        data = self.compact_dtypes(data)
         new_tests.append(data)
         return new_tests
 
     def _parse_csv_data(self, file_name, sep, header_row):
-        raw = pd.read_csv(file_name, sep=sep, header=header_row, skip_blank_lines=False)
+        file_columns = pd.read_csv(
+            file_name, sep=sep, header=header_row, skip_blank_lines=False, nrows=0
+        ).columns
+        usecols = self._check_columns(file_columns)
+        dtypes = {
+            self.headers.get(key, key): dtype
+            for key, dtype in self.dtypes.items()
+            if self.headers.get(key, key) in file_columns
+        }
+        chunk_size = self.structure.get("chunk_size", None)
+
+        reader = pd.read_csv(
+            file_name,
+            sep=sep,
+            header=header_row,
+            skip_blank_lines=False,
+            usecols=usecols,
+            dtype=dtypes,
+            chunksize=chunk_size,
+        )
+        if chunk_size is None:
+            return self._convert_to_cellpy_units(reader)
+
+        chunks = []
+        with reader:
+            for chunk in reader:
+                chunks.append(self._convert_to_cellpy_units(chunk))
+        logging.debug(f"read {len(chunks)} chunks of (max) {chunk_size} rows")
+        if not chunks:
+            return pd.DataFrame(columns=usecols if usecols else file_columns)
+        raw = pd.concat(chunks, ignore_index=True, copy=False)
         return raw
 
     def _rename_cols(self, raw):
@@ -279,14 +341,51 @@ class CustomLoader(Loader):
     def _check_cycleno_stepno(self, raw):
         return raw
 
-    def _convert_to_cellpy_units(self, data):
-        return data
+    def _convert_to_cellpy_units(self, raw):
+        """Multiply the columns with their unit factors (before renaming)."""
+        for key, factor in self.unit_factors.items():
+            col = self.headers.get(key, key)
+            if col in raw.columns and factor != 1:
+                values = raw[col] * factor
+                if raw[col].dtype.kind == "f":
+                    values = values.astype(raw[col].dtype, copy=False)
+                raw[col] = values
+        return raw
 
-    def _check_columns(self, data):
-        return data
+    def _check_columns(self, file_columns):
+        """Find the columns to read (None means all)."""
+        if self.columns is None:
+            return None
+        usecols = []
+        for key in self.columns:
+            col = self.headers.get(key, key)
+            if col in file_columns:
+                usecols.append(col)
+            else:
+                logging.warning(f"missing column: {col} ({key})")
+        return usecols
 
-    def _check_dtypes(self, data):
-        return data
+    def _check_dtypes(self, raw):
+        """Cast the columns that did not keep their declared dtypes.
+
+        The parser sets the dtypes, but the unit factors can change them and
+        categorical chunks with different categories become objects when
+        concatenated.
+        """
+        for key, dtype in self.dtypes.items():
+            col = self.headers_normal.get(key, key)
+            if col not in raw.columns or raw[col].dtype == dtype:
+                continue
+            try:
+                values = raw[col].astype(dtype)
+            except (TypeError, ValueError) as e:
+                logging.warning(f"could not convert {col} to {dtype} ({e})")
+                continue
+            if values.dtype.kind in "iu" and not (values == raw[col]).all():
+                logging.warning(f"could not convert {col} to {dtype} (not integers)")
+                continue
+            raw[col] = values
+        return raw
 
     def _generate_fid(self, file_name, var_dict):
         fid = FileID()
@@ -309,9 +408,7 @@ class CustomLoader(Loader):
         return fid
 
     def inspect(self, data):
-        data = self._convert_to_cellpy_units(data)
-        data = self._check_columns(data)
-        data = self._check_dtypes(data)
+        # units, columns and dtypes are handled while loading
         return data
 
     def load(self, file_name):
@@ -122,6 +122,7 @@ class NdaLoader(Loader):
 
         data = self._post_process(data)
         data = self.identify_last_data_point(data)
+        data = self.compact_dtypes(data)
 
         new_tests.append(data)
 
@@ -1 +1,355 @@
+"""Maccor txt/csv-type data files (exports from Maccor test systems)"""
+import logging
+import os
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+from dateutil.parser import parse
+
+from cellpy.parameters import prms
+from cellpy.parameters.internal_settings import get_headers_normal
+from cellpy.readers.core import FileID, Cell, humanize_bytes
+from cellpy.readers.instruments.mixin import Loader
+
+# maccor column: (cellpy header key (or column name), dtype, factor to cellpy units)
+maccor_columns = dict()
+
+maccor_columns["Rec#"] = ("data_point_txt", "int64", None)
+maccor_columns["Cyc#"] = ("cycle_index_txt", "int32", None)
+maccor_columns["Step"] = ("step_index_txt", "int32", None)
+maccor_columns["Test (Sec)"] = ("test_time_txt", "float64", None)
+maccor_columns["Test (Min)"] = ("test_time_txt", "float64", 60.0)
+maccor_columns["Step (Sec)"] = ("step_time_txt", "float64", None)
+maccor_columns["Step (Min)"] = ("step_time_txt", "float64", 60.0)
+maccor_columns["Amp-hr"] = ("Amp-hr", "float64", None)
+maccor_columns["Watt-hr"] = ("Watt-hr", "float64", None)
+maccor_columns["Amps"] = ("current_txt", "float64", None)
+maccor_columns["Volts"] = ("voltage_txt", "float64", None)
+maccor_columns["State"] = ("State", "category", None)
+maccor_columns["ES"] = ("ES", "int16", None)
+maccor_columns["DPt Time"] = ("datetime_txt", None, None)
+maccor_columns["DCIR/Ohms"] = ("internal_resistance_txt", "float64", None)
+
+# the state column tells if the cell is charged or discharged
+MACCOR_CHARGE_STATE = "C"
+MACCOR_DISCHARGE_STATE = "D"
+
+# maccor starts the cycle numbers (Cyc#) on 0
+MACCOR_FIRST_CYCLE_OFFSET = 1
+
+# the default format of the date-time column ("DPt Time")
+MACCOR_DATETIME_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+# the column header line is located by its first header
+MACCOR_FIRST_HEADER = "Rec#"
+MACCOR_MAX_HEADER_LINES = 30
+
+
+class MaccorLoader(Loader):
+    """Class for loading data from Maccor txt-files (tab separated exports).
+
+    The file is expected to contain a few lines of information (e.g. the date
+    of the test) followed by the column headers (starting with "Rec#") and the
+    data. The columns are read using the explicit dtypes given in
+    maccor_columns, and the cellpy columns (data point, cycle, step, times and
+    capacities) are created directly while reading. The file is read in chunks
+    of prms.Instruments.Maccor.chunk_size rows (all at once if None).
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.headers_normal = get_headers_normal()
+        self.cellpy_headers = get_headers_normal()
+        self.maccor_data = None
+        self.maccor_settings = None
+        self.sep = prms.Instruments.Maccor.sep
+        self.chunk_size = prms.Instruments.Maccor.chunk_size
+        self.datetime_format = prms.Instruments.Maccor.datetime_format
+
+    @staticmethod
+    def get_raw_units():
+        """Include the settings for the units used by the instrument.
+
+        The units are defined w.r.t. the SI units ('unit-fractions';
+        currently only units that are multiples of
+        Si units can be used). For example, for current defined in mA,
+        the value for the
+        current unit-fraction will be 0.001.
+
+        Returns: dictionary containing the unit-fractions for current, charge,
+        and mass
+
+        """
+        raw_units = dict()
+        raw_units["current"] = 1.0  # A
+        raw_units["charge"] = 1.0  # Ah
+        raw_units["mass"] = 0.001  # g
+        raw_units["energy"] = 1.0  # Wh
+        return raw_units
+
+    @staticmethod
+    def get_raw_limits():
+        """Include the settings for how to decide what kind of
+        step you are examining here.
+
+        The raw limits are 'epsilons' used to check if the current
+        and/or voltage is stable (for example
+        for galvanostatic steps, one would expect that the current
+        is stable (constant) and non-zero).
+        It is expected that different instruments (with different
+        resolution etc.) have different
+        'epsilons'.
+
+        Returns: the raw limits (dict)
+
+        """
+        raw_limits = dict()
+        raw_limits["current_hard"] = 0.000_000_000_000_1
+        raw_limits["current_soft"] = 0.000_01
+        raw_limits["stable_current_hard"] = 2.0
+        raw_limits["stable_current_soft"] = 4.0
+        raw_limits["stable_voltage_hard"] = 2.0
+        raw_limits["stable_voltage_soft"] = 4.0
+        raw_limits["stable_charge_hard"] = 0.9
+        raw_limits["stable_charge_soft"] = 5.0
+        raw_limits["ir_change"] = 0.000_01
+        return raw_limits
+
+    def loader(self, file_name, bad_steps=None, **kwargs):
+        """Loads data from Maccor txt files.
+
+        Args:
+            file_name (str): path to the txt file.
+            bad_steps (list of tuples): (c, s) tuples of steps s
+             (in cycle c) to skip loading.
+
+        Returns:
+            new_tests (list of data objects)
+        """
+        new_tests = []
+        if not os.path.isfile(file_name):
+            self.logger.info("Missing file_\n   %s" % file_name)
+            return None
+
+        filesize = os.path.getsize(file_name)
+        hfilesize = humanize_bytes(filesize)
+        txt = "Filesize: %i (%s)" % (filesize, hfilesize)
+        self.logger.debug(txt)
+
+        data = Cell()
+        fid = FileID(file_name)
+
+        # div parameters and information (probably load this last)
+        test_no = 1
+        data.cell_no = test_no
+        data.loaded_from = file_name
+
+        # some overall prms
+        data.channel_index = None
+        data.channel_number = None
+        data.creator = None
+        data.item_ID = None
+        data.schedule_file_name = None
+        data.test_ID = None
+        data.test_name = None
+        data.raw_data_files.append(fid)
+
+        # --------- read raw-data (normal-data) -------------------------
+        self._load_maccor_data(file_name, bad_steps)
+        data.start_datetime = self.maccor_settings.get("start_datetime")
+        length_of_test = self.maccor_data.shape[0]
+        self.logger.debug(f"length of test: {length_of_test}")
+
+        data.raw = self.maccor_data
+        data.raw_data_files_length.append(length_of_test)
+        data = self.identify_last_data_point(data)
+        data = self.compact_dtypes(data)
+        new_tests.append(data)
+        return new_tests
+
+    def _load_maccor_data(self, file_name, bad_steps):
+        header_row, info_lines = self._find_header_row(file_name)
+        self.maccor_settings = self._extract_variables(info_lines)
+
+        file_columns = pd.read_csv(
+            file_name, sep=self.sep, skiprows=header_row, nrows=0
+        ).columns
+        names, usecols, dtypes, factors, parse_dates = self._column_spec(file_columns)
+
+        reader = pd.read_csv(
+            file_name,
+            sep=self.sep,
+            skiprows=header_row + 1,
+            header=None,
+            names=names,
+            usecols=usecols,
+            dtype=dtypes,
+            chunksize=self.chunk_size,
+        )
+        if self.chunk_size is None:
+            df = self._convert_chunk(reader, factors, parse_dates, bad_steps)
+        else:
+            with reader:
+                chunks = [
+                    self._convert_chunk(chunk, factors, parse_dates, bad_steps)
+                    for chunk in reader
+                ]
+            logging.debug(f"read {len(chunks)} chunks")
+            df = pd.concat(chunks, ignore_index=True, copy=False)
+            # categoricals with different categories in the chunks become objects
+            categorical = [col for col, dtype in dtypes.items() if dtype == "category"]
+            df[categorical] = df[categorical].astype("category")
+        df = self._generate_capacities(df)
+
+        hdr = self.headers_normal
+        df[hdr.sub_step_index_txt] = 0
+        df[hdr.sub_step_time_txt] = 0
+        if hdr.internal_resistance_txt not in df.columns:
+            df[hdr.internal_resistance_txt] = np.nan
+        self.maccor_data = df
+
+    def _find_header_row(self, file_name):
+        info_lines = []
+        with open(file_name, "r", errors="replace") as ofile:
+            for header_row, line in enumerate(ofile):
+                if line.startswith(MACCOR_FIRST_HEADER):
+                    return header_row, info_lines
+                if header_row >= MACCOR_MAX_HEADER_LINES:
+                    break
+                info_lines.append(line)
+        raise IOError(f"could not find the column headers ({MACCOR_FIRST_HEADER})")
+
+    @staticmethod
+    def _extract_variables(lines):
+        settings = dict()
+        for line in lines:
+            parts = [part.strip() for part in re.split(r"[\t,]", line)]
+            for key, value in zip(parts[:-1], parts[1:]):
+                if key.rstrip(":") == "Date of Test" and value:
+                    try:
+                        settings["start_datetime"] = parse(value)
+                    except (ValueError, OverflowError):
+                        logging.debug(f"could not parse date of test: {value}")
+        logging.debug(f"maccor settings: {settings}")
+        return settings
+
+    def _column_spec(self, file_columns):
+        """Create names, usecols, dtypes, factors and datetime columns."""
+        names = []
+        usecols = []
+        dtypes = dict()
+        factors = dict()
+        parse_dates = []
+        for position, col in enumerate(file_columns):
+            col = col.strip()
+            if col not in maccor_columns:
+                names.append(f"Unnamed: {position}")
+                continue
+            key, dtype, factor = maccor_columns[col]
+            name = self.cellpy_headers.get(key, key)
+            if name in usecols:
+                warnings.warn(f"more than one column for {name} (using the first)")
+                names.append(f"Unnamed: {position}")
+                continue
+            names.append(name)
+            usecols.append(name)
+            if dtype is None:
+                parse_dates.append(name)
+            else:
+                dtypes[name] = dtype
+            if factor is not None:
+                factors[name] = factor
+        return names, usecols, dtypes, factors, parse_dates
+
+    def _convert_chunk(self, chunk, factors, parse_dates, bad_steps):
+        hdr = self.headers_normal
+        if hdr.cycle_index_txt in chunk.columns:
+            # maccor counts the cycles from 0, cellpy from 1
+            chunk[hdr.cycle_index_txt] += MACCOR_FIRST_CYCLE_OFFSET
+        if bad_steps:
+            bad = pd.MultiIndex.from_tuples(bad_steps)
+            pairs = pd.MultiIndex.from_arrays(
+                [chunk[hdr.cycle_index_txt], chunk[hdr.step_index_txt]]
+            )
+            chunk = chunk.loc[~pairs.isin(bad)].copy()
+
+        for col in parse_dates:
+            chunk[col] = self._parse_datetime(chunk[col])
+
+        if factors:
+            columns = list(factors.keys())
+            chunk[columns] = chunk[columns] * [factors[col] for col in columns]
+
+        # the current is given as a positive number also when discharging
+        if "State" in chunk.columns and hdr.current_txt in chunk.columns:
+            current = chunk[hdr.current_txt].values
+            discharging = (chunk["State"] == MACCOR_DISCHARGE_STATE).values
+            chunk[hdr.current_txt] = np.where(
+                discharging, -np.abs(current), np.abs(current)
+            )
+        return chunk
+
+    def _parse_datetime(self, values):
+        return pd.to_datetime(
+            values,
+            format=self.datetime_format,
+            infer_datetime_format=self.datetime_format is None,
+            cache=True,
+        )
+
+    def _generate_capacities(self, df):
+        """Create cellpy capacities and energies from the step-wise Amp-hr.
+
+        Maccor resets Amp-hr and Watt-hr for each step, while cellpy expects
+        the charge- and discharge capacities to accumulate within each cycle.
+        """
+        hdr = self.headers_normal
+        if len(df) == 0:
+            for col in [
+                hdr.charge_capacity_txt,
+                hdr.discharge_capacity_txt,
+                hdr.charge_energy_txt,
+                hdr.discharge_energy_txt,
+            ]:
+                df[col] = pd.Series(dtype=float)
+            return df
+        cycles = df[hdr.cycle_index_txt].values
+        steps = df[hdr.step_index_txt].values
+        state = df["State"].values if "State" in df.columns else None
+
+        new_block = np.ones(len(df), dtype=bool)
+        new_block[1:] = (cycles[1:] != cycles[:-1]) | (steps[1:] != steps[:-1])
+        new_cycle = np.ones(len(df), dtype=bool)
+        new_cycle[1:] = cycles[1:] != cycles[:-1]
+        block_id = np.cumsum(new_block) - 1
+        block_ends = np.append(np.flatnonzero(new_block)[1:] - 1, len(df) - 1)
+        cycle_of_block = np.cumsum(new_cycle[new_block]) - 1
+
+        for col, charge_txt, discharge_txt in [
+            ("Amp-hr", hdr.charge_capacity_txt, hdr.discharge_capacity_txt),
+            ("Watt-hr", hdr.charge_energy_txt, hdr.discharge_energy_txt),
+        ]:
+            if col not in df.columns or state is None:
+                continue
+            values = df[col].values
+            for cellpy_col, state_txt in [
+                (charge_txt, MACCOR_CHARGE_STATE),
+                (discharge_txt, MACCOR_DISCHARGE_STATE),
+            ]:
+                current_values = np.where(state == state_txt, values, 0.0)
+                block_totals = current_values[block_ends]
+                # totals from the previous blocks within the same cycle
+                cumulated = np.cumsum(block_totals)
+                cycle_starts = np.flatnonzero(
+                    np.append(True, cycle_of_block[1:] != cycle_of_block[:-1])
+                )
+                cycle_offsets = np.repeat(
+                    np.append(0.0, cumulated)[cycle_starts],
+                    np.diff(np.append(cycle_starts, len(block_totals))),
+                )
+                previous = np.append(0.0, cumulated[:-1]) - cycle_offsets
+                df[cellpy_col] = previous[block_id] + current_values
+        return df
 
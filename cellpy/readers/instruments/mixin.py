@@ -56,3 +56,11 @@ class Loader(AtomicLoad, metaclass=abc.ABCMeta):
 
     def identify_last_data_point(self, data):
         return core.identify_last_data_point(data)
+
+    def compact_dtypes(self, data):
+        """Convert the raw data to compact dtypes (int32, float32 and categorical).
+
+        Only done if prms.Reader.compact_dtypes is True (the default is False,
+        since it changes the precision and dtypes of the loaded data).
+        """
+        return core.compact_dtypes(data)
@@ -1,4 +1,5 @@
 """pec csv-type data files"""
+import csv
 import os
 from dateutil.parser import parse
 import logging
@@ -7,6 +8,7 @@ import numpy as np
 
 import pandas as pd
 
+from cellpy.parameters import prms
 from cellpy.readers.core import FileID, Cell, humanize_bytes
 from cellpy.parameters.internal_settings import get_headers_normal
 from cellpy.readers.instruments.mixin import Loader
@@ -27,6 +29,22 @@ pec_headers_normal["discharge_energy_txt"] = "Discharge_Capacity_mWh"
 pec_headers_normal["internal_resistance_txt"] = "Internal_Resistance_1_mOhm"
 pec_headers_normal["test_id_txt"] = "Test"
 
+# dtypes given to the csv-parser (keys are cellpy headers or pec headers)
+pec_dtypes = dict()
+
+pec_dtypes["test_time_txt"] = "float64"
+pec_dtypes["step_time_txt"] = "float64"
+pec_dtypes["voltage_txt"] = "float64"
+pec_dtypes["current_txt"] = "float64"
+pec_dtypes["charge_capacity_txt"] = "float64"
+pec_dtypes["discharge_capacity_txt"] = "float64"
+pec_dtypes["charge_energy_txt"] = "float64"
+pec_dtypes["discharge_energy_txt"] = "float64"
+pec_dtypes["internal_resistance_txt"] = "float64"
+pec_dtypes["Rack"] = "category"
+
+pec_datetime_columns = ["datetime_txt", "Position_Start_Time"]
+
 
 class PECLoader(Loader):
     """Main loading class"""
@@ -136,36 +154,72 @@ class PECLoader(Loader):
         length_of_test = self.pec_data.shape[0]
         logging.debug(f"length of test: {length_of_test}")
 
-        logging.debug("renaming columns")
-        self._rename_headers()
         self._convert_units()
 
         data.raw = self.pec_data
 
         data.raw_data_files_length.append(length_of_test)
+        data = self.compact_dtypes(data)
         new_tests.append(data)
 
         return new_tests
 
     def _load_pec_data(self, file_name, bad_steps):
         number_of_header_lines = self.number_of_header_lines
-
-        # ----------------- reading the data ---------------------
-        df = pd.read_csv(file_name, skiprows=number_of_header_lines)
-
-        # get rid of unnamed columns
-        df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
-
-        # get rid of spaces, parenthesis, and the deg-sign
-        new_column_headers = {
-            c: c.replace(" ", "_")
-            .replace("(", "")
-            .replace(")", "")
-            .replace("°", "")
-            .replace(r"%", "pct")
-            for c in df.columns
-        }
-        df.rename(columns=new_column_headers, inplace=True)
+        engine = self._get_csv_engine()
+
+        with open(file_name, "rb") as ofile:
+            # ----------------  reading the parameters ---------------
+            lines = [
+                ofile.readline().decode("utf-8")
+                for _ in range(number_of_header_lines)
+            ]
+            self._extract_variables(lines)
+
+            # ----------------- reading the data ---------------------
+            column_header = ofile.readline().decode("utf-8")
+            names = self._translate_column_headers(column_header)
+            # get rid of unnamed columns
+            usecols = [name for name in names if not name.startswith("Unnamed")]
+
+            dtypes = dict()
+            for key, dtype in pec_dtypes.items():
+                dtypes[self.cellpy_headers.get(key, key)] = dtype
+            parse_dates = [
+                self.cellpy_headers.get(key, key) for key in pec_datetime_columns
+            ]
+            dtypes = {k: v for k, v in dtypes.items() if k in usecols}
+            parse_dates = [k for k in parse_dates if k in usecols]
+
+            kwargs = dict()
+            if engine == "pyarrow":
+                # the pyarrow engine looks up usecols among the auto-generated
+                # column names (not the given names) - selecting after reading
+                kwargs["usecols"] = None
+            else:
+                kwargs["usecols"] = usecols
+                kwargs["infer_datetime_format"] = True
+
+            logging.debug(f"reading pec data (engine={engine})")
+            df = pd.read_csv(
+                ofile,
+                header=None,
+                names=names,
+                dtype=dtypes,
+                parse_dates=parse_dates,
+                encoding="utf-8",
+                engine=engine,
+                **kwargs,
+            )
+            if engine == "pyarrow":
+                df = df[usecols]
+                # empty columns are read as null (object) by pyarrow
+                empty = [
+                    col
+                    for col in df.columns
+                    if df[col].dtype == object and df[col].isna().all()
+                ]
+                df[empty] = df[empty].astype(float)
 
         # add missing columns
         df.insert(0, self.headers_normal.data_point_txt, range(len(df)))
@@ -174,16 +228,43 @@ class PECLoader(Loader):
 
         self.pec_data = df
 
-        # ----------------  reading the parameters ---------------
-        with open(file_name, "r") as ofile:
-            counter = 0
-            lines = []
-            for line in ofile:
-                counter += 1
-                if counter > number_of_header_lines:
-                    break
-                lines.append(line)
-        self._extract_variables(lines)
+    @staticmethod
+    def _get_csv_engine():
+        engine = prms.Instruments.PEC.csv_engine
+        if engine is None:
+            try:
+                import pyarrow  # noqa: F401
+
+                engine = "pyarrow"
+            except ImportError:
+                engine = "c"
+        return engine
+
+    def _translate_column_headers(self, column_header):
+        """Create the column names (cellpy headers where possible).
+
+        Spaces, parenthesis and the deg-sign are removed from the pec headers
+        before translating them to cellpy headers; empty headers are named
+        "Unnamed: <position>".
+        """
+        translations = {
+            v: self.cellpy_headers[k] for k, v in pec_headers_normal.items()
+        }
+        names = []
+        for position, c in enumerate(next(csv.reader([column_header]))):
+            c = c.strip()
+            if not c:
+                names.append(f"Unnamed: {position}")
+                continue
+            c = (
+                c.replace(" ", "_")
+                .replace("(", "")
+                .replace(")", "")
+                .replace("°", "")
+                .replace(r"%", "pct")
+            )
+            names.append(translations.get(c, c))
+        return names
 
     def _extract_variables(self, lines):
         header_comments = dict()
@@ -224,32 +305,8 @@ class PECLoader(Loader):
 
         self.pec_settings = headers
 
-    def _rename_headers(self):
-        logging.debug("Trying to rename the columns")
-        # logging.debug("Current columns:")
-        # logging.debug(self.pec_data.columns)
-        # logging.debug("Rename to:")
-        # logging.debug(self.headers_normal)
-
-        for key in pec_headers_normal:
-            self._rename_header(key, pec_headers_normal[key])
-
-        # logging.debug("New cols:")
-        # logging.debug(self.pec_data.columns)
-
     def _convert_units(self):
         logging.debug("Trying to convert all data into correct units")
-        logging.debug("- dtypes")
-        self.pec_data[self.headers_normal.datetime_txt] = pd.to_datetime(
-            self.pec_data[self.headers_normal.datetime_txt]
-        )
-
-        self.pec_data["Position_Start_Time"] = pd.to_datetime(
-            self.pec_data["Position_Start_Time"]
-        )
-
-        self.pec_data["Rack"] = self.pec_data["Rack"].astype("category")
-
         logging.debug("- cellpy units")
         pec_units = self._get_pec_units()
         raw_units = self.get_raw_units()
@@ -259,21 +316,15 @@ class PECLoader(Loader):
         _c = pec_units["charge"] / raw_units["charge"]
         _w = pec_units["energy"] / raw_units["energy"]
 
-        v_txt = self.headers_normal.voltage_txt
-        i_txt = self.headers_normal.current_txt
-
-        self.pec_data[v_txt] *= _v
-        self.pec_data[i_txt] *= _i
-
-        self.pec_data[self.headers_normal.charge_capacity_txt] *= _c
-        self.pec_data[self.headers_normal.discharge_capacity_txt] *= _c
-        self.pec_data[self.headers_normal.charge_energy_txt] *= _w
-        self.pec_data[self.headers_normal.discharge_energy_txt] *= _w
-
-    def _rename_header(self, h_old, h_new):
-        try:
-            self.pec_data.rename(
-                columns={h_new: self.cellpy_headers[h_old]}, inplace=True
-            )
-        except KeyError as e:
-            logging.info(f"Problem during conversion to cellpy-format ({e})")
+        factors = {
+            self.headers_normal.voltage_txt: _v,
+            self.headers_normal.current_txt: _i,
+            self.headers_normal.charge_capacity_txt: _c,
+            self.headers_normal.discharge_capacity_txt: _c,
+            self.headers_normal.charge_energy_txt: _w,
+            self.headers_normal.discharge_energy_txt: _w,
+        }
+        columns = [col for col in factors if col in self.pec_data.columns]
+        self.pec_data[columns] = self.pec_data[columns] * [
+            factors[col] for col in columns
+        ]
@@ -0,0 +1,397 @@
+"""Storage back-ends for cellpy-files.
+
+The cellpy-file is by default a HDF5 file (``pandas.HDFStore``). The columnar
+back-end (``ParquetStore``) stores each table as a Parquet file in a directory
+(one directory pr. cell) and needs pyarrow.
+
+The stores share the small part of the ``pandas.HDFStore`` api that cellpy
+uses (``keys``, ``select``, ``put``, ``get_storer`` and ``close``), so that
+they can be used interchangeably when reading and writing cellpy-files.
+"""
+
+import collections
+import json
+import logging
+import os
+import shutil
+
+import pandas as pd
+
+from cellpy.parameters import prms
+
+CellpyFileFormat = collections.namedtuple("CellpyFileFormat", ["store", "extension"])
+ParquetStorer = collections.namedtuple("ParquetStorer", ["nrows", "columns"])
+
+PARQUET_STORE_MARKER = "cellpy_store.json"
+PARQUET_STORE_VERSION = 1
+
+# hdf5 (pytables) compression libraries and their nearest parquet codec
+PARQUET_CODECS = {
+    "zlib": "gzip",
+    "blosc": "snappy",
+    "blosc2": "snappy",
+    "blosclz": "snappy",
+    "lzo": "snappy",
+    "lz4": "lz4",
+    "lz4hc": "lz4",
+    "zstd": "zstd",
+    "bzip2": "brotli",
+}
+PARQUET_CODECS_WITH_LEVEL = ["gzip", "zstd", "brotli"]
+
+
+class ParquetStore(object):
+    """Columnar store for cellpy-files (one Parquet file pr. table).
+
+    The tables are saved as ``<directory>/<key>.parquet`` (e.g.
+    ``my_cell.cellpy/CellpyData/raw.parquet``). Reading uses multiple threads
+    for decoding the columns, memory mapping and (optionally) filters that
+    are pushed down to the row-groups of the Parquet files.
+
+    Args:
+        path (str): the directory for the store.
+        mode (str): "r" (read), "w" (write a new store) or "a" (append,
+            the default).
+        **kwargs: ignored (allows the same call signature as pandas.HDFStore).
+    """
+
+    def __init__(self, path, mode="a", **kwargs):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("the parquet cellpy-file format requires pyarrow")
+
+        self.path = str(path)
+        self.mode = mode
+        self.is_open = True
+        marker = os.path.join(self.path, PARQUET_STORE_MARKER)
+        if mode == "r":
+            if not os.path.isfile(marker):
+                raise IOError(f"not a cellpy parquet store: {self.path}")
+            return
+        if mode == "w" and os.path.isdir(self.path):
+            remove_cellpy_file(self.path)
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.isfile(marker):
+            with open(marker, "w") as f:
+                json.dump({"format": "parquet", "version": PARQUET_STORE_VERSION}, f)
+
+    def __repr__(self):
+        return f"<ParquetStore {self.path}>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, key):
+        return os.path.isfile(self._file_name(key))
+
+    def close(self):
+        self.is_open = False
+
+    def _file_name(self, key):
+        parts = [part for part in key.split("/") if part]
+        return os.path.join(self.path, *parts) + ".parquet"
+
+    def keys(self):
+        """the keys of the tables in the store (as "/parent/table")"""
+        keys = []
+        for directory, _, file_names in os.walk(self.path):
+            for file_name in file_names:
+                name, ext = os.path.splitext(file_name)
+                if ext != ".parquet":
+                    continue
+                relative = os.path.relpath(os.path.join(directory, name), self.path)
+                keys.append("/" + relative.replace(os.sep, "/"))
+        return sorted(keys)
+
+    def put(
+        self,
+        key,
+        value,
+        format=None,
+        data_columns=None,
+        complib=None,
+        complevel=None,
+        **kwargs,
+    ):
+        """write a DataFrame to the store (replacing an existing table).
+
+        The format and data_columns arguments are only accepted for
+        compatibility with pandas.HDFStore. The hdf5 compression library
+        (complib) is translated to the nearest parquet codec (defaults to
+        prms._cellpyfile_parquet_compression).
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.mode == "r":
+            raise IOError("the store is opened in read-only mode")
+        compression = prms._cellpyfile_parquet_compression
+        compression_level = None
+        if complib is not None:
+            codec = complib.split(":")[-1]
+            compression = PARQUET_CODECS.get(codec, codec)
+            if compression in PARQUET_CODECS_WITH_LEVEL:
+                compression_level = complevel
+        file_name = self._file_name(key)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        table = pa.Table.from_pandas(value)
+        pq.write_table(
+            table,
+            file_name,
+            row_group_size=prms._cellpyfile_parquet_row_group_size,
+            compression=compression,
+            compression_level=compression_level,
+        )
+
+    def select(self, key, where=None, columns=None, filters=None):
+        """read a table from the store.
+
+        Args:
+            key (str): the key of the table.
+            where: not supported (use filters).
+            columns (list of str): only read these columns (the index is
+                always read).
+            filters (list of tuples): pyarrow filters, e.g.
+                [("cycle_index", "in", [1, 2])], used for skipping row-groups
+                and rows while reading.
+
+        Returns:
+            pandas.DataFrame
+        """
+        import pyarrow.parquet as pq
+
+        if where is not None:
+            raise ValueError("the parquet store does not support where-queries")
+        file_name = self._file_name(key)
+        if not os.path.isfile(file_name):
+            raise KeyError(f"No object named {key} in the file")
+        use_threads = prms._cellpyfile_parquet_use_threads
+        table = pq.read_table(
+            file_name,
+            columns=columns,
+            filters=filters or None,
+            use_threads=use_threads,
+            memory_map=prms._cellpyfile_parquet_memory_map,
+            use_pandas_metadata=True,
+        )
+        return table.to_pandas(use_threads=use_threads)
+
+    def iter_select(self, key, chunksize, columns=None):
+        """read a table from the store in chunks (one batch of rows at a time).
+
+        Args:
+            key (str): the key of the table.
+            chunksize (int): (maximum) number of rows in each chunk.
+            columns (list of str): only read these columns (the index is
+                always read).
+
+        Yields:
+            pandas.DataFrame
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        file_name = self._file_name(key)
+        if not os.path.isfile(file_name):
+            raise KeyError(f"No object named {key} in the file")
+        use_threads = prms._cellpyfile_parquet_use_threads
+        parquet_file = pq.ParquetFile(
+            file_name, memory_map=prms._cellpyfile_parquet_memory_map
+        )
+        if columns is not None:
+            pandas_metadata = parquet_file.schema_arrow.pandas_metadata or {}
+            index_columns = [
+                column
+                for column in pandas_metadata.get("index_columns", [])
+                if isinstance(column, str) and column not in columns
+            ]
+            columns = list(columns) + index_columns
+        for batch in parquet_file.iter_batches(
+            batch_size=chunksize, columns=columns, use_threads=use_threads
+        ):
+            table = pa.Table.from_batches([batch])
+            yield table.to_pandas(use_threads=use_threads)
+
+    def get_storer(self, key):
+        """number of rows and the columns of a table (read from the metadata)"""
+        import pyarrow.parquet as pq
+
+        file_name = self._file_name(key)
+        if not os.path.isfile(file_name):
+            raise KeyError(f"No object named {key} in the file")
+        meta_data = pq.read_metadata(file_name)
+        return ParquetStorer(meta_data.num_rows, meta_data.schema.names)
+
+
+CELLPY_FILE_FORMATS = {
+    "hdf5": CellpyFileFormat(pd.HDFStore, "h5"),
+    "parquet": CellpyFileFormat(ParquetStore, "cellpy"),
+}
+
+
+class CellpyFileHandle(object):
+    """A cellpy-file that is opened once and shared between the readers.
+
+    The file is opened on first use. The small tables (meta-data and fid
+    table) and the list of keys are cached, so that checking the file ids,
+    finding the file version and loading the file only open and read them
+    once. The handle has the same select and keys methods as the stores
+    and can be used instead of them.
+
+    Args:
+        file_name (str): the cellpy-file.
+        parent_level (str): the root of the tables in the file (defaults to
+            prms._cellpyfile_root).
+    """
+
+    def __init__(self, file_name, parent_level=None):
+        self.file_name = str(file_name)
+        self.parent_level = parent_level or prms._cellpyfile_root
+        self.file_format = detect_cellpy_file_format(self.file_name)
+        self._store = None
+        self._keys = None
+        self._tables = dict()
+
+    def __repr__(self):
+        status = "open" if self._store is not None else "closed"
+        return f"<CellpyFileHandle {self.file_name} ({status})>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, key):
+        return self._normalize_key(key) in self.keys()
+
+    @property
+    def store(self):
+        """the opened store (opened on first access)"""
+        if self._store is None:
+            logging.debug(f"opening {self.file_name}")
+            self._store = open_cellpy_store(
+                self.file_name, mode="r", file_format=self.file_format
+            )
+        return self._store
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def keys(self):
+        if self._keys is None:
+            self._keys = self.store.keys()
+        return self._keys
+
+    @staticmethod
+    def _normalize_key(key):
+        return "/" + "/".join(part for part in key.split("/") if part)
+
+    def select(self, key, **kwargs):
+        """read a table (the meta-data and fid tables are only read once)"""
+        key = self._normalize_key(key)
+        cached_keys = [
+            self._normalize_key(self.parent_level + "/info"),
+            self._normalize_key(self.parent_level + prms._cellpyfile_fid),
+        ]
+        if kwargs or key not in cached_keys:
+            return self.store.select(key, **kwargs)
+        if key not in self._tables:
+            self._tables[key] = self.store.select(key)
+        return self._tables[key].copy()
+
+    def get_storer(self, key):
+        return self.store.get_storer(key)
+
+    @property
+    def meta_table(self):
+        """the meta-data (info) table"""
+        return self.select(self.parent_level + "/info")
+
+    @property
+    def fid_table(self):
+        """the fid table"""
+        return self.select(self.parent_level + prms._cellpyfile_fid)
+
+    @property
+    def cellpy_file_version(self):
+        """the version of the cellpy-file (0 if it can not be read)"""
+        try:
+            return int(self.meta_table["cellpy_file_version"].values[0])
+        except (KeyError, IndexError, TypeError, ValueError):
+            return 0
+
+
+def table_compression(table):
+    """compression settings for a table in the cellpy-file.
+
+    Args:
+        table (str): "raw", "steps" or "summary".
+
+    Returns:
+        dict with complib and complevel (empty if the store defaults,
+        prms._cellpyfile_complib and prms._cellpyfile_complevel, are used).
+    """
+    settings = prms._cellpyfile_table_compression.get(table)
+    if not settings:
+        return dict()
+    settings = dict(settings)
+    unknown = set(settings) - {"complib", "complevel"}
+    if unknown:
+        raise ValueError(f"unknown compression setting(s) for {table}: {unknown}")
+    return settings
+
+
+def is_parquet_store(path):
+    """check if path is a cellpy parquet store"""
+    return os.path.isfile(os.path.join(str(path), PARQUET_STORE_MARKER))
+
+
+def detect_cellpy_file_format(file_name):
+    """find the format of a cellpy-file ("parquet" or "hdf5")"""
+    if is_parquet_store(file_name):
+        return "parquet"
+    return "hdf5"
+
+
+def open_cellpy_store(file_name, mode="a", file_format=None, **kwargs):
+    """open a cellpy-file store.
+
+    Args:
+        file_name (str): the cellpy-file.
+        mode (str): "r", "w" or "a".
+        file_format (str): the format of the file (detected if not given).
+        **kwargs: sent to the store (e.g. complib and complevel for hdf5).
+
+    Returns:
+        the store (pandas.HDFStore or ParquetStore).
+    """
+    if file_format is None:
+        file_format = detect_cellpy_file_format(file_name)
+    try:
+        store = CELLPY_FILE_FORMATS[file_format].store
+    except KeyError:
+        raise ValueError(f"unknown cellpy-file format: {file_format}")
+    logging.debug(f"opening {file_name} ({file_format})")
+    return store(file_name, mode=mode, **kwargs)
+
+
+def cellpy_file_exists(file_name):
+    """check if the cellpy-file exists (file or parquet store)"""
+    return os.path.isfile(file_name) or is_parquet_store(file_name)
+
+
+def remove_cellpy_file(file_name):
+    """delete a cellpy-file (only directories that are parquet stores)"""
+    if os.path.isdir(file_name):
+        if not is_parquet_store(file_name):
+            raise IOError(f"{file_name} is a directory (not a cellpy-file)")
+        shutil.rmtree(file_name)
+    else:
+        os.remove(file_name)
@@ -0,0 +1,261 @@
+"""Multi-cell container file for batches.
+
+The container is a single hdf5 file holding the summaries, step tables and
+(optionally) the raw data of many cells. Each cell is stored in its own group
+(``/cells/<group>``) using the same tables as in a cellpy-file, and an index
+table (``/index``) with one row of meta-data pr. cell makes it possible to
+look up the cells without opening the groups.
+
+All the summaries of a batch can then be read in one pass through one file
+instead of opening and closing one cellpy-file pr. cell.
+
+Example:
+    >>> from cellpy.utils.batch_tools.batch_container import BatchContainer
+    >>> with BatchContainer("my_batch.h5") as container:
+    ...     container.put_cell("cell_01", cellpy_data)
+    ...     summaries = container.summaries()
+"""
+
+import logging
+import os
+import re
+import warnings
+
+import pandas as pd
+from pandas.errors import PerformanceWarning
+
+from cellpy import prms
+from cellpy.readers.core import pickle_protocol
+
+CELLS_GROUP = "cells"
+INDEX_KEY = "/index"
+INDEX_COLUMNS = ["cell_id", "group", "has_raw", "number_of_cycles"]
+TABLES = {
+    "raw": prms._cellpyfile_raw,
+    "steps": prms._cellpyfile_step,
+    "summary": prms._cellpyfile_summary,
+    "info": "/info",
+    "fid": prms._cellpyfile_fid,
+}
+
+
+def group_name(cell_id):
+    """the name of the group used for storing a cell in the container"""
+    return "cell_" + re.sub(r"\W", "_", str(cell_id))
+
+
+class BatchContainer(object):
+    """A single hdf5 file with the data of many cells.
+
+    Args:
+        file_name (str): the container file.
+        mode (str): "r" (read), "w" (write a new container) or "a" (append,
+            the default).
+    """
+
+    def __init__(self, file_name, mode="a"):
+        self.file_name = str(file_name)
+        self.mode = mode
+        if mode == "r" and not os.path.isfile(self.file_name):
+            raise IOError(f"File does not exist: {self.file_name}")
+        if mode == "w" and os.path.isfile(self.file_name):
+            os.remove(self.file_name)
+        self._store = None
+        self._index = None
+
+    def __repr__(self):
+        return f"<BatchContainer {self.file_name}>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, cell_id):
+        return cell_id in self.cell_ids
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def store(self):
+        """the opened hdf5 store (opened on first access)"""
+        if self._store is None:
+            mode = "r" if self.mode == "r" else "a"
+            logging.debug(f"opening {self.file_name} ({mode})")
+            self._store = pd.HDFStore(
+                self.file_name,
+                mode=mode,
+                complib=prms._cellpyfile_complib,
+                complevel=prms._cellpyfile_complevel,
+            )
+        return self._store
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    @property
+    def index(self):
+        """the index table (one row pr. cell, indexed by cell_id)"""
+        if self._index is None:
+            if self.mode != "r" and not os.path.isfile(self.file_name):
+                self._index = pd.DataFrame(columns=INDEX_COLUMNS)
+            elif INDEX_KEY in self.store:
+                self._index = self.store.select(INDEX_KEY)
+            else:
+                self._index = pd.DataFrame(columns=INDEX_COLUMNS)
+            self._index = self._index.set_index("cell_id", drop=False)
+        return self._index
+
+    @property
+    def cell_ids(self):
+        return list(self.index.index)
+
+    def parent_level(self, cell_id):
+        """the parent level of the tables of a cell (as used by CellpyData.load)"""
+        try:
+            group = self.index.loc[cell_id, "group"]
+        except KeyError:
+            raise KeyError(f"{cell_id} is not in the container")
+        return "/".join([CELLS_GROUP, group])
+
+    def put_cell(self, cell_id, cellpy_data, include_raw=False):
+        """write the tables of a cell to the container (replacing old ones).
+
+        Args:
+            cell_id (str): the id of the cell (e.g. the label in the journal).
+            cellpy_data (CellpyData): the cell.
+            include_raw (bool): also write the raw data.
+        """
+        if self.mode == "r":
+            raise IOError("the container is opened in read-only mode")
+        group = group_name(cell_id)
+        index = self.index
+        other_cells = index.loc[index.index != cell_id]
+        if group in other_cells["group"].values:
+            raise ValueError(f"the group name of {cell_id} ({group}) is already used")
+
+        test = cellpy_data.cell
+        include_raw = include_raw and not test.raw.empty
+        infotbl, fidtbl = cellpy_data._create_infotable()
+
+        parent_level = "/".join([CELLS_GROUP, group])
+        if parent_level in self.store:
+            self.store.remove(parent_level)
+
+        logging.debug(f"putting {cell_id} in {self.file_name} ({parent_level})")
+        warnings.simplefilter("ignore", PerformanceWarning)
+        try:
+            with pickle_protocol(4):
+                cellpy_data._put_cell_in_cellpy_store(
+                    self.store,
+                    test,
+                    infotbl,
+                    fidtbl,
+                    parent_level=parent_level,
+                    include_raw=include_raw,
+                )
+        finally:
+            warnings.simplefilter("default", PerformanceWarning)
+
+        row = infotbl.iloc[0].to_dict()
+        row.update(
+            cell_id=cell_id,
+            group=group,
+            has_raw=include_raw,
+            number_of_cycles=len(test.summary),
+        )
+        new_row = pd.DataFrame([row], index=pd.Index([cell_id], name="cell_id"))
+        if other_cells.empty:
+            index = new_row
+        else:
+            index = pd.concat([other_cells, new_row])
+        self._index = index.reindex(columns=self._index_columns(index))
+        self._put_index()
+
+    @staticmethod
+    def _index_columns(index):
+        return INDEX_COLUMNS + [c for c in index.columns if c not in INDEX_COLUMNS]
+
+    def _put_index(self):
+        warnings.simplefilter("ignore", PerformanceWarning)
+        try:
+            with pickle_protocol(4):
+                self.store.put(
+                    INDEX_KEY,
+                    self._index.reset_index(drop=True),
+                    format=prms._cellpyfile_infotable_format,
+                )
+        finally:
+            warnings.simplefilter("default", PerformanceWarning)
+
+    def remove_cell(self, cell_id):
+        """remove a cell from the container"""
+        parent_level = self.parent_level(cell_id)
+        self.store.remove(parent_level)
+        self._index = self.index.drop(cell_id)
+        self._put_index()
+
+    def get_table(self, cell_id, table="summary"):
+        """read a table ("summary", "steps", "raw", "info" or "fid") of a cell"""
+        try:
+            key = TABLES[table]
+        except KeyError:
+            raise ValueError(f"unknown table: {table}")
+        return self.store.select("/" + self.parent_level(cell_id) + key)
+
+    def get_tables(self, table="summary", cell_ids=None):
+        """read a table for many cells in one pass through the file.
+
+        Args:
+            table (str): the table to read ("summary", "steps", "raw", "info"
+                or "fid").
+            cell_ids (list of str): the cells (defaults to all the cells).
+
+        Returns:
+            dict of pandas.DataFrames (cell_id: table).
+        """
+        if cell_ids is None:
+            cell_ids = self.cell_ids
+        # reading the cells in the order they were written
+        order = {cell_id: position for position, cell_id in enumerate(self.cell_ids)}
+        ordered = sorted(cell_ids, key=lambda cell_id: order.get(cell_id, -1))
+        tables = {cell_id: self.get_table(cell_id, table) for cell_id in ordered}
+        return {cell_id: tables[cell_id] for cell_id in cell_ids}
+
+    def summaries(self, cell_ids=None):
+        """read the summaries of the cells (see get_tables)"""
+        return self.get_tables("summary", cell_ids)
+
+    def steps(self, cell_ids=None):
+        """read the step tables of the cells (see get_tables)"""
+        return self.get_tables("steps", cell_ids)
+
+    def get_cell(self, cell_id, **kwargs):
+        """load a cell from the container.
+
+        Args:
+            cell_id (str): the id of the cell.
+            **kwargs: sent to CellpyData.load (e.g. tables, cycles or lazy).
+                The raw data is only loaded if it is stored in the container.
+
+        Returns:
+            CellpyData object.
+        """
+        from cellpy.readers import cellreader
+
+        parent_level = self.parent_level(cell_id)
+        if not self.index.loc[cell_id, "has_raw"]:
+            tables = kwargs.get("tables")
+            if tables is None:
+                tables = ["summary", "steps"]
+            kwargs["tables"] = [table for table in tables if table != "raw"]
+        # the file can not be opened in write-mode by two stores
+        self.close()
+        cellpy_data = cellreader.CellpyData()
+        cellpy_data.load(self.file_name, parent_level=parent_level, **kwargs)
+        cellpy_data.cell.name = cell_id
+        return cellpy_data
@@ -76,9 +76,10 @@ class Doer(metaclass=abc.ABCMeta):
 class Data(collections.UserDict):
     """Class that is used to access the experiment.journal.pages DataFrame.
 
-    The Data class loads the complete cellpy-file if dfdata is not already
-    loaded in memory. In future version, it could be that the Data object
-    will return a link allowing querying instead to save memory usage...
+    The Data class loads the cellpy-file if dfdata is not already loaded in
+    memory. If the experiment has lazy_raw set to True, only the summary,
+    steps and meta-data are read; the raw data is then a proxy (LazyRaw)
+    bound to the cellpy-file and is read the first time it is used.
 
     Remark that some cellpy (cellreader.CellpyData) function might not work if
     you have the dfdata in memory, but not summary data (if the cellpy function
@@ -122,7 +123,6 @@ class Data(collections.UserDict):
             pages = self.experiment.journal.pages
             info = pages.loc[cell_id, :]
             cellpy_file = info[hdr_journal.cellpy_file_name]
-            # linking not implemented yet - loading whole file in mem instead
             if not self.query_mode:
                 cell = self.experiment._load_cellpy_file(cellpy_file)
                 self.experiment.cell_data_frames[cell_id] = cell
@@ -148,6 +148,7 @@ class BaseExperiment(metaclass=abc.ABCMeta):
         self.log_level = "CRITICAL"
         self._data = None
         self._store_data_object = True
+        self.lazy_raw = False
 
     def __str__(self):
         return (
@@ -164,7 +165,7 @@ class BaseExperiment(metaclass=abc.ABCMeta):
 
     def _load_cellpy_file(self, file_name):
         cellpy_data = cellreader.CellpyData()
-        cellpy_data.load(file_name, self.parent_level)
+        cellpy_data.load(file_name, self.parent_level, lazy=self.lazy_raw)
         logging.info(f" <- grabbing ( {file_name} )")
         return cellpy_data
 
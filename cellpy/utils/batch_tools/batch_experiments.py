@@ -8,7 +8,9 @@ from tqdm.auto import tqdm
 from cellpy.readers import cellreader
 from cellpy import prms
 from cellpy.parameters.internal_settings import get_headers_journal, get_headers_summary
+from cellpy.readers.storage import cellpy_file_exists
 from cellpy.utils.batch_tools import batch_helpers as helper
+from cellpy.utils.batch_tools.batch_container import BatchContainer
 from cellpy.utils.batch_tools.batch_core import BaseExperiment
 from cellpy.utils.batch_tools.batch_journals import LabJournal
 
@@ -32,9 +34,16 @@ class CyclingExperiment(BaseExperiment):
         force_raw (bool): loads raw-file(s) even though appropriate cellpy-file
            exists if True.
         save_cellpy (bool): saves a cellpy-file for each cell if True.
+        container_file (str): also save the summaries and step tables of all
+           the cells to this batch container file (one file for the whole
+           batch, used by link and the summary engine when it exists).
+        container_raw (bool): include the raw data in the batch container
+           file if True.
         accept_errors (bool): in case of error, dont raise an exception, but
            continue to the next file if True.
         all_in_memory (bool): store the cellpydata-objects in memory if True.
+        lazy_raw (bool): only read the raw data from the cellpy-files when
+           it is used if True (when looking up cells in experiment.data).
         export_cycles (bool): export voltage-capacity curves if True.
         shifted_cycles (bool): set this to True if you want to export the
            voltage-capacity curves using the shifted-cycles option (only valid
@@ -66,6 +75,8 @@ class CyclingExperiment(BaseExperiment):
         self.force_raw = False
         self.force_recalc = False
         self.save_cellpy = True
+        self.container_file = None
+        self.container_raw = False
         self.accept_errors = False
         self.all_in_memory = False
 
@@ -100,6 +111,9 @@ class CyclingExperiment(BaseExperiment):
         number_of_runs = len(pages)
         counter = 0
         errors = []
+        container = None
+        if self.container_file is not None:
+            container = BatchContainer(self.container_file)
         pbar = tqdm(list(pages.iterrows()), file=sys.stdout, leave=False)
         for indx, row in pbar:
             counter += 1
@@ -259,6 +273,18 @@ class CyclingExperiment(BaseExperiment):
                     " if you did not opt to store all in memory"
                 )
 
+            if container is not None:
+                logging.info(f"saving to the batch container ({self.container_file})")
+                try:
+                    container.put_cell(indx, cell_data, include_raw=self.container_raw)
+                except Exception as e:
+                    logging.error("saving to the batch container failed")
+                    logging.error(e)
+                    errors.append("container:" + str(indx))
+                    # an entry from an earlier run would be read instead
+                    if indx in container:
+                        container.remove_cell(indx)
+
             if self.export_raw or self.export_cycles:
                 export_text = "exporting"
                 if self.export_raw:
@@ -293,6 +319,8 @@ class CyclingExperiment(BaseExperiment):
                     )
                     errors.append("ica:" + str(indx))
 
+        if container is not None:
+            container.close()
         self.errors["update"] = errors
         self.summary_frames = summary_frames
         self.cell_data_frames = cell_data_frames
@@ -338,6 +366,14 @@ class CyclingExperiment(BaseExperiment):
         cell_data_frames = dict()
         counter = 0
         errors = []
+        step_tables = dict()
+        if self.container_file is not None and os.path.isfile(self.container_file):
+            # reading all the step tables in one go
+            with BatchContainer(self.container_file, mode="r") as container:
+                cell_ids = [
+                    indx for indx in self.journal.pages.index if indx in container
+                ]
+                step_tables = container.steps(cell_ids)
         try:
             for indx, row in self.journal.pages.iterrows():
                 counter += 1
@@ -345,7 +381,12 @@ class CyclingExperiment(BaseExperiment):
                 logging.debug(l_txt)
                 logging.debug(f"linking cellpy-file: {row.name}")
 
-                if not os.path.isfile(row[hdr_journal.cellpy_file_name]):
+                if indx in step_tables:
+                    cell_data_frames[indx] = cellreader.CellpyData(initialize=True)
+                    cell_data_frames[indx].cell.steps = step_tables[indx]
+                    continue
+
+                if not cellpy_file_exists(row[hdr_journal.cellpy_file_name]):
                     logging.error(row[hdr_journal.cellpy_file_name])
                     logging.error("File does not exist")
                     raise IOError
@@ -9,6 +9,7 @@ import itertools
 
 from cellpy import filefinder, prms
 from cellpy.exceptions import ExportFailed, NullData, WrongFileVersion
+from cellpy.readers.storage import open_cellpy_store
 import cellpy.parameters.internal_settings
 
 # logger = logging.getLogger(__name__)
@@ -17,7 +18,7 @@ hdr_journal = cellpy.parameters.internal_settings.get_headers_journal()
 
 
 def look_up_and_get(cellpy_file_name, table_name, root=None):
-    """Extracts table from cellpy hdf5-file."""
+    """Extracts table from cellpy-file (hdf5 or parquet)."""
 
     # infoname = '/CellpyData/info'
     # dataname = '/CellpyData/dfdata'
@@ -30,13 +31,14 @@ def look_up_and_get(cellpy_file_name, table_name, root=None):
     table_path = "/".join([root, table_name])
 
     logging.debug(f"look_up_and_get({cellpy_file_name}, {table_name}")
-    store = pd.HDFStore(cellpy_file_name)
+    store = open_cellpy_store(cellpy_file_name, mode="r")
     try:
         table = store.select(table_path)
     except KeyError as e:
         logging.warning("Could not read the table")
-        store.close()
         raise WrongFileVersion(e)
+    finally:
+        store.close()
     return table
 
 
@@ -1,3 +1,4 @@
+import os
 import time
 import logging
 import pandas as pd
@@ -5,6 +6,7 @@ import pandas as pd
 from cellpy import dbreader
 from cellpy.parameters.internal_settings import get_headers_journal
 from cellpy.utils.batch_tools import batch_helpers as helper
+from cellpy.utils.batch_tools.batch_container import BatchContainer
 
 # logger = logging.getLogger(__name__)
 
@@ -93,9 +95,15 @@ def summary_engine(**kwargs):
 
 def _load_summaries(experiment):
     summary_frames = {}
+    container_file = getattr(experiment, "container_file", None)
+    if container_file is not None and os.path.isfile(container_file):
+        # reading all the summaries in one go
+        with BatchContainer(container_file, mode="r") as container:
+            labels = [label for label in experiment.cell_names if label in container]
+            summary_frames = container.summaries(labels)
     for label in experiment.cell_names:
-        # TODO: replace this with direct lookup from hdf5?
-        summary_frames[label] = experiment.data[label].cell.summary
+        if label not in summary_frames:
+            summary_frames[label] = experiment.data[label].cell.summary
     return summary_frames
 
 
@@ -0,0 +1,212 @@
+"""Benchmark compression settings for cellpy-files.
+
+Example:
+    >>> from cellpy import prms
+    >>> from cellpy.utils import compression
+    >>> results = compression.benchmark_compression("my_cell.h5")
+    >>> prms._cellpyfile_table_compression = compression.recommend_compression(
+    ...     results
+    ... )
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from cellpy import prms
+from cellpy.parameters.internal_settings import get_headers_normal
+from cellpy.readers.storage import open_cellpy_store
+
+hdr_normal = get_headers_normal()
+
+# (complib, complevel) - complevel 0 is no compression
+DEFAULT_CODECS = [
+    ("zlib", 0),
+    ("zlib", 1),
+    ("zlib", 5),
+    ("blosc:blosclz", 5),
+    ("blosc:lz4", 5),
+    ("blosc:lz4hc", 5),
+    ("blosc:zstd", 1),
+    ("blosc:zstd", 5),
+]
+TABLES = ["raw", "steps", "summary"]
+
+
+def _table_keys():
+    root = prms._cellpyfile_root
+    return {
+        "raw": root + prms._cellpyfile_raw,
+        "steps": root + prms._cellpyfile_step,
+        "summary": root + prms._cellpyfile_summary,
+    }
+
+
+def _table_put_kwargs(table, frame):
+    formats = {
+        "raw": prms._cellpyfile_raw_format,
+        "steps": prms._cellpyfile_stepdata_format,
+        "summary": prms._cellpyfile_summary_format,
+    }
+    kwargs = dict(format=formats[table])
+    if table == "raw" and formats[table] == "table":
+        kwargs["data_columns"] = [
+            hdr_normal[key]
+            for key in prms._cellpyfile_raw_data_columns
+            if hdr_normal[key] in frame.columns
+        ]
+    return kwargs
+
+
+def _time_write(file_name, key, frame, put_kwargs, complib, complevel, repeat):
+    write_times = []
+    for _ in range(repeat):
+        if os.path.isfile(file_name):
+            os.remove(file_name)
+        t0 = time.perf_counter()
+        with pd.HDFStore(file_name, complib=complib, complevel=complevel) as store:
+            store.put(key, frame, **put_kwargs)
+        write_times.append(time.perf_counter() - t0)
+    return os.path.getsize(file_name), min(write_times)
+
+
+def _drop_from_page_cache(file_name):
+    """Ask the OS to forget the cached pages of the file (if supported)."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    fd = os.open(file_name, os.O_RDONLY)
+    try:
+        os.fsync(fd)  # only clean pages can be dropped
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def _time_read(file_name, key, repeat):
+    read_times = []
+    for _ in range(repeat):
+        _drop_from_page_cache(file_name)
+        t0 = time.perf_counter()
+        with pd.HDFStore(file_name, mode="r") as store:
+            store.select(key)
+        read_times.append(time.perf_counter() - t0)
+    return min(read_times)
+
+
+def benchmark_compression(cellpy_file, codecs=None, tables=None, repeat=3):
+    """Measure the compression ratio and the write and read speed of codecs.
+
+    The tables are read from your own cellpy-file (hdf5 or parquet) and
+    written to temporary hdf5 files using each of the codecs. The files are
+    read back in a separate pass after all of them are written, and the OS
+    is asked to drop them from its page cache before each read (using
+    posix_fadvise). Where that is not supported (e.g. on Windows), the read
+    times are for warm-cache reads and are optimistic for large files.
+
+    Args:
+        cellpy_file (str): the cellpy-file to use for the benchmark.
+        codecs (list of tuples): (complib, complevel) pairs to test
+            (defaults to DEFAULT_CODECS).
+        tables (list of str): the tables to test ("raw", "steps" and/or
+            "summary"; defaults to all of them).
+        repeat (int): number of repetitions (the fastest is reported).
+
+    Returns:
+        pandas.DataFrame with one row pr. table and codec (table, complib,
+        complevel, size [bytes], ratio (in-memory size / file size),
+        write_time [s], read_time [s], write_speed [MB/s], read_speed [MB/s]).
+    """
+    codecs = codecs or DEFAULT_CODECS
+    tables = tables or TABLES
+    keys = _table_keys()
+    unknown_tables = set(tables) - set(keys)
+    if unknown_tables:
+        raise ValueError(f"unknown table(s): {unknown_tables}")
+
+    with open_cellpy_store(cellpy_file, mode="r") as store:
+        frames = {table: store.select(keys[table]) for table in tables}
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for table, frame in frames.items():
+            memory_size = frame.memory_usage(deep=True).sum()
+            put_kwargs = _table_put_kwargs(table, frame)
+            # write all the files first, so that the reads are not served
+            # from the pages cached when writing the same file
+            table_rows = []
+            for i, (complib, complevel) in enumerate(codecs):
+                logging.debug(f"benchmarking {table}: {complib} ({complevel})")
+                file_name = os.path.join(tmp_dir, f"benchmark_{table}_{i}.h5")
+                size, write_time = _time_write(
+                    file_name,
+                    keys[table],
+                    frame,
+                    put_kwargs,
+                    complib,
+                    complevel,
+                    repeat,
+                )
+                table_rows.append(
+                    dict(
+                        table=table,
+                        complib=complib,
+                        complevel=complevel,
+                        size=size,
+                        ratio=memory_size / size,
+                        write_time=write_time,
+                        write_speed=memory_size / write_time / 1e6,
+                        file_name=file_name,
+                    )
+                )
+            for row in table_rows:
+                file_name = row.pop("file_name")
+                read_time = _time_read(file_name, keys[table], repeat)
+                os.remove(file_name)
+                row["read_time"] = read_time
+                row["read_speed"] = memory_size / read_time / 1e6
+            rows.extend(table_rows)
+    columns = [
+        "table",
+        "complib",
+        "complevel",
+        "size",
+        "ratio",
+        "write_time",
+        "read_time",
+        "write_speed",
+        "read_speed",
+    ]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def recommend_compression(results, max_size_increase=0.25):
+    """Pick the fastest codec to read for each table.
+
+    Only codecs giving files at most max_size_increase (fraction) larger than
+    the smallest file are considered.
+
+    Args:
+        results (pandas.DataFrame): the output from benchmark_compression.
+        max_size_increase (float): accepted size penalty (0.25 is 25 %).
+
+    Returns:
+        dict that can be used as prms._cellpyfile_table_compression.
+    """
+    recommended = dict()
+    for table, table_results in results.groupby("table"):
+        max_size = (1.0 + max_size_increase) * table_results["size"].min()
+        candidates = table_results.loc[table_results["size"] <= max_size]
+        best = candidates.sort_values(["read_time", "size"]).iloc[0]
+        recommended[table] = {
+            "complib": best["complib"],
+            "complevel": int(best["complevel"]),
+        }
+        logging.info(
+            f"{table}: {best['complib']} ({best['complevel']}) - "
+            f"ratio {best['ratio']:.1f}, read {best['read_speed']:.0f} MB/s"
+        )
+    return recommended
@@ -55,11 +55,13 @@ test_requirements = [
 
 extra_req_batch = ["ipython", "jupyter"]
 extra_req_fit = ["lmfit", "matplotlib"]
-extra_req_all = extra_req_batch + extra_req_fit
+extra_req_parquet = ["pyarrow"]
+extra_req_all = extra_req_batch + extra_req_fit + extra_req_parquet
 
 extra_requirements = {
     "batch": extra_req_batch,
     "fit": extra_req_fit,
+    "parquet": extra_req_parquet,
     "all": extra_req_all,
 }
 name = "cellpy"
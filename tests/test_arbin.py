@@ -0,0 +1,273 @@
+import io
+import os
+import pytest
+import logging
+import numpy as np
+import pandas as pd
+from cellpy import log, prms
+
+log.setup_logging(default_level=logging.DEBUG)
+
+
+@pytest.fixture
+def loader():
+    from cellpy.readers.instruments.arbin import ArbinLoader
+
+    return ArbinLoader()
+
+
+@pytest.fixture
+def normal_table_csv():
+    from cellpy.readers.instruments.arbin import MINIMUM_SELECTION
+
+    number_of_points = 1000
+    df = pd.DataFrame(
+        {col: np.arange(number_of_points, dtype=float) for col in MINIMUM_SELECTION}
+    )
+    df["Test_ID"] = np.repeat([1, 2], number_of_points // 2)
+    df["Data_Point"] = np.arange(number_of_points) + 1
+    df["Cycle_Index"] = np.arange(number_of_points) // 100 + 1
+    df["Step_Index"] = np.arange(number_of_points) // 25 % 4 + 1
+    df["Is_FC_Data"] = 0
+    # the exported table is not necessarily sorted
+    df = df.iloc[::-1]
+    return df.to_csv(index=False)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 100, 10_000])
+def test_read_normal_chunks(loader, normal_table_csv, chunk_size):
+    expected = pd.read_csv(io.StringIO(normal_table_csv))
+    expected = expected.loc[
+        (expected.Test_ID == 1)
+        & ~((expected.Cycle_Index == 2) & (expected.Step_Index == 3))
+        & (expected.Data_Point >= 50)
+    ].sort_values("Data_Point")
+
+    df = loader._read_normal_chunks(
+        io.StringIO(normal_table_csv),
+        test_ID=1,
+        bad_steps=[(2, 3)],
+        data_points=(50, None),
+        chunk_size=chunk_size,
+    )
+    assert df["Data_Point"].is_monotonic_increasing
+    np.testing.assert_array_equal(df.values, expected.values)
+
+
+def test_read_normal_chunks_minimal(loader, normal_table_csv):
+    from cellpy.readers.instruments.arbin import MINIMUM_SELECTION
+
+    try:
+        prms.Reader["select_minimal"] = True
+        prms.Reader["limit_loaded_cycles"] = [2, 5]
+        df = loader._read_normal_chunks(
+            io.StringIO(normal_table_csv), test_ID=1, chunk_size=64
+        )
+    finally:
+        prms.Reader["select_minimal"] = False
+        prms.Reader["limit_loaded_cycles"] = None
+
+    assert sorted(df.columns) == sorted(MINIMUM_SELECTION)
+    assert sorted(df["Cycle_Index"].unique()) == [3, 4]
+
+
+@pytest.mark.parametrize("select_minimal", [False, True])
+def test_read_normal_chunks_empty_export(loader, select_minimal):
+    from cellpy.readers.instruments.arbin import MINIMUM_SELECTION
+
+    try:
+        prms.Reader["select_minimal"] = select_minimal
+        df = loader._read_normal_chunks(io.StringIO(""), test_ID=1)
+    finally:
+        prms.Reader["select_minimal"] = False
+
+    assert df.empty
+    if select_minimal:
+        assert list(df.columns) == MINIMUM_SELECTION
+    else:
+        assert list(df.columns) == list(loader.arbin_headers_normal.values())
+
+
+def test_scratch_copy(loader, tmp_path):
+    import os
+
+    res_file = tmp_path / "20170101_test.res"
+    res_file.write_bytes(b"not really a res file")
+    file_name = str(res_file)
+
+    with loader._scratch_copy(file_name, copy=False) as temp_filename:
+        assert temp_filename == file_name
+
+    with loader._scratch_copy(file_name) as first:
+        with loader._scratch_copy(file_name) as second:
+            assert first != second
+            assert os.path.isfile(first)
+            assert os.path.isfile(second)
+    assert not os.path.exists(os.path.dirname(first))
+    assert not os.path.exists(os.path.dirname(second))
+    assert os.path.isfile(file_name)
+
+
+@pytest.fixture
+def normal_table_connection(normal_table_csv):
+    import sqlite3
+
+    conn = sqlite3.connect(":memory:")
+    df = pd.read_csv(io.StringIO(normal_table_csv))
+    df.to_sql("Channel_Normal_Table", conn, index=False)
+    yield conn
+    conn.close()
+
+
+def test_load_res_normal_table_chunked(loader, normal_table_connection):
+    arbin_prms = prms.Instruments.Arbin
+    _, expected = loader._load_res_normal_table(
+        normal_table_connection, 1, [(2, 3)], (10, None)
+    )
+    try:
+        arbin_prms.chunk_size = 64
+        arbin_prms.chunk_dtypes = {"Cycle_Index": "int32", "Voltage": "float32"}
+        length, df = loader._load_res_normal_table(
+            normal_table_connection, 1, [(2, 3)], (10, None)
+        )
+        assert length == len(expected)
+        assert df["Cycle_Index"].dtype == "int32"
+        assert df["Voltage"].dtype == "float32"
+        pd.testing.assert_frame_equal(
+            df, expected.astype(arbin_prms.chunk_dtypes), check_dtype=True
+        )
+
+        arbin_prms.max_memory = 3.5 * df.iloc[:64].memory_usage(index=False).sum()
+        length, df = loader._load_res_normal_table(
+            normal_table_connection, 1, [(2, 3)], (10, None)
+        )
+        assert length == 3 * 64
+        pd.testing.assert_frame_equal(
+            df, expected.iloc[: 3 * 64].astype(arbin_prms.chunk_dtypes)
+        )
+    finally:
+        arbin_prms.chunk_size = None
+        arbin_prms.chunk_dtypes = None
+        arbin_prms.max_memory = None
+
+
+FAKE_MDB_EXPORT = """#!{executable}
+import os
+import sys
+import time
+
+file_name, table_name = sys.argv[1:3]
+folder = os.environ["FAKE_MDB_EXPORT_DIR"]
+with open(os.path.join(folder, "log.txt"), "a") as log_file:
+    log_file.write(f"start {{table_name}} {{time.time()}}\\n")
+time.sleep(float(os.environ.get("FAKE_MDB_EXPORT_DELAY", "0")))
+for i in range(int(os.environ.get("FAKE_MDB_EXPORT_WARNINGS", "0"))):
+    sys.stderr.write(f"Warning: unknown column type in {{table_name}} ({{i}})\\n")
+if table_name == os.environ.get("FAKE_MDB_EXPORT_FAIL"):
+    sys.stderr.write(f"Error: could not export {{table_name}}\\n")
+    sys.exit(int(os.environ.get("FAKE_MDB_EXPORT_RETURN_CODE", "1")))
+with open(os.path.join(folder, table_name + ".csv")) as table_file:
+    sys.stdout.write(table_file.read())
+sys.stdout.flush()
+with open(os.path.join(folder, "log.txt"), "a") as log_file:
+    log_file.write(f"end {{table_name}} {{time.time()}}\\n")
+"""
+
+
+@pytest.fixture
+def fake_mdb_export(tmp_path, monkeypatch, normal_table_csv):
+    import os
+    import sys
+    from cellpy.readers.instruments.arbin import TABLE_NAMES
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "mdb-export"
+    script.write_text(FAKE_MDB_EXPORT.format(executable=sys.executable))
+    script.chmod(0o755)
+
+    global_table = pd.DataFrame(
+        {
+            "Test_ID": [1],
+            "Channel_Index": [3],
+            "Channel_Number": [4],
+            "Creator": ["tester"],
+            "Item_ID": ["item"],
+            "Schedule_File_Name": ["schedule.sdu"],
+            "Start_DateTime": [42000.5],
+            "Test_Name": ["test"],
+        }
+    )
+    stats_table = pd.DataFrame(
+        {
+            "Test_ID": [1, 1],
+            "Data_Point": [100, 200],
+            "Cycle_Index": [1, 2],
+            "Charge_Capacity": [0.1, 0.2],
+        }
+    )
+    table_dir = tmp_path / "tables"
+    table_dir.mkdir()
+    global_table.to_csv(table_dir / f"{TABLE_NAMES['global']}.csv", index=False)
+    stats_table.to_csv(table_dir / f"{TABLE_NAMES['statistic']}.csv", index=False)
+    (table_dir / f"{TABLE_NAMES['normal']}.csv").write_text(normal_table_csv)
+
+    res_file = tmp_path / "20170101_test.res"
+    res_file.write_bytes(b"not really a res file")
+
+    monkeypatch.setenv("PATH", str(bin_dir) + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("FAKE_MDB_EXPORT_DIR", str(table_dir))
+    return str(res_file), table_dir
+
+
+@pytest.mark.skipif(os.name != "posix", reason="runs mdb-export as a script")
+def test_loader_posix_concurrent_export(
+    loader, fake_mdb_export, normal_table_connection, monkeypatch
+):
+    from cellpy.readers.instruments.arbin import MINIMUM_SELECTION
+
+    res_file, table_dir = fake_mdb_export
+    monkeypatch.setenv("FAKE_MDB_EXPORT_DELAY", "0.5")
+    data = loader.loader(res_file)[0]
+
+    log = [line.split() for line in (table_dir / "log.txt").read_text().splitlines()]
+    starts = [float(t) for event, _, t in log if event == "start"]
+    ends = [float(t) for event, _, t in log if event == "end"]
+    assert len(starts) == len(ends) == 3
+    # all the tables are exported at the same time
+    assert max(starts) < min(ends)
+
+    # the same data as when reading the tables one by one
+    _, expected = loader._load_res_normal_table(normal_table_connection, 1, None, None)
+    expected = expected.sort_values("Data_Point")
+    assert len(data.raw) == len(expected)
+    for key, col in loader.arbin_headers_normal.items():
+        if col in MINIMUM_SELECTION and col != "DateTime":
+            np.testing.assert_array_equal(
+                data.raw[loader.cellpy_headers_normal[key]].values, expected[col].values
+            )
+    assert len(data.summary) == 2
+    assert data.test_ID == 1
+    assert data.channel_index == 3
+
+
+@pytest.mark.skipif(os.name != "posix", reason="runs mdb-export as a script")
+@pytest.mark.parametrize("table", ["global", "statistic", "normal"])
+def test_loader_posix_failed_export(loader, fake_mdb_export, monkeypatch, table):
+    from cellpy.readers.instruments.arbin import TABLE_NAMES
+
+    res_file, _ = fake_mdb_export
+    monkeypatch.setenv("FAKE_MDB_EXPORT_FAIL", TABLE_NAMES[table])
+    with pytest.raises(IOError, match="mdb-export failed"):
+        loader.loader(res_file)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="runs mdb-export as a script")
+def test_loader_posix_export_warnings(loader, fake_mdb_export, monkeypatch, caplog):
+    res_file, _ = fake_mdb_export
+    # more than fits in a pipe buffer (this would block a stderr pipe)
+    monkeypatch.setenv("FAKE_MDB_EXPORT_WARNINGS", "5000")
+    with caplog.at_level(logging.WARNING):
+        data = loader.loader(res_file)[0]
+    assert len(data.summary) == 2
+    assert "unknown column type" in caplog.text
@@ -176,3 +176,87 @@ def test_report(populated_batch):
 # # Since the batch-files contains full paths I need to figure out how to make a custom json-file for the test.
 #     folder_name = prms.Paths.batchfiledir
 #     batch.iterate_batches(folder_name, default_log_level="CRITICAL")
+
+
+@pytest.fixture
+def cellpy_data():
+    from cellpy import cellreader
+
+    return cellreader.CellpyData().load(fdv.cellpy_file_path)
+
+
+def test_batch_container(tmp_path, cellpy_data):
+    from cellpy.utils.batch_tools.batch_container import BatchContainer
+
+    file_name = tmp_path / "batch.h5"
+    cell = cellpy_data.cell
+    with BatchContainer(file_name, mode="w") as container:
+        container.put_cell("cell-1", cellpy_data)
+        container.put_cell("cell-2", cellpy_data, include_raw=True)
+        # replacing a cell
+        container.put_cell("cell-1", cellpy_data)
+        with pytest.raises(ValueError):
+            container.put_cell("cell 2", cellpy_data)
+
+    with BatchContainer(file_name, mode="r") as container:
+        assert container.cell_ids == ["cell-2", "cell-1"]
+        assert list(container.index["has_raw"]) == [True, False]
+        assert container.index.loc["cell-1", "number_of_cycles"] == len(cell.summary)
+        summaries = container.summaries()
+        assert list(summaries) == ["cell-2", "cell-1"]
+        pandas.testing.assert_frame_equal(summaries["cell-1"], cell.summary)
+        steps = container.steps(["cell-1"])
+        pandas.testing.assert_frame_equal(steps["cell-1"], cell.steps)
+
+        c = container.get_cell("cell-1")
+        assert c.cell.raw.empty
+        pandas.testing.assert_frame_equal(c.cell.summary, cell.summary)
+        c = container.get_cell("cell-2", cycles=[2, 3])
+        assert set(c.cell.raw[c.headers_normal.cycle_index_txt]) == {2, 3}
+        with pytest.raises(KeyError):
+            container.get_table("cell-3")
+
+
+def test_load_summaries_from_batch_container(tmp_path, batch_instance, cellpy_data):
+    from cellpy.utils.batch_tools.batch_container import BatchContainer
+
+    file_name = tmp_path / "batch.h5"
+    with BatchContainer(file_name) as container:
+        container.put_cell("cell-1", cellpy_data)
+
+    experiment = batch_experiments.CyclingExperiment()
+    experiment.container_file = str(file_name)
+    experiment.cell_data_frames = {"cell-1": None}
+    summary_frames = engines._load_summaries(experiment)
+    expected = cellpy_data.cell.summary
+    pandas.testing.assert_frame_equal(summary_frames["cell-1"], expected)
+
+
+def test_update_removes_failed_batch_container_cells(
+    tmp_path, batch_instance, cellpy_data, monkeypatch
+):
+    from cellpy.utils.batch_tools.batch_container import BatchContainer
+
+    experiment = batch_experiments.CyclingExperiment()
+    experiment.journal.project = "ProjectOfRun"
+    experiment.journal.name = "test"
+    experiment.journal.from_db()
+    experiment.save_cellpy = False
+    experiment.force_cellpy = True
+    cell_ids = list(experiment.journal.pages.index)
+
+    # a cell from an earlier run
+    file_name = tmp_path / "batch.h5"
+    with BatchContainer(file_name) as container:
+        container.put_cell(cell_ids[0], cellpy_data)
+
+    def failing_put_cell(self, cell_id, *args, **kwargs):
+        raise IOError("could not write to the container")
+
+    monkeypatch.setattr(BatchContainer, "put_cell", failing_put_cell)
+    experiment.container_file = str(file_name)
+    experiment.update()
+
+    assert f"container:{cell_ids[0]}" in experiment.errors["update"]
+    with BatchContainer(file_name, mode="r") as container:
+        assert cell_ids[0] not in container
@@ -33,3 +33,135 @@ def test_set_instrument(cellpy_data_instance):
     # temp_dir = tempfile.mkdtemp()
     # cellpy_data_instance.to_csv(datadir=temp_dir)
     # shutil.rmtree(temp_dir)
+
+
+def test_mpr_module_headers():
+    from cellpy.readers.instruments.biologic_file_format import hdr_dtype, mpr_label
+    from cellpy.readers.instruments import biologics_mpr
+
+    modules = []
+    with open(fdv.mpr_file_path, mode="rb") as file_obj:
+        file_obj.read(len(mpr_label))
+        for _ in range(3):
+            modules.append(biologics_mpr._read_module_header(file_obj))
+        data = biologics_mpr._read_module_data(file_obj, modules[1], length=4)
+    names = [m["shortname"].strip().decode() for m in modules]
+    assert "VMP data" in names
+    assert all("data" not in m for m in modules)
+    assert modules[1]["offset"] == modules[0]["end"] + 6 + hdr_dtype.itemsize
+    assert len(data) == 4
+
+
+def test_mpr_loader_memory_mapped(tmp_path):
+    import shutil
+    import numpy as np
+    from cellpy.readers.instruments.biologics_mpr import MprLoader
+
+    file_name = tmp_path / "biol.mpr"
+    shutil.copy2(fdv.mpr_file_path, file_name)
+    loader = MprLoader()
+    data = loader.loader(str(file_name))[0]
+    file_name.unlink()
+
+    raw = data.raw
+    assert len(raw) == data.raw_data_files_length[0] > 0
+    assert not any(isinstance(raw[col].values, np.memmap) for col in raw.columns)
+    assert raw[loader.cellpy_headers.voltage_txt].notna().all()
+
+
+def test_mpr_loader_select_minimal():
+    import pandas as pd
+    from cellpy import prms
+    from cellpy.readers.instruments.biologics_mpr import MprLoader
+
+    full = MprLoader().loader(fdv.mpr_file_path)[0].raw
+    try:
+        prms.Reader["select_minimal"] = True
+        raw = MprLoader().loader(fdv.mpr_file_path)[0].raw
+    finally:
+        prms.Reader["select_minimal"] = False
+
+    assert len(raw.columns) < len(full.columns)
+    assert "NN_101" not in raw.columns
+    pd.testing.assert_frame_equal(raw, full[raw.columns])
+
+
+def _write_partial_mpr(file_name, number_of_records):
+    # mimics an mpr-file that is still being written by the instrument
+    import numpy as np
+    from cellpy.readers.instruments.biologic_file_format import hdr_dtype, mpr_label
+    from cellpy.readers.instruments import biologics_mpr
+
+    with open(fdv.mpr_file_path, mode="rb") as file_obj:
+        file_obj.read(len(mpr_label))
+        while True:
+            module = biologics_mpr._read_module_header(file_obj)
+            if module["shortname"].strip() == b"VMP data":
+                break
+        file_obj.seek(0)
+        raw_bytes = bytearray(file_obj.read())
+
+    offset, length = int(module["offset"]), int(module["length"])
+    total_records = int(np.frombuffer(raw_bytes[offset : offset + 4], "<u4")[0])
+    record_size = (length - 405) // total_records
+    new_length = 405 + number_of_records * record_size
+    length_pos = offset - hdr_dtype.itemsize + 35
+    raw_bytes[length_pos : length_pos + 4] = np.uint32(new_length).tobytes()
+    raw_bytes[offset : offset + 4] = np.uint32(number_of_records).tobytes()
+    partial = raw_bytes[: offset + new_length] + raw_bytes[offset + length :]
+    with open(file_name, mode="wb") as file_obj:
+        file_obj.write(partial)
+
+
+def test_mpr_loader_data_points():
+    import pandas as pd
+    from cellpy.readers.instruments.biologics_mpr import MprLoader
+
+    loader = MprLoader()
+    full = loader.loader(fdv.mpr_file_path)[0].raw
+    tail = loader.loader(fdv.mpr_file_path, data_points=(10_001, None))[0].raw
+    assert loader.number_of_records == len(full)
+    pd.testing.assert_frame_equal(tail, full.iloc[10_000:].reset_index(drop=True))
+    previous_cycle = full[loader.cellpy_headers.cycle_index_txt].iloc[9_999]
+    tail = loader.loader(
+        fdv.mpr_file_path, data_points=(10_001, None), previous_cycle=previous_cycle
+    )[0].raw
+    pd.testing.assert_frame_equal(tail, full.iloc[10_000:].reset_index(drop=True))
+    empty = loader.loader(fdv.mpr_file_path, data_points=(len(full) + 1, None))
+    assert empty[0].raw.empty
+
+
+def test_mpr_update_from_partial_file(cellpy_data_instance, tmp_path, monkeypatch):
+    import shutil
+    import pandas as pd
+    from cellpy.readers.instruments.biologics_mpr import MprLoader
+
+    previous_cycles = []
+    load_mpr_data = MprLoader._load_mpr_data
+
+    def _load_mpr_data(self, *args):
+        previous_cycles.append(args[-1])
+        return load_mpr_data(self, *args)
+
+    monkeypatch.setattr(MprLoader, "_load_mpr_data", _load_mpr_data)
+
+    file_name = str(tmp_path / "biol.mpr")
+    _write_partial_mpr(file_name, 10_000)
+    cellpy_data_instance.set_instrument(instrument="biologics_mpr")
+    cellpy_data_instance.from_raw(file_name)
+    cell = cellpy_data_instance.cell
+    hdr = cellpy_data_instance.headers_normal
+    assert len(cell.raw) == 10_000
+    assert cell.raw_data_files[0].last_data_point == 10_000
+
+    shutil.copy2(fdv.mpr_file_path, file_name)
+    last = cell.raw_data_files[0].last_data_point
+    cellpy_data_instance.dev_update_from_raw(file_name, data_points=[last, None])
+    assert len(cellpy_data_instance.cells[1].raw) == 23561 - 10_000 + 1
+    # the cycle offset is taken from the loaded cell, not from the file
+    assert previous_cycles[-1] == cell.raw[hdr.cycle_index_txt].iloc[-2]
+    cell = cellpy_data_instance.dev_update_merge()
+    assert cell.raw_data_files[0].last_data_point == 23561
+
+    expected = MprLoader().loader(fdv.mpr_file_path)[0].raw
+    pd.testing.assert_frame_equal(cell.raw, expected)
@@ -2,6 +2,7 @@ import os
 import tempfile
 import shutil
 import datetime
+import time
 import pytest
 import logging
 
@@ -496,6 +497,244 @@ def test_make_step_table_all_steps(cellpy_data_instance):
     assert len(cellpy_data_instance.cell.steps) == 103
 
 
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"all_steps": True}, {"skip_steps": [1, 10]}, {"sort_rows": False}]
+)
+def test_make_step_table_engines(cellpy_data_instance, kwargs):
+    import pandas as pd
+
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    cellpy_data_instance.make_step_table(engine="groupby", **kwargs)
+    steps_groupby = cellpy_data_instance.cell.steps
+    cellpy_data_instance.make_step_table(engine="segmented", **kwargs)
+    steps_segmented = cellpy_data_instance.cell.steps
+    pd.testing.assert_frame_equal(steps_groupby, steps_segmented)
+
+
+def test_make_step_table_segmented_split_steps(cellpy_data_instance):
+    import pandas as pd
+
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    raw = cellpy_data_instance.cell.raw
+    # the same step appearing in two separated blocks within one cycle:
+    raw.loc[raw.index[200:205], "step_index"] = 1
+    cellpy_data_instance.make_step_table(engine="groupby")
+    steps_groupby = cellpy_data_instance.cell.steps
+    cellpy_data_instance.make_step_table(engine="segmented")
+    steps_segmented = cellpy_data_instance.cell.steps
+    pd.testing.assert_frame_equal(steps_groupby, steps_segmented)
+
+
+@pytest.mark.parametrize("all_steps", [False, True])
+def test_make_step_table_update(cellpy_data_instance, all_steps):
+    import pandas as pd
+
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    raw = cellpy_data_instance.cell.raw
+    cellpy_data_instance.make_step_table(all_steps=all_steps)
+    steps_full = cellpy_data_instance.cell.steps
+
+    cellpy_data_instance.cell.raw = raw.iloc[:7777]
+    cellpy_data_instance.make_step_table(all_steps=all_steps)
+    cellpy_data_instance.cell.raw = raw
+    cellpy_data_instance.make_step_table(all_steps=all_steps, update=True)
+    pd.testing.assert_frame_equal(steps_full, cellpy_data_instance.cell.steps)
+
+
+def test_ustep(cellpy_data_instance):
+    import pandas as pd
+
+    steps = pd.Series([1, 1, 2, 2, 1, 1, 3])
+    assert list(cellpy_data_instance._ustep(steps)) == [1, 1, 2, 2, 3, 3, 4]
+
+    # a new cycle (or sub-step) with the same step number is a new u-step
+    keys = pd.DataFrame({"cycle": [1, 1, 2, 2, 2], "step": [5, 5, 5, 5, 5]})
+    assert list(cellpy_data_instance._ustep(keys)) == [1, 1, 2, 2, 2]
+    assert list(cellpy_data_instance._ustep(keys, previous=[1, 5])) == [0, 0, 1, 1, 1]
+    assert list(cellpy_data_instance._ustep(keys, previous=[0, 5])) == [1, 1, 2, 2, 2]
+    assert len(cellpy_data_instance._ustep(keys.iloc[:0])) == 0
+
+
+@pytest.mark.benchmark(
+    group="step-table",
+    min_time=0.1,
+    max_time=0.5,
+    min_rounds=2,
+    timer=time.time,
+    disable_gc=True,
+    warmup=False,
+)
+@pytest.mark.parametrize("all_steps", [False, True])
+def test_make_step_table_throughput(cellpy_data_instance, benchmark, all_steps):
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    benchmark(cellpy_data_instance.make_step_table, all_steps=all_steps)
+    assert len(cellpy_data_instance.cell.steps) == 103
+
+
+def test_cycle_step_index():
+    import numpy as np
+    import pandas as pd
+    from cellpy.readers.core import CycleStepIndex
+
+    cycles = [1, 1, 1, 1, 2, 2, 2, 1, 3]
+    steps = [1, 1, 2, 2, 3, 4, 3, 1, 5]
+    index = CycleStepIndex(cycles, steps)
+    assert len(index) == 7
+    assert index.cycles == [1, 2, 3]
+    assert index.rows(1, 2) == slice(2, 4)
+    assert index.rows(3) == slice(8, 9)
+    assert index.rows(4) == slice(0, 0)
+    assert list(index.rows(1)) == [0, 1, 2, 3, 7]
+    assert list(index.rows(2, [3])) == [4, 6]
+    assert index.rows(2, [3, 4]) == slice(4, 7)
+    assert list(index.pair_rows([(1, 1), (2, 4)])) == [0, 1, 5, 7]
+
+    empty = CycleStepIndex(np.array([]), np.array([]))
+    assert len(empty) == 0
+    assert empty.rows(1) == slice(0, 0)
+
+    data_points = np.arange(1, 10)
+    index = CycleStepIndex(cycles, steps, data_points=data_points)
+    assert index.row_ranges([1, 3]) == [(0, 4), (7, 9)]
+    assert index.row_ranges([1], data_points=(4, None)) == [(2, 4), (7, 8)]
+    assert index.row_ranges(data_points=(None, 5)) == [(0, 5)]
+    frame = index.to_frame()
+    assert list(frame["last_row"]) == [1, 3, 4, 5, 6, 7, 8]
+    assert list(frame["first_data_point"]) == [1, 3, 5, 6, 7, 8, 9]
+    copied = CycleStepIndex.from_frame(frame)
+    assert copied.row_ranges([2]) == index.row_ranges([2])
+
+    first = CycleStepIndex(cycles[:3], steps[:3], data_points=data_points[:3])
+    last = CycleStepIndex(cycles[3:], steps[3:], data_points=data_points[3:])
+    appended = first.append(last)
+    assert len(appended) == len(index)
+    pd.testing.assert_frame_equal(appended.to_frame(), frame)
+
+
+def test_stored_cycle_step_index(cellpy_data_instance, tmp_path, monkeypatch):
+    import pandas as pd
+    from cellpy import cellreader
+    from cellpy.readers import core
+
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    raw = cellpy_data_instance.cell.raw
+    c_txt = cellpy_data_instance.headers_normal.cycle_index_txt
+    file_name = tmp_path / "cell.h5"
+    cellpy_data_instance.save(file_name)
+    with pd.HDFStore(file_name, mode="r") as store:
+        index_key = prms._cellpyfile_root + prms._cellpyfile_cycle_step_index
+        assert core.read_cycle_step_index(store, index_key).number_of_rows == len(
+            raw
+        )
+
+    ranges = []
+    select_raw_using_index = core._select_raw_using_index
+
+    def recording_select_raw_using_index(*args, **kwargs):
+        selected = select_raw_using_index(*args, **kwargs)
+        ranges.append(selected is not None)
+        return selected
+
+    monkeypatch.setattr(
+        core, "_select_raw_using_index", recording_select_raw_using_index
+    )
+    cell = cellreader.CellpyData().load(file_name, cycles=[2, 3, 7]).cell
+    pd.testing.assert_frame_equal(cell.raw, raw.loc[raw[c_txt].isin([2, 3, 7])])
+    assert ranges == [True]
+
+    c = cellreader.CellpyData().load(file_name, lazy=True)
+    expected = cellpy_data_instance.get_cap([3, 4], categorical_column=True)
+    pd.testing.assert_frame_equal(
+        c.get_cap([3, 4], categorical_column=True), expected
+    )
+    assert ranges == [True, True]
+    assert not c.cell.raw.loaded
+
+
+def test_cycle_step_index_on_cell(cellpy_data_instance):
+    import pandas as pd
+
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    cell = cellpy_data_instance.cell
+    raw = cell.raw
+    c_txt = cellpy_data_instance.headers_normal.cycle_index_txt
+    s_txt = cellpy_data_instance.headers_normal.step_index_txt
+    v_txt = cellpy_data_instance.headers_normal.voltage_txt
+
+    index = cell.cycle_step_index
+    assert cell.cycle_step_index is index
+    for cycle, step in [(1, 1), (3, 8), (18, 10)]:
+        expected = raw.loc[(raw[c_txt] == cycle) & (raw[s_txt] == step), v_txt]
+        pd.testing.assert_series_equal(
+            cellpy_data_instance.sget_voltage(cycle, step), expected
+        )
+    expected = raw.loc[raw[c_txt] == 5, v_txt]
+    pd.testing.assert_series_equal(cellpy_data_instance.get_voltage(5), expected)
+    assert cellpy_data_instance.sget_voltage(1000, 1) is None
+
+    cell.raw = raw.iloc[:100]
+    assert cell.cycle_step_index is not index
+    assert cell.cycle_step_index.number_of_rows == 100
+
+
+def test_compact_dtypes(cellpy_data_instance, tmp_path):
+    import numpy as np
+    from cellpy.readers import core
+
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    cell = cellpy_data_instance.cell
+    headers = cellpy_data_instance.headers_normal
+    raw = cell.raw.copy()
+    raw[headers.cycle_index_txt] = raw[headers.cycle_index_txt].astype(float)
+    raw["label"] = np.where(raw[headers.current_txt] > 0, "charge", "other")
+    cell.raw = raw
+
+    try:
+        prms.Reader.compact_dtypes = True
+        prms.Reader.float32_columns = ["voltage_txt"]
+        cell = core.compact_dtypes(cell)
+    finally:
+        prms.Reader.compact_dtypes = False
+        prms.Reader.float32_columns = None
+
+    dtypes = cell.raw.dtypes
+    assert dtypes[headers.cycle_index_txt] == "int32"
+    assert dtypes[headers.step_index_txt] == "int32"
+    assert dtypes[headers.voltage_txt] == "float32"
+    assert dtypes["label"] == "category"
+    assert dtypes[headers.current_txt] == raw[headers.current_txt].dtype
+    np.testing.assert_array_equal(
+        cell.raw[headers.cycle_index_txt], raw[headers.cycle_index_txt]
+    )
+
+    file_name = tmp_path / "compact.h5"
+    cellpy_data_instance.save(file_name)
+    cellpy_data_instance.load(file_name)
+    assert (cellpy_data_instance.cell.raw.dtypes == dtypes).all()
+
+
+def test_compact_dtypes_keeps_unsafe_columns():
+    import numpy as np
+    import pandas as pd
+    from cellpy.readers import core
+
+    headers = core.HEADERS_NORMAL
+    cell = core.Cell()
+    cell.raw = pd.DataFrame(
+        {
+            headers.cycle_index_txt: [1.0, 2.0, np.nan],
+            headers.step_index_txt: [1.0, 2.5, 3.0],
+            headers.sub_step_index_txt: [1, 2, 2**40],
+        }
+    )
+    try:
+        prms.Reader.compact_dtypes = True
+        cell = core.compact_dtypes(cell)
+    finally:
+        prms.Reader.compact_dtypes = False
+    assert (cell.raw.dtypes == [float, float, np.int64]).all()
+
+
 def test_make_step_table_no_rate(cellpy_data_instance):
     cellpy_data_instance.from_raw(fdv.res_file_path)
     cellpy_data_instance.set_mass(1.0)
@@ -544,6 +783,26 @@ def test_summary_from_cellpyfile(cellpy_data_instance):
     assert s2.iloc[5, 3] == s1.iloc[5, 3]
 
 
+def test_summary_end_voltage_and_ir_from_steps(cellpy_data_instance):
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    cellpy_data_instance.make_summary(find_ir=True, find_end_voltage=True)
+    summary = cellpy_data_instance.cell.summary
+    raw = cellpy_data_instance.cell.raw
+    discharge_steps = cellpy_data_instance.get_step_numbers("discharge", allctypes=False)
+    for cycle in [1, 5, 18]:
+        step = discharge_steps[cycle]
+        selected = raw.loc[
+            (raw["cycle_index"] == cycle) & (raw["step_index"] == step[-1]), "voltage"
+        ]
+        s = summary.loc[summary["cycle_index"] == cycle]
+        assert s["end_voltage_discharge_u_V"].values[0] == selected.values[-1]
+        selected = raw.loc[
+            (raw["cycle_index"] == cycle) & (raw["step_index"] == step[0]),
+            "internal_resistance",
+        ]
+        assert s["ir_discharge_u_Ohms"].values[0] == selected.values[0]
+
+
 def test_load_cellpyfile(cellpy_data_instance):
     cellpy_data_instance.load(fdv.cellpy_file_path)
     run_number = 0
@@ -582,6 +841,38 @@ def test_get_capacity(dataset):
     assert len(df) == 438
 
 
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"method": "forth", "categorical_column": True},
+        {"method": "forth-and-forth", "shift": 10.0},
+        {"label_cycle_number": True, "inter_cycle_shift": False},
+        {"cycle": [2, 1000, 3], "label_cycle_number": True},
+        {"cycle": [2, 1000, 3], "ignore_errors": False},
+        {"interpolated": True, "number_of_points": 20, "label_cycle_number": True},
+        {"trim_taper_steps": 1, "steps_to_skip": [6]},
+    ],
+)
+def test_get_cap_batched(cellpy_data_instance, kwargs):
+    import pandas as pd
+
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    expected = cellpy_data_instance.get_cap(batched=False, **kwargs)
+    df = cellpy_data_instance.get_cap(batched=True, **kwargs)
+    pd.testing.assert_frame_equal(expected, df)
+
+
+def test_get_cap_batched_split(cellpy_data_instance):
+    import pandas as pd
+
+    cellpy_data_instance.load(fdv.cellpy_file_path)
+    expected_c, expected_v = cellpy_data_instance.get_cap(split=True, batched=False)
+    c, v = cellpy_data_instance.get_cap(split=True, batched=True)
+    pd.testing.assert_series_equal(expected_c, c)
+    pd.testing.assert_series_equal(expected_v, v)
+
+
 @pytest.mark.parametrize(
     "test_input,expected",
     [
@@ -620,6 +911,209 @@ def test_save_cellpyfile_auto_extension(cellpy_data_instance):
     assert not os.path.isfile(tmp_file + ".h5")
 
 
+@pytest.fixture
+def indexed_cellpy_file(tmp_path):
+    from cellpy import cellreader
+
+    c = cellreader.CellpyData()
+    c.load(fdv.cellpy_file_path)
+    file_name = tmp_path / "indexed.h5"
+    c.save(file_name)
+    return file_name
+
+
+def test_save_cellpyfile_data_columns(indexed_cellpy_file):
+    import pandas as pd
+
+    with pd.HDFStore(indexed_cellpy_file) as store:
+        storer = store.get_storer(prms._cellpyfile_root + prms._cellpyfile_raw)
+        indexed = set(storer.table.colindexes)
+    assert {"index", "data_point", "cycle_index", "step_index"} <= indexed
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_load_cellpyfile_selection(cellpy_data_instance, indexed_cellpy_file, indexed):
+    import pandas as pd
+    from cellpy import cellreader
+
+    file_name = indexed_cellpy_file if indexed else fdv.cellpy_file_path
+    full = cellreader.CellpyData().load(file_name).cell
+    headers = cellpy_data_instance.headers_normal
+    c_txt = headers.cycle_index_txt
+    columns = [c_txt, headers.voltage_txt]
+
+    cell = cellpy_data_instance.load(
+        file_name, raw_columns=columns, cycles=[2, 3, 7]
+    ).cell
+    expected = full.raw.loc[full.raw[c_txt].isin([2, 3, 7]), columns]
+    pd.testing.assert_frame_equal(cell.raw, expected)
+    summary_cycles = cell.summary[cellpy_data_instance.headers_summary.cycle_index]
+    step_cycles = cell.steps[cellpy_data_instance.headers_step_table.cycle]
+    assert sorted(summary_cycles) == [2, 3, 7]
+    assert set(step_cycles) == {2, 3, 7}
+
+    cell = cellreader.CellpyData().load(file_name, data_points=(100, 199)).cell
+    pd.testing.assert_frame_equal(cell.raw, full.raw.loc[100:199])
+
+    cell = cellreader.CellpyData().load(file_name, tables=["summary"]).cell
+    assert cell.raw.empty
+    assert not cell.steps_made
+    pd.testing.assert_frame_equal(cell.summary, full.summary)
+
+
+def test_load_cellpyfile_lazy(indexed_cellpy_file, tmp_path):
+    import pandas as pd
+    from cellpy import cellreader
+    from cellpy.readers.core import LazyRaw
+
+    c = cellreader.CellpyData()
+    full = c.load(indexed_cellpy_file).cell
+    c_txt = c.headers_normal.cycle_index_txt
+    v_txt = c.headers_normal.voltage_txt
+
+    cell = cellreader.CellpyData().load(indexed_cellpy_file, lazy=True).cell
+    assert isinstance(cell.raw, LazyRaw)
+    assert len(cell.raw) == len(full.raw)
+    assert not cell.no_data
+    assert not cell.raw.loaded
+    pd.testing.assert_frame_equal(cell.summary, full.summary)
+
+    partial = cell.raw.load(cycles=[3, 4])
+    assert not cell.raw.loaded
+    expected = full.raw.loc[full.raw[c_txt].isin([3, 4])]
+    pd.testing.assert_frame_equal(partial, expected)
+
+    voltage = cell.raw[v_txt]
+    pd.testing.assert_series_equal(voltage, full.raw[v_txt])
+    assert isinstance(cell.raw, pd.DataFrame)
+    pd.testing.assert_frame_equal(cell.raw, full.raw)
+
+    # saving a lazy cell to its own file must not lose the raw data
+    c = cellreader.CellpyData().load(indexed_cellpy_file, lazy=True)
+    c.save(indexed_cellpy_file)
+    cell = cellreader.CellpyData().load(indexed_cellpy_file).cell
+    pd.testing.assert_frame_equal(cell.raw, full.raw)
+
+
+def test_iter_raw(indexed_cellpy_file):
+    import pandas as pd
+    from cellpy import cellreader
+
+    c = cellreader.CellpyData()
+    full = c.load(indexed_cellpy_file).cell.raw
+    c_txt = c.headers_normal.cycle_index_txt
+    columns = [c.headers_normal.voltage_txt]
+
+    chunks = list(c.iter_raw(chunksize=1000))
+    assert max(len(chunk) for chunk in chunks) == 1000
+    pd.testing.assert_frame_equal(pd.concat(chunks), full)
+
+    c = cellreader.CellpyData().load(indexed_cellpy_file, lazy=True)
+    chunks = list(c.iter_raw(chunksize=1000, columns=columns, cycles=[2, 3, 7]))
+    assert not c.cell.raw.loaded
+    expected = full.loc[full[c_txt].isin([2, 3, 7]), columns]
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+
+@pytest.mark.parametrize("all_steps", [False, True])
+def test_make_step_table_and_summary_in_chunks(indexed_cellpy_file, all_steps):
+    import pandas as pd
+    from cellpy import cellreader
+
+    c = cellreader.CellpyData().load(indexed_cellpy_file)
+    c.make_step_table(all_steps=all_steps)
+    c.make_summary()
+    expected_steps = c.cell.steps
+    expected_summary = c.cell.summary
+
+    c = cellreader.CellpyData().load(indexed_cellpy_file, lazy=True, tables=["raw"])
+    c.make_step_table(all_steps=all_steps, chunksize=997)
+    c.make_summary(chunksize=997)
+    assert not c.cell.raw.loaded
+    pd.testing.assert_frame_equal(c.cell.steps, expected_steps, check_dtype=False)
+    pd.testing.assert_frame_equal(c.cell.summary, expected_summary, check_dtype=False)
+
+    with pytest.raises(ValueError):
+        c.make_step_table(chunksize=997, update=True)
+
+
+@pytest.fixture
+def partial_and_full_cellpy_data():
+    from cellpy import cellreader
+
+    full = cellreader.CellpyData().load(fdv.cellpy_file_path)
+    full.make_step_table()
+    full.make_summary()
+
+    partial = cellreader.CellpyData().load(fdv.cellpy_file_path)
+    raw = partial.cell.raw
+    partial.cell.raw = raw.loc[raw[partial.headers_normal.data_point_txt] <= 6000]
+    partial.make_step_table()
+    partial.make_summary()
+    return partial, full
+
+
+def _assert_cellpy_files_equal(file_name, expected_file_name):
+    import pandas as pd
+    from cellpy import cellreader
+
+    cell = cellreader.CellpyData().load(file_name).cell
+    expected = cellreader.CellpyData().load(expected_file_name).cell
+    pd.testing.assert_frame_equal(cell.raw, expected.raw)
+    pd.testing.assert_frame_equal(
+        cell.summary.reset_index(drop=True), expected.summary.reset_index(drop=True)
+    )
+    pd.testing.assert_frame_equal(
+        cell.steps.reset_index(drop=True), expected.steps.reset_index(drop=True)
+    )
+
+
+def test_save_append(partial_and_full_cellpy_data, tmp_path):
+    import pandas as pd
+
+    partial, full = partial_and_full_cellpy_data
+    file_name = tmp_path / "appended.h5"
+    expected_file_name = tmp_path / "expected.h5"
+    partial.save(file_name)
+    full.save(expected_file_name)
+
+    full.save(file_name, append=True)
+    _assert_cellpy_files_equal(file_name, expected_file_name)
+
+    # nothing new to append
+    infotbl, fidtbl = full._create_infotable()
+    assert full._append_to_cellpy_file(str(file_name), full.cell, infotbl, fidtbl)
+    _assert_cellpy_files_equal(file_name, expected_file_name)
+
+    with pd.HDFStore(file_name, mode="r") as store:
+        raw_key = prms._cellpyfile_root + prms._cellpyfile_raw
+        attrs = store.get_storer(raw_key).attrs
+        assert not hasattr(attrs, "cellpy_append_start")
+
+
+def test_save_append_after_interrupted_append(partial_and_full_cellpy_data, tmp_path):
+    import pandas as pd
+
+    partial, full = partial_and_full_cellpy_data
+    file_name = tmp_path / "appended.h5"
+    expected_file_name = tmp_path / "expected.h5"
+    partial.save(file_name)
+    full.save(expected_file_name)
+
+    # simulate an append that stopped after writing (wrong) raw rows
+    raw_key = prms._cellpyfile_root + prms._cellpyfile_raw
+    with pd.HDFStore(file_name) as store:
+        storer = store.get_storer(raw_key)
+        number_of_rows = storer.nrows
+        new_rows = full.cell.raw.iloc[number_of_rows : number_of_rows + 10].copy()
+        new_rows[full.headers_normal.voltage_txt] = -1.0
+        store.append(raw_key, new_rows)
+        storer.attrs.cellpy_append_start = number_of_rows
+
+    full.save(file_name, append=True)
+    _assert_cellpy_files_equal(file_name, expected_file_name)
+
+
 def test_save_cvs(cellpy_data_instance):
     cellpy_data_instance.loadcell(fdv.res_file_path)
     cellpy_data_instance.make_summary(find_ir=True)
@@ -678,6 +1172,79 @@ def test_load_custom_default(cellpy_data_instance):
     assert 593.031 == pytest.approx(val, 0.1)
 
 
+def test_load_custom_definition_file(tmp_path):
+    import numpy as np
+    from cellpy import prms
+    from cellpy.readers.instruments.custom import CustomLoader
+
+    definition_file = tmp_path / "custom.yml"
+    definition_file.write_text(
+        "columns: [data_point_txt, cycle_index_txt, step_index_txt, voltage_txt]\n"
+        "dtypes:\n"
+        "  voltage_txt: float32\n"
+        "unit_factors:\n"
+        "  voltage_txt: 1000.0\n"
+        "structure:\n"
+        "  chunk_size: 1000\n"
+    )
+    try:
+        prms.Instruments.custom_instrument_definitions_file = None
+        expected = CustomLoader().loader(fdv.custom_file_paths)[0].raw
+        prms.Instruments.custom_instrument_definitions_file = str(definition_file)
+        loader = CustomLoader()
+        raw = loader.loader(fdv.custom_file_paths)[0].raw
+    finally:
+        prms.Instruments.custom_instrument_definitions_file = None
+
+    headers = loader.headers_normal
+    assert loader.structure["sep"] == ";"
+    assert list(raw.columns) == [
+        headers.data_point_txt,
+        headers.step_index_txt,
+        headers.cycle_index_txt,
+        headers.voltage_txt,
+    ]
+    assert raw.index.equals(expected.index)
+    assert raw[headers.voltage_txt].dtype == "float32"
+    np.testing.assert_allclose(
+        raw[headers.voltage_txt], 1000.0 * expected[headers.voltage_txt], rtol=1e-6
+    )
+    np.testing.assert_array_equal(
+        raw[headers.cycle_index_txt], expected[headers.cycle_index_txt]
+    )
+
+
+def test_load_custom_definition_file_dtypes(tmp_path, caplog):
+    from cellpy import prms
+    from cellpy.readers.instruments.custom import CustomLoader
+
+    definition_file = tmp_path / "custom.yml"
+    definition_file.write_text(
+        "columns: [data_point_txt, cycle_index_txt, step_index_txt, voltage_txt]\n"
+        "dtypes:\n"
+        "  cycle_index_txt: category\n"
+        "  step_index_txt: Int32\n"
+        "unit_factors:\n"
+        "  step_index_txt: 0.5\n"
+        "structure:\n"
+        "  chunk_size: 1000\n"
+    )
+    try:
+        prms.Instruments.custom_instrument_definitions_file = str(definition_file)
+        loader = CustomLoader()
+        with caplog.at_level(logging.WARNING):
+            raw = loader.loader(fdv.custom_file_paths)[0].raw
+    finally:
+        prms.Instruments.custom_instrument_definitions_file = None
+
+    headers = loader.headers_normal
+    # the chunks have different categories (objects when concatenated)
+    assert raw[headers.cycle_index_txt].dtype == "category"
+    # the unit factor gives floats that can not be integers
+    assert raw[headers.step_index_txt].dtype.kind == "f"
+    assert f"could not convert {headers.step_index_txt}" in caplog.text
+
+
 def test_group_by_interpolate(dataset):
     data = dataset.cell.raw
     interpolated_data1 = cellpy.readers.core.group_by_interpolate(data)
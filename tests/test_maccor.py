@@ -0,0 +1,241 @@
+import time
+import pytest
+import logging
+import numpy as np
+import pandas as pd
+from cellpy import log, prms
+
+log.setup_logging(default_level=logging.DEBUG)
+
+MACCOR_COLUMNS = [
+    "Rec#",
+    "Cyc#",
+    "Step",
+    "Test (Min)",
+    "Step (Min)",
+    "Amp-hr",
+    "Watt-hr",
+    "Amps",
+    "Volts",
+    "State",
+    "ES",
+    "DPt Time",
+]
+
+
+def _make_maccor_frame(number_of_cycles, points_per_step):
+    # charge, rest, discharge, rest (Amp-hr is reset for each step)
+    states = ["C", "R", "D", "R"]
+    rows = []
+    rec = 0
+    test_time = 0.0
+    for cycle in range(number_of_cycles):
+        for step, state in enumerate(states, start=1):
+            step_time = np.arange(1, points_per_step + 1, dtype=float)
+            amps = 0.0 if state == "R" else 0.002
+            amp_hr = amps * step_time / 60.0
+            frame = pd.DataFrame(
+                {
+                    "Rec#": np.arange(rec + 1, rec + points_per_step + 1),
+                    "Cyc#": cycle,
+                    "Step": step,
+                    "Test (Min)": test_time + step_time,
+                    "Step (Min)": step_time,
+                    "Amp-hr": amp_hr,
+                    "Watt-hr": 3.5 * amp_hr,
+                    "Amps": amps,
+                    "Volts": 3.0 + step_time / (10.0 * points_per_step),
+                    "State": state,
+                    "ES": 0,
+                }
+            )
+            rows.append(frame)
+            rec += points_per_step
+            test_time += points_per_step
+    df = pd.concat(rows, ignore_index=True)
+    df["DPt Time"] = (
+        pd.Timestamp("2020-03-20 10:00:00") + pd.to_timedelta(df["Test (Min)"], "min")
+    ).dt.strftime("%m/%d/%Y %I:%M:%S %p")
+    return df[MACCOR_COLUMNS]
+
+
+def _write_maccor_file(file_name, df):
+    with open(file_name, "w") as ofile:
+        ofile.write(
+            "Today's Date\t04/12/2020\tDate of Test:\t03/20/2020\t"
+            "Filename:\ttest.001\tProcedure:\tformation.000\n"
+        )
+        df.to_csv(ofile, sep="\t", index=False, line_terminator="\n")
+
+
+def _write_custom_file(file_name, df):
+    # the default custom format (data starts after 19 lines of variables)
+    hdr = {
+        "Rec#": "index",
+        "Test (Min)": "test_time",
+        "Step (Min)": "step_time",
+        "DPt Time": "date_stamp",
+        "Step": "step",
+        "Cyc#": "cycle",
+        "Amps": "current",
+        "Volts": "voltage",
+    }
+    custom = df.rename(columns=hdr)
+    custom["charge_capacity"] = custom["Amp-hr"]
+    custom["discharge_Capacity"] = custom["Amp-hr"]
+    with open(file_name, "w") as ofile:
+        ofile.write("# custom file\n")
+        ofile.write("number of headers ; 19\n")
+        ofile.write("mass;0.0012\n")
+        for i in range(16):
+            ofile.write(f"# line {i}\n")
+        custom.to_csv(ofile, sep=";", index=False, line_terminator="\n")
+
+
+@pytest.fixture
+def maccor_file(tmp_path):
+    file_name = tmp_path / "maccor_test.txt"
+    _write_maccor_file(file_name, _make_maccor_frame(3, 20))
+    return str(file_name)
+
+
+@pytest.fixture(scope="module")
+def large_files(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("maccor")
+    df = _make_maccor_frame(50, 500)
+    maccor_file = tmp_path / "maccor_large.txt"
+    custom_file = tmp_path / "custom_large.csv"
+    _write_maccor_file(maccor_file, df)
+    _write_custom_file(custom_file, df)
+    return str(maccor_file), str(custom_file), len(df)
+
+
+def test_maccor_loader(maccor_file):
+    import datetime
+    from cellpy.readers.instruments.maccor import MaccorLoader
+
+    loader = MaccorLoader()
+    data = loader.loader(maccor_file)[0]
+    raw = data.raw
+    hdr = loader.headers_normal
+
+    assert data.start_datetime == datetime.datetime(2020, 3, 20)
+    assert len(raw) == 3 * 4 * 20
+    assert data.raw_data_files[0].last_data_point == len(raw)
+    assert sorted(raw[hdr.cycle_index_txt].unique()) == [1, 2, 3]
+    assert raw[hdr.datetime_txt].dtype == "datetime64[ns]"
+    # minutes in the file, seconds in cellpy
+    assert raw[hdr.step_time_txt].iloc[0] == pytest.approx(60.0)
+    # the current is negative when discharging
+    discharge = raw["State"] == "D"
+    assert (raw.loc[discharge, hdr.current_txt] < 0).all()
+    assert (raw.loc[raw["State"] == "C", hdr.current_txt] > 0).all()
+    # the capacities are cumulated within the cycle
+    end_of_charge = 0.002 * 20 / 60.0
+    cycle_1 = raw[hdr.cycle_index_txt] == 1
+    assert raw.loc[cycle_1, hdr.charge_capacity_txt].iloc[-1] == pytest.approx(
+        end_of_charge
+    )
+    assert raw.loc[cycle_1, hdr.discharge_capacity_txt].max() == pytest.approx(
+        end_of_charge
+    )
+    assert raw.loc[cycle_1 & discharge, hdr.charge_capacity_txt].min() == (
+        pytest.approx(end_of_charge)
+    )
+
+
+def test_maccor_loader_chunked(maccor_file):
+    from cellpy.readers.instruments.maccor import MaccorLoader
+
+    expected = MaccorLoader().loader(maccor_file)[0].raw
+    try:
+        prms.Instruments.Maccor.chunk_size = 7
+        loader = MaccorLoader()
+        raw = loader.loader(maccor_file, bad_steps=[(1, 2)])[0].raw
+    finally:
+        prms.Instruments.Maccor.chunk_size = None
+
+    hdr = loader.headers_normal
+    bad = (expected[hdr.cycle_index_txt] == 1) & (expected[hdr.step_index_txt] == 2)
+    pd.testing.assert_frame_equal(raw, expected.loc[~bad].reset_index(drop=True))
+
+
+def test_maccor_loader_header_only(tmp_path):
+    from cellpy.readers.instruments.maccor import MaccorLoader
+
+    file_name = tmp_path / "maccor_empty.txt"
+    _write_maccor_file(file_name, _make_maccor_frame(3, 20).iloc[:0])
+    loader = MaccorLoader()
+    data = loader.loader(str(file_name))[0]
+    hdr = loader.headers_normal
+
+    assert data.raw.empty
+    assert hdr.charge_capacity_txt in data.raw.columns
+    assert hdr.discharge_capacity_txt in data.raw.columns
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        ["03/20/2020 12:01:05 AM", "03/20/2020 12:01:06 PM"],
+        ["12/31/2020 01:59:59 PM", "01/01/2021 11:00:00 AM"],
+        ["3/20/2020 1:01:05 AM", "03/20/2020 12:01:06 PM"],
+    ],
+)
+def test_maccor_parse_datetime(values):
+    import datetime
+    from cellpy.readers.instruments.maccor import MaccorLoader
+
+    parsed = MaccorLoader()._parse_datetime(pd.Series(values))
+    expected = [datetime.datetime.strptime(v, "%m/%d/%Y %I:%M:%S %p") for v in values]
+    assert list(parsed) == expected
+
+
+def test_maccor_set_instrument(maccor_file):
+    from cellpy import cellreader
+
+    c = cellreader.CellpyData()
+    c.set_instrument("maccor")
+    c.cycle_mode = "cathode"
+    c.from_raw(maccor_file)
+    c.set_mass(1.0)
+    c.make_step_table()
+    c.make_summary()
+    assert c.tester == "maccor"
+    assert set(c.cell.steps["type"]) >= {"charge", "discharge"}
+    assert len(c.cell.summary) == 3
+
+
+@pytest.mark.benchmark(
+    group="maccor-vs-custom",
+    min_time=0.1,
+    max_time=0.5,
+    min_rounds=2,
+    timer=time.time,
+    disable_gc=True,
+    warmup=False,
+)
+def test_maccor_loader_throughput(large_files, benchmark):
+    from cellpy.readers.instruments.maccor import MaccorLoader
+
+    maccor_file, _, number_of_rows = large_files
+    data = benchmark(MaccorLoader().loader, maccor_file)
+    assert len(data[0].raw) == number_of_rows
+
+
+@pytest.mark.benchmark(
+    group="maccor-vs-custom",
+    min_time=0.1,
+    max_time=0.5,
+    min_rounds=2,
+    timer=time.time,
+    disable_gc=True,
+    warmup=False,
+)
+def test_custom_loader_throughput(large_files, benchmark):
+    from cellpy.readers.instruments.custom import CustomLoader
+
+    _, custom_file, number_of_rows = large_files
+    prms.Instruments.custom_instrument_definitions_file = None
+    data = benchmark(CustomLoader().loader, custom_file)
+    assert len(data[0].raw) == number_of_rows
@@ -26,3 +26,31 @@ def test_set_instrument(cellpy_data_instance):
     temp_dir = tempfile.mkdtemp()
     cellpy_data_instance.to_csv(datadir=temp_dir)
     shutil.rmtree(temp_dir)
+
+
+@pytest.mark.parametrize("engine", [None, "c", "python", "pyarrow"])
+def test_pec_loader(engine):
+    import datetime
+    from cellpy import prms
+    from cellpy.readers.instruments.pec import PECLoader
+
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+
+    loader = PECLoader()
+    try:
+        prms.Instruments.PEC.csv_engine = engine
+        data = loader.loader(fdv.pec_file_path)[0]
+    finally:
+        prms.Instruments.PEC.csv_engine = None
+
+    headers = loader.cellpy_headers
+    raw = data.raw
+    assert data.start_datetime == datetime.datetime(2019, 2, 22, 16, 21, 35)
+    assert loader.pec_settings["test_regime_name"] == "SAFT VL43EFe dQdV C/25"
+    assert not any(col.startswith("Unnamed") for col in raw.columns)
+    assert "Ambient_temperature_C" in raw.columns
+    assert raw[headers.datetime_txt].dtype == "datetime64[ns]"
+    assert raw["Rack"].dtype == "category"
+    # voltage is given in mV in the file
+    assert raw[headers.voltage_txt].iloc[0] == pytest.approx(3.272632)
@@ -0,0 +1,257 @@
+import pytest
+import logging
+import pandas as pd
+from cellpy import log, prms
+from . import fdv
+
+log.setup_logging(default_level=logging.DEBUG)
+
+try:
+    import pyarrow  # noqa: F401
+
+    has_pyarrow = True
+except ImportError:
+    has_pyarrow = False
+
+requires_pyarrow = pytest.mark.skipif(not has_pyarrow, reason="requires pyarrow")
+
+
+@pytest.fixture
+def hdf5_cellpy_file(tmp_path):
+    from cellpy import cellreader
+
+    c = cellreader.CellpyData()
+    c.load(fdv.cellpy_file_path)
+    file_name = tmp_path / "cell.h5"
+    c.save(file_name)
+    return file_name
+
+
+@pytest.fixture
+def parquet_cellpy_file(hdf5_cellpy_file):
+    from cellpy.readers.cellreader import convert_cellpy_file
+
+    return convert_cellpy_file(hdf5_cellpy_file)
+
+
+@requires_pyarrow
+def test_parquet_store_put_and_select(tmp_path):
+    from cellpy.readers.storage import ParquetStore, detect_cellpy_file_format
+
+    df = pd.DataFrame({"cycle_index": [1, 1, 2, 3], "voltage": [0.1, 0.2, 0.3, 0.4]})
+    path = tmp_path / "store.cellpy"
+    with ParquetStore(path, mode="w") as store:
+        store.put("/CellpyData/raw", df, format="table", data_columns=True)
+        assert store.keys() == ["/CellpyData/raw"]
+        assert store.get_storer("/CellpyData/raw").nrows == 4
+
+    assert detect_cellpy_file_format(path) == "parquet"
+    assert detect_cellpy_file_format(tmp_path / "cell.h5") == "hdf5"
+    with ParquetStore(path, mode="r") as store:
+        pd.testing.assert_frame_equal(store.select("/CellpyData/raw"), df)
+        selected = store.select(
+            "CellpyData/raw",
+            columns=["voltage"],
+            filters=[("cycle_index", "in", [2, 3])],
+        )
+        assert list(selected["voltage"]) == [0.3, 0.4]
+        with pytest.raises(KeyError):
+            store.select("/CellpyData/summary")
+
+    with pytest.raises(IOError):
+        ParquetStore(tmp_path, mode="r")
+
+
+@requires_pyarrow
+def test_convert_cellpy_file(hdf5_cellpy_file, parquet_cellpy_file):
+    from cellpy import cellreader
+
+    assert parquet_cellpy_file.endswith(".cellpy")
+    expected = cellreader.CellpyData().load(hdf5_cellpy_file).cell
+    cell = cellreader.CellpyData().load(parquet_cellpy_file).cell
+    pd.testing.assert_frame_equal(cell.raw, expected.raw)
+    pd.testing.assert_frame_equal(cell.summary, expected.summary)
+    pd.testing.assert_frame_equal(cell.steps, expected.steps)
+    assert cell.mass == expected.mass
+    assert cell.cellpy_file_version == expected.cellpy_file_version
+
+
+@requires_pyarrow
+def test_load_parquet_selection(hdf5_cellpy_file, parquet_cellpy_file):
+    from cellpy import cellreader
+    from cellpy.readers.core import LazyRaw
+
+    c = cellreader.CellpyData()
+    full = c.load(hdf5_cellpy_file).cell
+    c_txt = c.headers_normal.cycle_index_txt
+    columns = [c_txt, c.headers_normal.voltage_txt]
+
+    cell = cellreader.CellpyData().load(
+        parquet_cellpy_file, raw_columns=columns, cycles=[2, 3, 7]
+    ).cell
+    expected = full.raw.loc[full.raw[c_txt].isin([2, 3, 7]), columns]
+    pd.testing.assert_frame_equal(cell.raw, expected)
+    assert sorted(cell.summary[c.headers_summary.cycle_index]) == [2, 3, 7]
+
+    cell = cellreader.CellpyData().load(parquet_cellpy_file, data_points=(100, 199))
+    pd.testing.assert_frame_equal(cell.cell.raw, full.raw.loc[100:199])
+
+    cell = cellreader.CellpyData().load(parquet_cellpy_file, lazy=True).cell
+    assert isinstance(cell.raw, LazyRaw)
+    assert len(cell.raw) == len(full.raw)
+    expected = full.raw.loc[full.raw[c_txt] == 4]
+    pd.testing.assert_frame_equal(cell.raw.load(cycles=[4]), expected)
+
+    c = cellreader.CellpyData().load(parquet_cellpy_file, lazy=True)
+    chunks = list(c.iter_raw(chunksize=1000, columns=columns[1:], cycles=[2, 3]))
+    expected = full.raw.loc[full.raw[c_txt].isin([2, 3]), columns[1:]]
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+
+@requires_pyarrow
+def test_save_parquet(tmp_path):
+    from cellpy import cellreader
+    from cellpy.readers.storage import is_parquet_store
+
+    c = cellreader.CellpyData().load(fdv.cellpy_file_path)
+    try:
+        prms._cellpyfile_format = "parquet"
+        c.save(str(tmp_path / "cell"))
+    finally:
+        prms._cellpyfile_format = "hdf5"
+    file_name = tmp_path / "cell.cellpy"
+    assert is_parquet_store(file_name)
+
+    # overwriting
+    c.save(file_name)
+    assert is_parquet_store(file_name)
+    not_a_store = tmp_path / "not_a_store.cellpy"
+    not_a_store.mkdir()
+    c.save(not_a_store)
+    assert list(not_a_store.iterdir()) == []
+
+    cell = cellreader.get(file_name).cell
+    pd.testing.assert_frame_equal(cell.raw, c.cell.raw)
+    assert cellreader.CellpyData()._check_cellpy_file(file_name) is not None
+
+
+def test_save_table_compression(tmp_path):
+    from cellpy import cellreader
+
+    c = cellreader.CellpyData().load(fdv.cellpy_file_path)
+    file_name = tmp_path / "cell.h5"
+    try:
+        prms._cellpyfile_table_compression["raw"] = {
+            "complib": "blosc:lz4",
+            "complevel": 5,
+        }
+        c.save(file_name)
+    finally:
+        prms._cellpyfile_table_compression["raw"] = None
+
+    root = prms._cellpyfile_root
+    with pd.HDFStore(file_name, mode="r") as store:
+        raw_filters = store.get_storer(root + prms._cellpyfile_raw).table.filters
+        summary_key = root + prms._cellpyfile_summary
+        summary_filters = store.get_storer(summary_key).table.filters
+    assert raw_filters.complib == "blosc:lz4"
+    assert raw_filters.complevel == 5
+    assert summary_filters.complib == "zlib"
+    assert summary_filters.complevel == prms._cellpyfile_complevel
+
+    cell = cellreader.CellpyData().load(file_name).cell
+    pd.testing.assert_frame_equal(cell.raw, c.cell.raw)
+
+
+def test_benchmark_compression(hdf5_cellpy_file):
+    from cellpy.utils import compression
+
+    codecs = [("zlib", 0), ("zlib", 9), ("blosc:lz4", 5)]
+    results = compression.benchmark_compression(
+        hdf5_cellpy_file, codecs=codecs, tables=["raw", "summary"], repeat=1
+    )
+    assert len(results) == 2 * len(codecs)
+    raw = results.loc[results.table == "raw"].set_index("complevel")
+    assert raw.loc[9, "size"] < raw.loc[0, "size"]
+    assert (results["read_speed"] > 0).all()
+
+    recommended = compression.recommend_compression(results, max_size_increase=0.0)
+    assert set(recommended) == {"raw", "summary"}
+    smallest = results.loc[results.groupby("table")["size"].idxmin()]
+    for _, row in smallest.iterrows():
+        assert recommended[row.table]["complib"] == row.complib
+
+
+def test_benchmark_compression_cold_reads(hdf5_cellpy_file, monkeypatch):
+    from cellpy.utils import compression
+
+    events = []
+    time_write = compression._time_write
+    drop_from_page_cache = compression._drop_from_page_cache
+
+    def logging_time_write(file_name, *args):
+        events.append(("write", file_name))
+        return time_write(file_name, *args)
+
+    def logging_drop_from_page_cache(file_name):
+        events.append(("drop", file_name))
+        return drop_from_page_cache(file_name)
+
+    monkeypatch.setattr(compression, "_time_write", logging_time_write)
+    monkeypatch.setattr(
+        compression, "_drop_from_page_cache", logging_drop_from_page_cache
+    )
+    codecs = [("zlib", 0), ("zlib", 9)]
+    compression.benchmark_compression(
+        hdf5_cellpy_file, codecs=codecs, tables=["raw"], repeat=2
+    )
+    # all the files are written before any of them are read
+    assert [event for event, _ in events] == ["write"] * 2 + ["drop"] * 4
+    written = [file_name for event, file_name in events if event == "write"]
+    dropped = [file_name for event, file_name in events if event == "drop"]
+    assert sorted(set(dropped)) == sorted(written)
+
+
+def test_cellpy_file_handle(hdf5_cellpy_file, monkeypatch):
+    from cellpy import cellreader
+    from cellpy.readers import storage
+
+    opened = []
+    open_cellpy_store = storage.open_cellpy_store
+
+    def counting_open_cellpy_store(file_name, *args, **kwargs):
+        opened.append(file_name)
+        return open_cellpy_store(file_name, *args, **kwargs)
+
+    monkeypatch.setattr(storage, "open_cellpy_store", counting_open_cellpy_store)
+
+    c = cellreader.CellpyData()
+    with c._cellpy_file_handle(hdf5_cellpy_file) as handle:
+        assert handle.cellpy_file_version == 6
+        c._check_cellpy_file(hdf5_cellpy_file)
+        c.load(hdf5_cellpy_file)
+    assert len(opened) == 1
+    assert c._open_cellpy_file_handle is None
+    assert not c.cell.raw.empty
+
+    c = cellreader.CellpyData()
+    c.load(hdf5_cellpy_file)
+    assert len(opened) == 2
+
+
+def test_load_metadata_only(hdf5_cellpy_file, monkeypatch):
+    from cellpy import cellreader
+
+    selected = []
+    select = pd.HDFStore.select
+
+    def recording_select(self, key, *args, **kwargs):
+        selected.append(key)
+        return select(self, key, *args, **kwargs)
+
+    monkeypatch.setattr(pd.HDFStore, "select", recording_select)
+    cell = cellreader.CellpyData().load(hdf5_cellpy_file, tables=[]).cell
+    assert cell.raw.empty
+    assert not cell.summary_made
+    assert cell.mass == 1.0
+    assert not any(key.endswith(prms._cellpyfile_raw) for key in selected)